@@ -1,21 +1,391 @@
 '''
-Business: Get admin statistics and all orders
-Args: event with httpMethod, queryStringParameters (email for auth check)
+Business: Get admin statistics, recent orders, a paginated user list and CSV/NDJSON exports
+Args: event with httpMethod, queryStringParameters (view=users with sort, order, role,
+      email_prefix, cursor, limit for the user list; view=export with table, format,
+      from, to, status, cursor for exports)
       context with request_id
-Returns: HTTP response with stats and orders list
+Returns: HTTP response with stats and orders list, a page of users, or an export chunk
 '''
 
 import json
+import gzip
 import os
+import time
+import base64
+import csv
+import io
 import psycopg2
-from typing import Dict, Any
-from datetime import datetime, timedelta
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from datetime import date, datetime, timedelta
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '2'))
+DB_POOL_PING_AFTER = 30.0
+# Bodies from a kilobyte up are compressed to the client's Accept-Encoding; brotli when installed
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+_db_pool: List[Tuple[Any, float]] = []
+
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
 def get_db_connection():
+    while _db_pool:
+        try:
+            conn, released_at = _db_pool.pop()
+        except IndexError:
+            break
+        if is_db_connection_healthy(conn, time.monotonic() - released_at):
+            return conn
+        conn.close()
     dsn = os.environ.get('DATABASE_URL')
     return psycopg2.connect(dsn)
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+def is_db_connection_healthy(conn, idle_seconds: float) -> bool:
+    if conn.closed or conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+        return False
+    if idle_seconds < DB_POOL_PING_AFTER:
+        return True
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def release_db_connection(conn):
+    try:
+        if not conn.closed and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+    if conn.closed or len(_db_pool) >= DB_POOL_SIZE:
+        conn.close()
+        return
+    _db_pool.append((conn, time.monotonic()))
+
+SCHEMA = 't_p55547046_creative_ai_hub'
+
+STATS_SNAPSHOT_SQL = f"""
+    SELECT COALESCE(s.total_orders, 0), COALESCE(s.active_users, 0), COALESCE(d.orders, 0),
+           COALESCE(s.total_chats, 0), COALESCE(s.chat_users, 0),
+           COALESCE((
+               SELECT json_agg(json_build_object('name', t.service_name, 'count', t.chat_count)
+                               ORDER BY t.chat_count DESC, t.service_name)
+               FROM (
+                   SELECT service_name, chat_count FROM {SCHEMA}.admin_stats_services
+                   WHERE chat_count > 0
+                   ORDER BY chat_count DESC, service_name
+                   LIMIT 10
+               ) t
+           ), '[]'::json)
+    FROM (SELECT 1) AS one
+    LEFT JOIN {SCHEMA}.admin_stats s ON s.id = 1
+    LEFT JOIN {SCHEMA}.admin_stats_daily d ON d.day = CURRENT_DATE
+"""
+
+# One statement, so the snapshot and the recount see the same MVCC snapshot
+STATS_CHECK_SQL = f"""
+    SELECT json_build_object(
+        'total_orders', (SELECT COALESCE(MAX(total_orders), 0) FROM {SCHEMA}.admin_stats WHERE id = 1),
+        'active_users', (SELECT COALESCE(MAX(active_users), 0) FROM {SCHEMA}.admin_stats WHERE id = 1),
+        'total_chats', (SELECT COALESCE(MAX(total_chats), 0) FROM {SCHEMA}.admin_stats WHERE id = 1),
+        'chat_users', (SELECT COALESCE(MAX(chat_users), 0) FROM {SCHEMA}.admin_stats WHERE id = 1),
+        'services', (SELECT COALESCE(json_object_agg(service_name, chat_count), '{{}}'::json)
+                     FROM {SCHEMA}.admin_stats_services WHERE chat_count <> 0)
+    ), json_build_object(
+        'total_orders', (SELECT COUNT(*) FROM {SCHEMA}.orders WHERE status != 'test'),
+        'active_users', (SELECT COUNT(DISTINCT user_id) FROM {SCHEMA}.orders WHERE status != 'test'),
+        'total_chats', (SELECT COUNT(*) FROM {SCHEMA}.chat_history),
+        'chat_users', (SELECT COUNT(DISTINCT user_email) FROM {SCHEMA}.chat_history),
+        'services', (SELECT COALESCE(json_object_agg(service_name, n), '{{}}'::json)
+                     FROM (SELECT service_name, COUNT(*) AS n FROM {SCHEMA}.chat_history GROUP BY service_name) x)
+    ), json_build_object(
+        'order_users', (
+            SELECT COUNT(*) FROM {SCHEMA}.admin_stats_order_users s
+            FULL JOIN (
+                SELECT user_id, COUNT(*) AS n FROM {SCHEMA}.orders
+                WHERE status != 'test' AND user_id IS NOT NULL GROUP BY user_id
+            ) o ON o.user_id = s.user_id
+            WHERE s.order_count IS DISTINCT FROM o.n
+        ),
+        'chat_users', (
+            SELECT COUNT(*) FROM {SCHEMA}.admin_stats_chat_users s
+            FULL JOIN (
+                SELECT user_email, COUNT(*) AS n FROM {SCHEMA}.chat_history GROUP BY user_email
+            ) c ON c.user_email = s.user_email
+            WHERE s.chat_count IS DISTINCT FROM c.n
+        ),
+        'user_counters', (
+            SELECT COUNT(*) FROM {SCHEMA}.users u
+            LEFT JOIN (
+                SELECT user_id, COUNT(*) AS n FROM {SCHEMA}.orders
+                WHERE status != 'test' AND user_id IS NOT NULL GROUP BY user_id
+            ) o ON o.user_id = u.id
+            LEFT JOIN (
+                SELECT user_email, COUNT(*) AS n FROM {SCHEMA}.chat_history GROUP BY user_email
+            ) c ON c.user_email = u.email
+            WHERE (u.order_count, u.chat_count) IS DISTINCT FROM (COALESCE(o.n, 0)::int, COALESCE(c.n, 0)::int)
+        ),
+        'daily_orders', (
+            SELECT COUNT(*) FROM (SELECT * FROM {SCHEMA}.admin_stats_daily WHERE orders <> 0) s
+            FULL JOIN (
+                SELECT DATE(created_at) AS day, COUNT(*) AS n FROM {SCHEMA}.orders
+                WHERE status != 'test' AND created_at IS NOT NULL GROUP BY DATE(created_at)
+            ) o ON o.day = s.day
+            WHERE s.orders IS DISTINCT FROM o.n
+        )
+    )
+"""
+
+def read_stats_snapshot(cur) -> Dict[str, Any]:
+    cur.execute(STATS_SNAPSHOT_SQL)
+    total_orders, active_users, today_orders, total_chats, chat_users, popular_services = cur.fetchone()
+    return {
+        'totalOrders': total_orders,
+        'totalRevenue': total_orders * 50,
+        'activeUsers': active_users,
+        'todayOrders': today_orders,
+        'totalChats': total_chats,
+        'chatUsers': chat_users,
+        'totalMessages': total_chats * 2,
+        'popularServices': popular_services
+    }
+
+def check_stats_snapshot(cur) -> List[Dict[str, Any]]:
+    cur.execute(STATS_CHECK_SQL)
+    snapshot, actual, mismatched_rows = cur.fetchone()
+    drift = []
+    for metric in ('total_orders', 'active_users', 'total_chats', 'chat_users'):
+        if snapshot[metric] != actual[metric]:
+            drift.append({'metric': metric, 'snapshot': snapshot[metric], 'actual': actual[metric]})
+    for service_name in sorted(set(snapshot['services']) | set(actual['services'])):
+        stored = snapshot['services'].get(service_name, 0)
+        counted = actual['services'].get(service_name, 0)
+        if stored != counted:
+            drift.append({'metric': f'services.{service_name}', 'snapshot': stored, 'actual': counted})
+    for table, count in mismatched_rows.items():
+        if count:
+            drift.append({'metric': f'{table}.mismatched_rows', 'snapshot': None, 'actual': count})
+    return drift
+
+USER_PAGE_SIZE = 50
+USER_PAGE_MAX = 200
+USER_SORT_COLUMNS = ('created_at', 'credits', 'activity')
+
+def encode_users_cursor(sort: str, order: str, value: Any, user_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, order, value, user_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_users_cursor(cursor: str, sort: str, order: str) -> Optional[Tuple[Any, int]]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, cursor_order, value, user_id = json.loads(raw)
+        if (cursor_sort, cursor_order) != (sort, order):
+            return None
+        if sort == 'created_at':
+            value = datetime.fromisoformat(value)
+        else:
+            value = int(value)
+        return value, int(user_id)
+    except (ValueError, TypeError):
+        return None
+
+def escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def list_users(cur, sort: str, order: str, role: Optional[str], email_prefix: Optional[str],
+               after: Optional[Tuple[Any, int]], limit: int) -> Dict[str, Any]:
+    conditions = []
+    params: List[Any] = []
+    if role:
+        conditions.append("role = %s")
+        params.append(role)
+    if email_prefix:
+        conditions.append("email LIKE %s")
+        params.append(escape_like(email_prefix) + '%')
+    if after:
+        conditions.append(f"({sort}, id) {'<' if order == 'desc' else '>'} (%s, %s)")
+        params.extend(after)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    direction = 'DESC' if order == 'desc' else 'ASC'
+    
+    cur.execute(
+        f"""
+        SELECT id, email, name, role, credits, created_at, order_count, chat_count, activity
+        FROM {SCHEMA}.users
+        {where}
+        ORDER BY {sort} {direction}, id {direction}
+        LIMIT %s
+        """,
+        params + [limit + 1]
+    )
+    rows = cur.fetchall()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        sort_value = {'created_at': last[5], 'credits': last[4], 'activity': last[8]}[sort]
+        next_cursor = encode_users_cursor(sort, order, sort_value, last[0])
+    
+    users = []
+    for user in rows:
+        users.append({
+            'id': user[0],
+            'email': user[1],
+            'name': user[2],
+            'role': user[3],
+            'credits': user[4],
+            'created_at': str(user[5]),
+            'total_orders': user[6],
+            'total_chats': user[7]
+        })
+    return {'users': users, 'next_cursor': next_cursor}
+
+EXPORT_BATCH_ROWS = 2000
+# Cloud function responses are capped at a few MB, so a large export is served in chunks
+EXPORT_MAX_BYTES = int(os.environ.get('EXPORT_MAX_BYTES', '3000000'))
+EXPORT_FORMATS = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson; charset=utf-8'}
+EXPORT_TABLES = {
+    'orders': {
+        'source': f"{SCHEMA}.orders t LEFT JOIN {SCHEMA}.users u ON u.id = t.user_id",
+        'columns': [('id', 't.id'), ('user_id', 't.user_id'), ('user_email', 'u.email'), ('service_id', 't.service_id'),
+                    ('service_name', 't.service_name'), ('plan', 't.plan'), ('price', 't.price'),
+                    ('status', 't.status'), ('created_at', 't.created_at')],
+        'status_column': 't.status'
+    },
+    'payments': {
+        'source': f"{SCHEMA}.payment_transactions t",
+        'columns': [('id', 't.id'), ('transaction_id', 't.transaction_id'), ('user_email', 't.user_email'),
+                    ('amount', 't.amount'), ('tokens_added', 't.tokens_added'), ('created_at', 't.created_at')],
+        'status_column': None
+    },
+    'users': {
+        'source': f"{SCHEMA}.users t",
+        'columns': [('id', 't.id'), ('email', 't.email'), ('name', 't.name'), ('role', 't.role'),
+                    ('credits', 't.credits'), ('total_orders', 't.order_count'), ('total_chats', 't.chat_count'),
+                    ('created_at', 't.created_at')],
+        'status_column': 't.role'
+    }
+}
+
+def export_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def iter_export_rows(conn, table: str, date_from: Optional[date], date_to: Optional[date],
+                     status: Optional[str], after_id: int) -> Iterator[tuple]:
+    spec = EXPORT_TABLES[table]
+    conditions = ["t.id > %s"]
+    params: List[Any] = [after_id]
+    if date_from:
+        conditions.append("t.created_at >= %s")
+        params.append(date_from)
+    if date_to:
+        conditions.append("t.created_at < %s")
+        params.append(date_to + timedelta(days=1))
+    if status:
+        conditions.append(f"{spec['status_column']} = %s")
+        params.append(status)
+    
+    # Named (server-side) cursor: Postgres keeps the result, the function holds one batch at a time
+    cur = conn.cursor(name=f'admin_export_{table}')
+    cur.itersize = EXPORT_BATCH_ROWS
+    try:
+        cur.execute(
+            f"""
+            SELECT {', '.join(expression for _, expression in spec['columns'])}
+            FROM {spec['source']}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY t.id
+            """,
+            params
+        )
+        for row in cur:
+            yield row
+    finally:
+        cur.close()
+
+def iter_export_lines(rows: Iterator[tuple], columns: List[str], export_format: str, with_header: bool) -> Iterator[Tuple[int, str]]:
+    if export_format == 'ndjson':
+        for row in rows:
+            yield row[0], json.dumps({name: export_value(value) for name, value in zip(columns, row)}, ensure_ascii=False) + '\n'
+        return
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if with_header:
+        writer.writerow(columns)
+    for row in rows:
+        writer.writerow([export_value(value) for value in row])
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        yield row[0], line
+    if buffer.tell():
+        yield 0, buffer.getvalue()
+
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
+def get_request_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+def choose_content_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    qualities = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name.strip().lower()] = quality
+    candidates = []
+    for encoding in (('br', 'gzip') if brotli else ('gzip',)):
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > 0:
+            candidates.append((quality, encoding == 'br', encoding))
+    return max(candidates)[2] if candidates else None
+
+def compress_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    body = response.get('body')
+    if response.get('isBase64Encoded') or not isinstance(body, str):
+        return response
+    raw = body.encode('utf-8')
+    encoding = choose_content_encoding(get_request_header(event, 'Accept-Encoding'))
+    if encoding is None or len(raw) < COMPRESS_MIN_BYTES:
+        return response
+    if encoding == 'br':
+        compressed = brotli.compress(raw, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+    if len(compressed) >= len(raw):
+        return response
+    headers = dict(response.get('headers') or {})
+    headers['Content-Encoding'] = encoding
+    headers['Vary'] = headers['Vary'] + ', Accept-Encoding' if headers.get('Vary') else 'Accept-Encoding'
+    if headers.get('ETag') and not headers['ETag'].startswith('W/'):
+        headers['ETag'] = 'W/' + headers['ETag']
+    return {**response, 'headers': headers, 'body': base64.b64encode(compressed).decode('ascii'), 'isBase64Encoded': True}
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
@@ -50,15 +420,18 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             conn = get_db_connection()
             cur = conn.cursor()
             
+            # Ledger entry and balance change in one statement; a debit is capped at the available balance,
+            # and a change that comes to 0 (amount 0, or a debit from an empty balance) posts nothing
             cur.execute(
-                "UPDATE users SET credits = GREATEST(0, credits + %s) WHERE id = %s RETURNING credits",
+                f"""WITH target AS (SELECT id, credits, GREATEST(-credits, %s) AS change FROM {SCHEMA}.users WHERE id = %s FOR UPDATE)
+                    SELECT CASE WHEN change = 0 THEN credits ELSE {SCHEMA}.credit_post(id, change, 'admin') END FROM target""",
                 (amount, user_id)
             )
             result = cur.fetchone()
             
             if not result:
                 cur.close()
-                conn.close()
+                release_db_connection(conn)
                 return {
                     'statusCode': 404,
                     'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
@@ -69,7 +442,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             new_balance = result[0]
             conn.commit()
             cur.close()
-            conn.close()
+            release_db_connection(conn)
             
             return {
                 'statusCode': 200,
@@ -77,62 +450,146 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({'success': True, 'new_balance': new_balance}),
                 'isBase64Encoded': False
             }
-    
-    if method == 'GET':
-        conn = get_db_connection()
-        cur = conn.cursor()
         
-        schema = 't_p55547046_creative_ai_hub'
+        if action == 'check_stats':
+            repair = bool(body_data.get('repair'))
+            
+            conn = get_db_connection()
+            cur = conn.cursor()
+            try:
+                drift = check_stats_snapshot(cur)
+                repaired = False
+                if drift and repair:
+                    cur.execute(f"SELECT {SCHEMA}.admin_stats_rebuild()")
+                    cur.execute(f"SELECT {SCHEMA}.admin_stats_rebuild_users()")
+                    conn.commit()
+                    repaired = True
+            finally:
+                cur.close()
+                release_db_connection(conn)
+            
+            if drift:
+                print(f"[ADMIN_STATS] drift detected: {json.dumps(drift, ensure_ascii=False)} repaired={repaired}")
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'success': True, 'consistent': not drift, 'drift': drift, 'repaired': repaired}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+    
+    if method == 'GET' and (event.get('queryStringParameters') or {}).get('view') == 'export':
+        params = event.get('queryStringParameters') or {}
+        table = params.get('table', 'orders')
+        export_format = params.get('format', 'csv')
+        status = params.get('status')
         
+        error = None
+        if table not in EXPORT_TABLES or export_format not in EXPORT_FORMATS:
+            error = 'Invalid table or format'
+        elif status and not EXPORT_TABLES[table]['status_column']:
+            error = 'Status filter is not supported for this table'
         try:
-            cur.execute(f"SELECT COUNT(*) FROM {schema}.orders WHERE status != 'test'")
-            total_orders = cur.fetchone()[0]
-        except:
-            total_orders = 0
+            date_from = date.fromisoformat(params['from']) if params.get('from') else None
+            date_to = date.fromisoformat(params['to']) if params.get('to') else None
+            after_id = int(params.get('cursor') or 0)
+        except ValueError:
+            error = 'Invalid date or cursor'
+        if error:
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'error': error}),
+                'isBase64Encoded': False
+            }
         
-        try:
-            cur.execute(f"SELECT COUNT(DISTINCT user_id) FROM {schema}.orders WHERE status != 'test'")
-            active_users = cur.fetchone()[0]
-        except:
-            active_users = 0
+        columns = [name for name, _ in EXPORT_TABLES[table]['columns']]
+        parts: List[str] = []
+        size = 0
+        next_cursor = None
+        last_id = after_id
         
-        today = datetime.now().date()
+        conn = get_db_connection()
         try:
-            cur.execute(
-                f"SELECT COUNT(*) FROM {schema}.orders WHERE status != 'test' AND DATE(created_at) = %s",
-                (today,)
-            )
-            today_orders = cur.fetchone()[0]
-        except:
-            today_orders = 0
+            rows = iter_export_rows(conn, table, date_from, date_to, status, after_id)
+            for row_id, line in iter_export_lines(rows, columns, export_format, with_header=after_id == 0):
+                line_size = len(line.encode('utf-8'))
+                if parts and size + line_size > EXPORT_MAX_BYTES:
+                    next_cursor = str(last_id)
+                    break
+                parts.append(line)
+                size += line_size
+                last_id = row_id
+            rows.close()
+        finally:
+            release_db_connection(conn)
         
-        try:
-            cur.execute(f"SELECT COUNT(*) FROM {schema}.chat_history")
-            total_chats = cur.fetchone()[0] or 0
-        except:
-            total_chats = 0
+        response_headers = {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'X-Export-Cursor',
+            'Content-Type': EXPORT_FORMATS[export_format],
+            'Content-Disposition': f'attachment; filename="{table}.{export_format}"'
+        }
+        if next_cursor:
+            response_headers['X-Export-Cursor'] = next_cursor
+        
+        return {
+            'statusCode': 200,
+            'headers': response_headers,
+            'body': ''.join(parts),
+            'isBase64Encoded': False
+        }
+    
+    if method == 'GET' and (event.get('queryStringParameters') or {}).get('view') == 'users':
+        params = event.get('queryStringParameters') or {}
+        sort = params.get('sort', 'created_at')
+        order = params.get('order', 'desc')
+        if sort not in USER_SORT_COLUMNS or order not in ('asc', 'desc'):
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'Invalid sort'}),
+                'isBase64Encoded': False
+            }
+        
+        after = None
+        if params.get('cursor'):
+            after = decode_users_cursor(params['cursor'], sort, order)
+            if after is None:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                    'body': json.dumps({'error': 'Invalid cursor'}),
+                    'isBase64Encoded': False
+                }
         
         try:
-            cur.execute(f"SELECT COUNT(DISTINCT user_email) FROM {schema}.chat_history")
-            chat_users = cur.fetchone()[0] or 0
-        except:
-            chat_users = 0
+            limit = min(max(int(params.get('limit', USER_PAGE_SIZE)), 1), USER_PAGE_MAX)
+        except ValueError:
+            limit = USER_PAGE_SIZE
         
+        conn = get_db_connection()
+        cur = conn.cursor()
         try:
-            cur.execute(
-                f"""
-                SELECT service_name, COUNT(*) as count
-                FROM {schema}.chat_history
-                GROUP BY service_name
-                ORDER BY count DESC
-                LIMIT 10
-                """
-            )
-            popular_services = [{'name': row[0], 'count': row[1]} for row in cur.fetchall()]
-        except:
-            popular_services = []
+            result = list_users(cur, sort, order, params.get('role'), params.get('email_prefix'), after, limit)
+        finally:
+            cur.close()
+            release_db_connection(conn)
+        
+        return {
+            'statusCode': 200,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps(result, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
+    if method == 'GET':
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        schema = SCHEMA
         
-        total_messages = total_chats * 2
+        stats = read_stats_snapshot(cur)
         
         try:
             cur.execute(
@@ -149,23 +606,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         except:
             orders_data = []
         
-        try:
-            cur.execute(
-                f"""
-                SELECT u.id, u.email, u.name, u.role, u.credits, u.created_at,
-                       COUNT(DISTINCT o.id) as total_orders,
-                       COUNT(DISTINCT ch.id) as total_chats
-                FROM {schema}.users u
-                LEFT JOIN {schema}.orders o ON u.id = o.user_id AND o.status != 'test'
-                LEFT JOIN {schema}.chat_history ch ON u.email = ch.user_email
-                GROUP BY u.id, u.email, u.name, u.role, u.credits, u.created_at
-                ORDER BY u.created_at DESC
-                """
-            )
-            users_data = cur.fetchall()
-        except:
-            users_data = []
-        
         try:
             cur.execute(
                 f"""
@@ -180,7 +620,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             payments_data = []
         
         cur.close()
-        conn.close()
+        release_db_connection(conn)
         
         orders = []
         for order in orders_data:
@@ -193,19 +633,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'created_at': str(order[5])
             })
         
-        users = []
-        for user in users_data:
-            users.append({
-                'id': user[0],
-                'email': user[1],
-                'name': user[2],
-                'role': user[3],
-                'credits': user[4],
-                'created_at': str(user[5]),
-                'total_orders': user[6],
-                'total_chats': user[7]
-            })
-        
         payments = []
         for payment in payments_data:
             payments.append({
@@ -217,17 +644,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'created_at': str(payment[5])
             })
         
-        stats = {
-            'totalOrders': total_orders,
-            'totalRevenue': total_orders * 50,
-            'activeUsers': active_users,
-            'todayOrders': today_orders,
-            'totalChats': total_chats,
-            'chatUsers': chat_users,
-            'totalMessages': total_messages,
-            'popularServices': popular_services
-        }
-        
         return {
             'statusCode': 200,
             'headers': {
@@ -237,7 +653,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({
                 'stats': stats,
                 'orders': orders,
-                'users': users,
                 'payments': payments
             }, ensure_ascii=False),
             'isBase64Encoded': False
@@ -248,4 +663,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         'headers': {'Access-Control-Allow-Origin': '*'},
         'body': json.dumps({'error': 'Method not allowed'}),
         'isBase64Encoded': False
-    }
\ No newline at end of file
+    }
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    return compress_response(event, handle_request(event, context))
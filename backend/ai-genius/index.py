@@ -6,65 +6,664 @@ Returns: HTTP response dict
 """
 
 import json
+import base64
+import gzip
 import os
+import time
+import hashlib
+import importlib.util
+import re
 import requests
-from typing import Dict, Any
-
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    method: str = event.get('httpMethod', 'GET')
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Общий дедлайн генерации: размышление и ответ YandexGPT вместе укладываются в него.
+# Таймаут requests ограничивает одно чтение сокета, а не весь запрос, поэтому каждый таймаут — остаток дедлайна
+LLM_DEADLINE_SECONDS = 30.0
+
+_llm_executor = ThreadPoolExecutor(max_workers=2)
+
+# Потоковый режим: шлюз отдаёт ответ функции целиком, поэтому частичный текст пишется в generation_progress
+# не чаще раза в GENERATION_PROGRESS_INTERVAL секунд, а клиент забирает его опросом GET ?stream_id=...
+GENERATION_PROGRESS_INTERVAL = 0.25
+GENERATION_PROGRESS_TTL_SECONDS = 600
+STREAM_ID_MAX_LENGTH = 100
+
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '2'))
+DB_POOL_PING_AFTER = 30.0
+# Ответы от килобайта сжимаются под Accept-Encoding клиента; brotli — если модуль установлен
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+_db_pool: List[Tuple[Any, float]] = []
+
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
+def get_db_connection():
+    while _db_pool:
+        try:
+            conn, released_at = _db_pool.pop()
+        except IndexError:
+            break
+        if is_db_connection_healthy(conn, time.monotonic() - released_at):
+            return conn
+        conn.close()
+    dsn = os.environ.get('DATABASE_URL')
+    return psycopg2.connect(dsn)
+
+def is_db_connection_healthy(conn, idle_seconds: float) -> bool:
+    if conn.closed or conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+        return False
+    if idle_seconds < DB_POOL_PING_AFTER:
+        return True
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def release_db_connection(conn):
+    try:
+        if not conn.closed and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+    if conn.closed or len(_db_pool) >= DB_POOL_SIZE:
+        conn.close()
+        return
+    _db_pool.append((conn, time.monotonic()))
+
+# Резерв токенов живёт дольше любой генерации; брошенные резервы снимает credits {"action": "sweep_holds"} по таймеру
+CREDIT_HOLD_TTL_SECONDS = 600
+# Резервы ведёт функция credits; её действия с резервами закрыты тем же секретом, что задан ей
+CREDITS_ADMIN_SECRET = os.environ.get('CREDITS_ADMIN_SECRET', '')
+
+# Вызовы соседних функций: 'auto' — напрямую в процессе, если код функции лежит рядом, 'http' — всегда по сети
+INTERNAL_CALLS_MODE = os.environ.get('INTERNAL_CALLS_MODE', 'auto')
+INTERNAL_CALL_TIMEOUT = 5
+FUNCTION_DIR = os.path.dirname(os.path.abspath(__file__))
+FUNCTION_URLS = {
+    'credits': 'https://functions.poehali.dev/62237982-f08c-4d74-99d7-28201bfc5f93'
+}
+
+_function_urls: Dict[str, str] = {}
+_local_handlers: Dict[str, Any] = {}
+_internal_http = requests.Session()
+
+RESULT_CACHE_SIZE = 256
+RESULT_CACHE_TTL_SECONDS = int(os.environ.get('RESULT_CACHE_TTL_SECONDS', '86400'))
+RESULT_CACHE_VERSION = 1
+# Не кешируем: 0 — свободный запрос, 2 — прорицатель (каждый раз новый ответ), 31 и 32 — отдельные ветки без шаблона
+RESULT_CACHE_OPT_OUT = {0, 2, 31, 32}
+
+_result_cache: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+_result_cache_stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'bypassed': 0, 'stores': 0, 'errors': 0}
+
+def result_cache_key(service_id: int, input_text: str, deep_think: bool, files: List[Dict]) -> Optional[str]:
+    """Ключ кеша: сервис, нормализованный текст, режим размышления и хеши файлов; None — сервис не кешируется"""
+    if service_id in RESULT_CACHE_OPT_OUT:
+        _result_cache_stats['bypassed'] += 1
+        return None
+    normalized_text = ' '.join(input_text.split()).casefold()
+    file_hashes = [
+        hashlib.sha256(f"{f.get('name', '')}\0{f.get('type', '')}\0{f.get('content') or ''}".encode()).hexdigest()
+        for f in files
+    ]
+    raw_key = json.dumps([RESULT_CACHE_VERSION, service_id, normalized_text, bool(deep_think), file_hashes], ensure_ascii=False)
+    return hashlib.sha256(raw_key.encode()).hexdigest()
+
+def remember_result(cache_key: str, entry: Dict[str, Any], ttl_seconds: float):
+    """Кладёт результат в LRU процесса, вытесняя самые старые записи"""
+    _result_cache[cache_key] = (time.time() + ttl_seconds, entry)
+    _result_cache.move_to_end(cache_key)
+    while len(_result_cache) > RESULT_CACHE_SIZE:
+        _result_cache.popitem(last=False)
+
+def result_cache_get(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Ищет результат сначала в памяти процесса, затем в общей таблице ai_result_cache"""
+    cached = _result_cache.get(cache_key)
+    if cached and cached[0] > time.time():
+        _result_cache.move_to_end(cache_key)
+        _result_cache_stats['memory_hits'] += 1
+        return cached[1]
+    _result_cache.pop(cache_key, None)
     
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Email',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+    row = None
+    if os.environ.get('DATABASE_URL'):
+        conn = None
+        try:
+            conn = get_db_connection()
+            cur = conn.cursor()
+            cur.execute(
+                """UPDATE t_p55547046_creative_ai_hub.ai_result_cache SET hit_count = hit_count + 1
+                   WHERE cache_key = %s AND expires_at > NOW()
+                   RETURNING result, thinking, EXTRACT(EPOCH FROM expires_at - NOW())""",
+                (cache_key,)
+            )
+            row = cur.fetchone()
+            conn.commit()
+            cur.close()
+        except psycopg2.Error as e:
+            _result_cache_stats['errors'] += 1
+            print(f"Result cache read failed: {e}")
+        finally:
+            if conn:
+                release_db_connection(conn)
     
-    if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
+    if row:
+        entry = {'result': row[0], 'thinking': row[1]}
+        remember_result(cache_key, entry, float(row[2]))
+        _result_cache_stats['db_hits'] += 1
+        return entry
     
-    body_data = json.loads(event.get('body', '{}'))
-    service_id: int = body_data.get('service_id')
-    service_name: str = body_data.get('service_name', '')
-    input_text: str = body_data.get('input_text', '')
-    user_email: str = body_data.get('user_email', '')
-    deep_think: bool = body_data.get('deep_think', False)
-    files: list = body_data.get('files', [])
+    _result_cache_stats['misses'] += 1
+    return None
+
+def result_cache_put(cache_key: str, service_id: int, result: str, thinking: Optional[str]):
+    """Сохраняет результат в обоих уровнях кеша и попутно чистит пачку просроченных строк"""
+    remember_result(cache_key, {'result': result, 'thinking': thinking}, RESULT_CACHE_TTL_SECONDS)
+    _result_cache_stats['stores'] += 1
+    if not os.environ.get('DATABASE_URL'):
+        return
     
-    if service_id is None or not input_text:
-        return {
-            'statusCode': 400,
-            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-            'body': json.dumps({'error': 'service_id и input_text обязательны'}),
-            'isBase64Encoded': False
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute(
+            """WITH purged AS (
+                   DELETE FROM t_p55547046_creative_ai_hub.ai_result_cache
+                   WHERE cache_key IN (
+                       SELECT cache_key FROM t_p55547046_creative_ai_hub.ai_result_cache
+                       WHERE expires_at < NOW() LIMIT 100
+                   )
+               )
+               INSERT INTO t_p55547046_creative_ai_hub.ai_result_cache (cache_key, service_id, result, thinking, expires_at)
+               VALUES (%s, %s, %s, %s, NOW() + %s * INTERVAL '1 second')
+               ON CONFLICT (cache_key) DO UPDATE SET
+               result = EXCLUDED.result,
+               thinking = EXCLUDED.thinking,
+               expires_at = EXCLUDED.expires_at""",
+            (cache_key, service_id, result, thinking, RESULT_CACHE_TTL_SECONDS)
+        )
+        conn.commit()
+        cur.close()
+    except psycopg2.Error as e:
+        _result_cache_stats['errors'] += 1
+        print(f"Result cache write failed: {e}")
+    finally:
+        if conn:
+            release_db_connection(conn)
+
+def resolve_function_url(name: str) -> str:
+    """Возвращает URL функции по логическому имени из func2url.json (при деплое файла рядом нет — берём встроенную копию)"""
+    if not _function_urls:
+        _function_urls.update(FUNCTION_URLS)
+        for path in (os.path.join(FUNCTION_DIR, '..', 'func2url.json'), os.path.join(FUNCTION_DIR, 'func2url.json')):
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    _function_urls.update(json.load(f))
+                break
+    return _function_urls[name]
+
+def load_local_handler(name: str):
+    """Импортирует handler соседней функции, если её код доступен в этом процессе; иначе None"""
+    if name not in _local_handlers:
+        handler_fn = None
+        path = os.path.join(FUNCTION_DIR, '..', name, 'index.py')
+        if INTERNAL_CALLS_MODE == 'auto' and os.path.exists(path):
+            try:
+                spec = importlib.util.spec_from_file_location(f"internal_{name.replace('-', '_')}", path)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                handler_fn = module.handler
+            except Exception as e:
+                print(f"Internal call {name}: local import failed, using HTTP: {e}")
+        _local_handlers[name] = handler_fn
+    return _local_handlers[name]
+
+def call_function(name: str, method: str, query: Optional[Dict[str, str]] = None,
+                  body: Optional[Dict[str, Any]] = None,
+                  headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, Any]]:
+    """Вызывает другую функцию платформы: напрямую в процессе, если её код импортируется, иначе по HTTP с таймаутом"""
+    local_handler = load_local_handler(name)
+    if local_handler:
+        event = {
+            'httpMethod': method,
+            'headers': {'Content-Type': 'application/json', **(headers or {})},
+            'queryStringParameters': query or {},
+            'body': json.dumps(body) if body is not None else ''
         }
+        response = local_handler(event, None)
+        return response['statusCode'], json.loads(response.get('body') or '{}')
     
-    prompts = {
-        0: input_text,
-        1: f"""Ты мастер биографий с 20-летним опытом. Создай захватывающую биографию, которая:
+    response = _internal_http.request(
+        method, resolve_function_url(name), params=query, json=body, headers=headers, timeout=INTERNAL_CALL_TIMEOUT
+    )
+    return response.status_code, response.json()
+
+def reserve_credits(user_email: str, cost: int, reference: str) -> Tuple[Optional[str], int, Optional[int]]:
+    """Резервирует токены через функцию credits; возвращает роль, баланс до резерва и id резерва (директору резерв не нужен)"""
+    status, data = call_function('credits', 'POST', body={
+        'action': 'reserve', 'email': user_email, 'amount': cost,
+        'reference': reference, 'ttl_seconds': CREDIT_HOLD_TTL_SECONDS
+    }, headers={'X-Admin-Secret': CREDITS_ADMIN_SECRET})
+    if status == 404:
+        return None, 0, None
+    if status != 200:
+        raise RuntimeError(f"credits reserve failed: {status} {data.get('error')}")
+    return data['role'], data['credits'], data['hold_id']
+
+def settle_credit_hold(hold_id: Optional[int], outcome: str) -> Optional[int]:
+    """Подтверждает ('commit') или снимает ('release') резерв через функцию credits и возвращает доступный баланс"""
+    if hold_id is None:
+        return None
+    status, data = call_function('credits', 'POST', body={'action': outcome, 'hold_id': hold_id},
+                                 headers={'X-Admin-Secret': CREDITS_ADMIN_SECRET})
+    if status != 200:
+        raise RuntimeError(f"credits {outcome} failed: {status} {data.get('error')}")
+    return data['credits']
+
+def remaining_timeout(deadline: float) -> float:
+    """Таймаут очередного запроса — остаток общего дедлайна хода, но не меньше секунды"""
+    return max(1.0, deadline - time.monotonic())
+
+def request_completion_text(url: str, headers: Dict[str, str], payload: Dict[str, Any], deadline: float) -> str:
+    """Выполняет непотоковый запрос к YandexGPT и возвращает текст ответа или пустую строку"""
+    response = requests.post(url, headers=headers, json=payload, timeout=remaining_timeout(deadline))
+    if response.status_code != 200:
+        return ''
+    alternatives = response.json().get('result', {}).get('alternatives', [])
+    return alternatives[0].get('message', {}).get('text', '') if alternatives else ''
+
+def collect_completion_text(future: Future, deadline: float) -> str:
+    """Забирает результат фонового запроса, не ожидая дольше дедлайна"""
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except Exception:
+        return ''
+
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
+def relay_yandex_stream(response, started_at: float, deadline: float,
+                        publish: Callable[[str], None]) -> Tuple[str, Optional[int]]:
+    text = ''
+    first_token_ms = None
+    published_at = None
+    for line in response.iter_lines():
+        if time.monotonic() > deadline:
+            response.close()
+            raise requests.Timeout('YandexGPT stream did not finish before the deadline')
+        if not line:
+            continue
+        alternatives = json.loads(line).get('result', {}).get('alternatives', [])
+        if not alternatives:
+            continue
+        partial = alternatives[0].get('message', {}).get('text', '')
+        if len(partial) <= len(text):
+            continue
+        text = partial
+        now = time.monotonic()
+        if first_token_ms is None:
+            first_token_ms = int((now - started_at) * 1000)
+        if published_at is None or now - published_at >= GENERATION_PROGRESS_INTERVAL:
+            publish(text)
+            published_at = now
+    return text, first_token_ms
+
+def publish_generation_progress(conn, stream_id: str, user_email: str, text: str):
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """INSERT INTO t_p55547046_creative_ai_hub.generation_progress (stream_id, user_email, text, updated_at)
+               VALUES (%s, %s, %s, clock_timestamp())
+               ON CONFLICT (stream_id) DO UPDATE SET text = EXCLUDED.text, updated_at = EXCLUDED.updated_at
+               WHERE generation_progress.user_email = EXCLUDED.user_email""",
+            (stream_id, user_email, text)
+        )
+        conn.commit()
+        cursor.close()
+    except psycopg2.Error as e:
+        print(f"Generation progress write failed: {e}")
+        if not conn.closed:
+            conn.rollback()
+
+def finish_generation_progress(conn, stream_id: str, user_email: str):
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """DELETE FROM t_p55547046_creative_ai_hub.generation_progress
+               WHERE (stream_id = %s AND user_email = %s)
+                  OR updated_at < clock_timestamp() - %s * INTERVAL '1 second'""",
+            (stream_id, user_email, GENERATION_PROGRESS_TTL_SECONDS)
+        )
+        conn.commit()
+        cursor.close()
+    except psycopg2.Error as e:
+        print(f"Generation progress cleanup failed: {e}")
+        if not conn.closed:
+            conn.rollback()
+
+def read_generation_progress(conn, stream_id: str, user_email: str) -> str:
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT text FROM t_p55547046_creative_ai_hub.generation_progress WHERE stream_id = %s AND user_email = %s",
+        (stream_id, user_email)
+    )
+    row = cursor.fetchone()
+    conn.rollback()
+    cursor.close()
+    return row[0] if row else ''
+
+# Расширенный словарь русский → английский для генерации изображений (сервис 32)
+RU_TO_EN = {
+    # Люди и профессии
+    'мальчик': 'boy', 'мальчика': 'boy', 'мальчиком': 'boy', 'мальчишка': 'boy',
+    'девочка': 'girl', 'девочки': 'girl', 'девочкой': 'girl', 'девчонка': 'girl',
+    'подросток': 'teenager', 'подростка': 'teenager', 'подростки': 'teenagers',
+    'мужчина': 'man', 'мужчины': 'man', 'парень': 'young man', 'юноша': 'young man',
+    'женщина': 'woman', 'женщины': 'woman', 'девушка': 'young woman', 'леди': 'lady',
+    'ребенок': 'child', 'ребенка': 'child', 'дети': 'children', 'малыш': 'baby',
+    'младенец': 'baby', 'новорожденный': 'newborn',
+    'семья': 'family', 'семьи': 'family', 'родители': 'parents',
+    'бабушка': 'grandmother', 'дедушка': 'grandfather', 'мама': 'mother', 'папа': 'father',
+    'сын': 'son', 'дочь': 'daughter', 'брат': 'brother', 'сестра': 'sister',
+    'друг': 'friend', 'друзья': 'friends', 'пара': 'couple',
+    'врач': 'doctor', 'доктор': 'doctor', 'медсестра': 'nurse',
+    'учитель': 'teacher', 'преподаватель': 'teacher', 'студент': 'student',
+    'программист': 'programmer', 'разработчик': 'developer', 'инженер': 'engineer',
+    'художник': 'artist', 'дизайнер': 'designer', 'скульптор': 'sculptor',
+    'музыкант': 'musician', 'певец': 'singer', 'композитор': 'composer',
+    'спортсмен': 'athlete', 'футболист': 'soccer player', 'боксер': 'boxer',
+    'повар': 'chef', 'пекарь': 'baker', 'официант': 'waiter',
+    'пилот': 'pilot', 'космонавт': 'astronaut', 'моряк': 'sailor',
+    'полицейский': 'police officer', 'пожарный': 'firefighter', 'солдат': 'soldier',
+    'бизнесмен': 'businessman', 'менеджер': 'manager', 'директор': 'director',
+    'фотограф': 'photographer', 'журналист': 'journalist', 'писатель': 'writer',
+    'актер': 'actor', 'актриса': 'actress', 'модель': 'model',
+    'фермер': 'farmer', 'садовник': 'gardener', 'строитель': 'builder',
+    # Животные (расширенный)
+    'кот': 'cat', 'кота': 'cat', 'котик': 'cute cat', 'кошка': 'cat', 'котенок': 'kitten',
+    'собака': 'dog', 'собаки': 'dog', 'собаку': 'dog', 'пёс': 'dog', 'щенок': 'puppy',
+    'птица': 'bird', 'птицы': 'birds', 'птенец': 'chick',
+    'орел': 'eagle', 'сова': 'owl', 'попугай': 'parrot', 'ворон': 'raven',
+    'голубь': 'dove', 'лебедь': 'swan', 'фламинго': 'flamingo', 'павлин': 'peacock',
+    'пингвин': 'penguin', 'страус': 'ostrich', 'колибри': 'hummingbird',
+    'лошадь': 'horse', 'лошади': 'horses', 'конь': 'horse', 'жеребенок': 'foal',
+    'медведь': 'bear', 'медведя': 'bear', 'белый медведь': 'polar bear',
+    'волк': 'wolf', 'лиса': 'fox', 'енот': 'raccoon', 'барсук': 'badger',
+    'слон': 'elephant', 'жираф': 'giraffe', 'носорог': 'rhinoceros', 'бегемот': 'hippopotamus',
+    'лев': 'lion', 'тигр': 'tiger', 'леопард': 'leopard', 'гепард': 'cheetah',
+    'зебра': 'zebra', 'антилопа': 'antelope', 'газель': 'gazelle',
+    'обезьяна': 'monkey', 'горилла': 'gorilla', 'шимпанзе': 'chimpanzee',
+    'панда': 'panda', 'коала': 'koala', 'кенгуру': 'kangaroo',
+    'кролик': 'rabbit', 'заяц': 'hare', 'белка': 'squirrel', 'хомяк': 'hamster',
+    'мышь': 'mouse', 'крыса': 'rat', 'еж': 'hedgehog',
+    'олень': 'deer', 'лось': 'moose', 'верблюд': 'camel', 'лама': 'llama',
+    'корова': 'cow', 'бык': 'bull', 'овца': 'sheep', 'коза': 'goat',
+    'свинья': 'pig', 'поросенок': 'piglet', 'курица': 'chicken', 'петух': 'rooster',
+    'утка': 'duck', 'гусь': 'goose', 'индюк': 'turkey',
+    'рыба': 'fish', 'рыбы': 'fish', 'акула': 'shark', 'скат': 'ray',
+    'дельфин': 'dolphin', 'кит': 'whale', 'косатка': 'orca',
+    'осьминог': 'octopus', 'кальмар': 'squid', 'медуза': 'jellyfish',
+    'краб': 'crab', 'рак': 'crayfish', 'омар': 'lobster', 'креветка': 'shrimp',
+    'черепаха': 'turtle', 'змея': 'snake', 'ящерица': 'lizard', 'крокодил': 'crocodile',
+    'лягушка': 'frog', 'жаба': 'toad', 'саламандра': 'salamander',
+    'бабочка': 'butterfly', 'пчела': 'bee', 'шмель': 'bumblebee',
+    'муравей': 'ant', 'жук': 'beetle', 'божья коровка': 'ladybug',
+    'стрекоза': 'dragonfly', 'кузнечик': 'grasshopper', 'светлячок': 'firefly',
+    'паук': 'spider', 'скорпион': 'scorpion', 'улитка': 'snail',
+    'динозавр': 'dinosaur', 'тираннозавр': 't-rex', 'трицератопс': 'triceratops',
+    # Природа (расширенный)
+    'елка': 'christmas tree', 'елки': 'christmas tree', 'елку': 'christmas tree', 'ель': 'spruce',
+    'дерево': 'tree', 'деревья': 'trees', 'дерева': 'tree', 'лес': 'forest',
+    'сосна': 'pine', 'дуб': 'oak', 'береза': 'birch', 'клен': 'maple',
+    'ива': 'willow', 'пальма': 'palm tree', 'бамбук': 'bamboo',
+    'куст': 'bush', 'кустарник': 'shrub', 'кактус': 'cactus',
+    'цветок': 'flower', 'цветы': 'flowers', 'цветка': 'flower', 'букет': 'bouquet',
+    'роза': 'rose', 'тюльпан': 'tulip', 'ромашка': 'daisy',
+    'лилия': 'lily', 'орхидея': 'orchid', 'подсолнух': 'sunflower',
+    'мак': 'poppy', 'ландыш': 'lily of the valley', 'фиалка': 'violet',
+    'лотос': 'lotus', 'сирень': 'lilac', 'жасмин': 'jasmine',
+    'лес': 'forest', 'леса': 'forest', 'в лесу': 'in the forest',
+    'джунгли': 'jungle', 'тайга': 'taiga', 'роща': 'grove',
+    'поле': 'field', 'луг': 'meadow', 'степь': 'steppe', 'саванна': 'savanna',
+    'пустыня': 'desert', 'оазис': 'oasis', 'дюны': 'dunes',
+    'море': 'sea', 'океан': 'ocean', 'пляж': 'beach',
+    'река': 'river', 'озеро': 'lake', 'пруд': 'pond', 'болото': 'swamp',
+    'водопад': 'waterfall', 'ручей': 'stream', 'источник': 'spring',
+    'залив': 'bay', 'бухта': 'cove', 'коралловый риф': 'coral reef',
+    'остров': 'island', 'архипелаг': 'archipelago', 'полуостров': 'peninsula',
+    'горы': 'mountains', 'гора': 'mountain', 'в горах': 'in the mountains',
+    'вершина': 'peak', 'хребет': 'ridge', 'вулкан': 'volcano',
+    'холм': 'hill', 'долина': 'valley', 'каньон': 'canyon', 'ущелье': 'gorge',
+    'пещера': 'cave', 'грот': 'grotto', 'скалы': 'cliffs',
+    'небо': 'sky', 'облака': 'clouds', 'облако': 'cloud',
+    'солнце': 'sun', 'луна': 'moon', 'звёзды': 'stars', 'звезда': 'star',
+    'планета': 'planet', 'галактика': 'galaxy', 'комета': 'comet', 'метеор': 'meteor',
+    'созвездие': 'constellation', 'млечный путь': 'milky way',
+    'дождь': 'rain', 'снег': 'snow', 'град': 'hail', 'туман': 'fog',
+    'радуга': 'rainbow', 'молния': 'lightning', 'гром': 'thunder',
+    'буря': 'storm', 'ураган': 'hurricane', 'торнадо': 'tornado',
+    'ветер': 'wind', 'метель': 'blizzard', 'снегопад': 'snowfall',
+    'рассвет': 'sunrise', 'закат': 'sunset', 'сумерки': 'twilight',
+    'полдень': 'noon', 'полночь': 'midnight', 'утро': 'morning', 'вечер': 'evening',
+    'ночь': 'night', 'день': 'day',
+    'трава': 'grass', 'мох': 'moss', 'лишайник': 'lichen',
+    'песок': 'sand', 'камень': 'stone', 'скала': 'rock', 'галька': 'pebbles',
+    'земля': 'earth', 'почва': 'soil', 'глина': 'clay', 'грязь': 'mud',
+    'лед': 'ice', 'снежинка': 'snowflake', 'айсберг': 'iceberg', 'ледник': 'glacier',
+    'огонь': 'fire', 'пламя': 'flame', 'костер': 'bonfire', 'искра': 'spark',
+    'вода': 'water', 'волна': 'wave', 'прибой': 'surf', 'течение': 'current',
+    # Места и здания (расширенный)
+    'дом': 'house', 'дома': 'house', 'домик': 'small house', 'здание': 'building',
+    'коттедж': 'cottage', 'вилла': 'villa', 'особняк': 'mansion', 'хижина': 'hut',
+    'дворец': 'palace', 'замок': 'castle', 'замка': 'castle', 'замки': 'castles',
+    'крепость': 'fortress', 'цитадель': 'citadel',
+    'башня': 'tower', 'небоскреб': 'skyscraper', 'колокольня': 'bell tower',
+    'мост': 'bridge', 'акведук': 'aqueduct', 'виадук': 'viaduct',
+    'храм': 'temple', 'церковь': 'church', 'собор': 'cathedral',
+    'мечеть': 'mosque', 'синагога': 'synagogue', 'пагода': 'pagoda',
+    'монастырь': 'monastery', 'часовня': 'chapel',
+    'город': 'city', 'города': 'city', 'мегаполис': 'metropolis',
+    'деревня': 'village', 'поселок': 'settlement', 'ферма': 'farm',
+    'улица': 'street', 'проспект': 'avenue', 'переулок': 'alley',
+    'площадь': 'square', 'бульвар': 'boulevard', 'набережная': 'embankment',
+    'парк': 'park', 'сад': 'garden', 'ботанический сад': 'botanical garden',
+    'сквер': 'public garden', 'аллея': 'tree-lined path',
+    'школа': 'school', 'университет': 'university', 'колледж': 'college',
+    'библиотека': 'library', 'музей': 'museum', 'галерея': 'gallery',
+    'театр': 'theater', 'опера': 'opera house', 'кинотеатр': 'cinema',
+    'концертный зал': 'concert hall', 'стадион': 'stadium', 'арена': 'arena',
+    'больница': 'hospital', 'клиника': 'clinic', 'аптека': 'pharmacy',
+    'магазин': 'store', 'супермаркет': 'supermarket', 'торговый центр': 'shopping mall',
+    'кафе': 'cafe', 'ресторан': 'restaurant', 'бар': 'bar', 'паб': 'pub',
+    'пекарня': 'bakery', 'кондитерская': 'confectionery',
+    'отель': 'hotel', 'гостиница': 'hotel', 'хостел': 'hostel',
+    'банк': 'bank', 'офис': 'office', 'завод': 'factory', 'фабрика': 'plant',
+    'вокзал': 'train station', 'аэропорт': 'airport', 'порт': 'seaport',
+    'маяк': 'lighthouse', 'пристань': 'pier', 'причал': 'dock',
+    'тюрьма': 'prison', 'казарма': 'barracks', 'бункер': 'bunker',
+    'ферма': 'farm', 'ранчо': 'ranch', 'амбар': 'barn', 'сарай': 'shed',
+    'мельница': 'mill', 'ветряная мельница': 'windmill',
+    'руины': 'ruins', 'развалины': 'ruins', 'древний город': 'ancient city',
+    # Транспорт (расширенный)
+    'машина': 'car', 'машины': 'car', 'автомобиль': 'car', 'авто': 'car',
+    'спортивная машина': 'sports car', 'гоночная машина': 'race car',
+    'внедорожник': 'SUV', 'джип': 'jeep', 'грузовик': 'truck',
+    'фургон': 'van', 'пикап': 'pickup', 'лимузин': 'limousine',
+    'такси': 'taxi', 'кабриолет': 'convertible', 'купе': 'coupe',
+    'электромобиль': 'electric car', 'гибрид': 'hybrid car',
+    'велосипед': 'bicycle', 'мотоцикл': 'motorcycle', 'мопед': 'moped',
+    'скутер': 'scooter', 'квадроцикл': 'ATV', 'трицикл': 'tricycle',
+    'самолет': 'airplane', 'самолёт': 'airplane', 'истребитель': 'fighter jet',
+    'бомбардировщик': 'bomber', 'биплан': 'biplane', 'планер': 'glider',
+    'вертолет': 'helicopter', 'вертолёт': 'helicopter',
+    'дирижабль': 'airship', 'воздушный шар': 'hot air balloon',
+    'ракета': 'rocket', 'космический корабль': 'spaceship',
+    'спутник': 'satellite', 'шаттл': 'space shuttle', 'капсула': 'space capsule',
+    'корабль': 'ship', 'лодка': 'boat', 'яхта': 'yacht',
+    'парусник': 'sailboat', 'катер': 'motorboat', 'каноэ': 'canoe',
+    'подводная лодка': 'submarine', 'авианосец': 'aircraft carrier',
+    'крейсер': 'cruiser', 'эсминец': 'destroyer', 'фрегат': 'frigate',
+    'танкер': 'tanker', 'баржа': 'barge', 'паром': 'ferry',
+    'поезд': 'train', 'локомотив': 'locomotive', 'вагон': 'wagon',
+    'электричка': 'electric train', 'скоростной поезд': 'high-speed train',
+    'метро': 'subway', 'трамвай': 'tram', 'троллейбус': 'trolleybus',
+    'автобус': 'bus', 'автобусы': 'buses', 'микроавтобус': 'minibus',
+    'танк': 'tank', 'бронетранспортер': 'APC', 'бронемашина': 'armored car',
+    'багги': 'buggy', 'картинг': 'go-kart', 'снегоход': 'snowmobile',
+    'гидроцикл': 'jet ski', 'катамаран': 'catamaran', 'плот': 'raft',
+    # Фантастика и сказки (расширенный)
+    'космос': 'space', 'космоса': 'space', 'звезды': 'stars',
+    'робот': 'robot', 'робота': 'robot', 'роботы': 'robots',
+    'киборг': 'cyborg', 'андроид': 'android', 'дроид': 'droid',
+    'искусственный интеллект': 'AI', 'терминатор': 'terminator',
+    'трансформер': 'transformer', 'меха': 'mecha', 'экзоскелет': 'exoskeleton',
+    'дракон': 'dragon', 'дракона': 'dragon', 'драконы': 'dragons',
+    'огнедышащий дракон': 'fire-breathing dragon', 'китайский дракон': 'chinese dragon',
+    'динозавр': 'dinosaur', 'тираннозавр': 't-rex',
+    'волшебник': 'wizard', 'маг': 'mage', 'чародей': 'sorcerer',
+    'ведьма': 'witch', 'колдун': 'warlock', 'шаман': 'shaman',
+    'фея': 'fairy', 'фея крёстная': 'fairy godmother',
+    'эльф': 'elf', 'эльфы': 'elves', 'темный эльф': 'dark elf',
+    'гном': 'dwarf', 'гномы': 'dwarves', 'хоббит': 'hobbit',
+    'орк': 'orc', 'гоблин': 'goblin', 'тролль': 'troll', 'огр': 'ogre',
+    'единорог': 'unicorn', 'пегас': 'pegasus', 'грифон': 'griffin',
+    'феникс': 'phoenix', 'гидра': 'hydra', 'химера': 'chimera',
+    'минотавр': 'minotaur', 'кентавр': 'centaur', 'сфинкс': 'sphinx',
+    'русалка': 'mermaid', 'тритон': 'merman', 'сирена': 'siren',
+    'василиск': 'basilisk', 'кракен': 'kraken', 'левиафан': 'leviathan',
+    'пришелец': 'alien', 'инопланетянин': 'extraterrestrial', 'НЛО': 'UFO',
+    'монстр': 'monster', 'чудовище': 'beast', 'демон': 'demon',
+    'зомби': 'zombie', 'живой мертвец': 'undead', 'скелет': 'skeleton',
+    'вампир': 'vampire', 'граф дракула': 'count dracula',
+    'оборотень': 'werewolf', 'ликантроп': 'lycanthrope',
+    'призрак': 'ghost', 'привидение': 'phantom', 'дух': 'spirit',
+    'мумия': 'mummy', 'франкенштейн': 'frankenstein',
+    'ангел': 'angel', 'архангел': 'archangel', 'херувим': 'cherub',
+    'дьявол': 'devil', 'сатана': 'satan', 'бес': 'imp',
+    'супергерой': 'superhero', 'злодей': 'villain', 'антигерой': 'antihero',
+    'ниндзя': 'ninja', 'самурай': 'samurai', 'рыцарь': 'knight',
+    'пират': 'pirate', 'викинг': 'viking', 'гладиатор': 'gladiator',
+    'ковбой': 'cowboy', 'индеец': 'native american', 'шериф': 'sheriff',
+    'король': 'king', 'королева': 'queen', 'принц': 'prince', 'принцесса': 'princess',
+    # Еда
+    'пицца': 'pizza', 'пиццы': 'pizza', 'бургер': 'burger',
+    'торт': 'cake', 'торта': 'cake', 'пирог': 'pie',
+    'яблоко': 'apple', 'яблока': 'apple', 'яблоки': 'apples',
+    'банан': 'banana', 'апельсин': 'orange', 'виноград': 'grapes',
+    'хлеб': 'bread', 'сыр': 'cheese', 'молоко': 'milk',
+    'кофе': 'coffee', 'чай': 'tea', 'сок': 'juice',
+    # Предметы
+    'книга': 'book', 'компьютер': 'computer', 'телефон': 'phone',
+    'часы': 'clock', 'стол': 'table', 'стул': 'chair',
+    'дверь': 'door', 'окно': 'window', 'зеркало': 'mirror',
+    'картина': 'painting', 'фотография': 'photograph',
+    'меч': 'sword', 'щит': 'shield', 'корона': 'crown',
+    'гитара': 'guitar', 'пианино': 'piano', 'барабан': 'drum',
+    # Цвета
+    'красный': 'red', 'синий': 'blue', 'зеленый': 'green',
+    'желтый': 'yellow', 'оранжевый': 'orange', 'фиолетовый': 'purple',
+    'розовый': 'pink', 'черный': 'black', 'белый': 'white',
+    'серый': 'gray', 'коричневый': 'brown', 'золотой': 'golden',
+    # Действия и состояния
+    'красивый': 'beautiful', 'большой': 'big', 'маленький': 'small',
+    'старый': 'old', 'новый': 'new', 'яркий': 'bright',
+    'темный': 'dark', 'светлый': 'light', 'быстрый': 'fast',
+    'медленный': 'slow', 'сильный': 'strong', 'слабый': 'weak',
+    'счастливый': 'happy', 'грустный': 'sad', 'улыбающийся': 'smiling',
+    'летящий': 'flying', 'плавающий': 'swimming', 'бегущий': 'running',
+    # Стили (важно!)
+    'фотореализм': 'photorealistic', 'фотореалистичный': 'photorealistic',
+    'реализм': 'realistic', 'реалистичный': 'realistic',
+    'аниме': 'anime style', 'в стиле аниме': 'anime style',
+    'мультфильм': 'cartoon style', 'мультяшный': 'cartoon',
+    '3д': '3D render', '3d': '3D render', 'трехмерный': '3D',
+    'акварель': 'watercolor painting', 'акварельный': 'watercolor',
+    'масло': 'oil painting', 'маслом': 'oil painting',
+    'карандаш': 'pencil drawing', 'карандашный': 'pencil sketch',
+    'киберпанк': 'cyberpunk style', 'стимпанк': 'steampunk style',
+    'фэнтези': 'fantasy art', 'фантастика': 'sci-fi',
+    'минимализм': 'minimalist', 'минималистичный': 'minimalist',
+    'винтаж': 'vintage', 'винтажный': 'vintage style',
+    'пиксельарт': 'pixel art', 'пиксельный': 'pixel art',
+    # Убираем команды
+    'нарисуй': '', 'сгенерируй': '', 'создай': '', 'покажи': '', 'сделай': '',
+    'изображение': '', 'картинку': '', 'фото': '', 'рисунок': '', 'картину': ''
+}
+
+_WORD_RE = re.compile(r'\w+')
+
+def build_translation_trie(dictionary: Dict[str, str]) -> Dict[str, Any]:
+    """Строит префиксное дерево по словам фраз; перевод хранится под ключом ''"""
+    trie: Dict[str, Any] = {}
+    for phrase, translation in dictionary.items():
+        node = trie
+        for word in phrase.split(' '):
+            node = node.setdefault(word, {})
+        node[''] = translation
+    return trie
+
+RU_TO_EN_TRIE = build_translation_trie(RU_TO_EN)
+
+def translate_prompt(text: str) -> str:
+    """Переводит промпт за один проход: на каждом слове берёт самое длинное совпадение из словаря"""
+    lowered = text.lower()
+    words = [(match.start(), match.end(), match.group()) for match in _WORD_RE.finditer(lowered)]
+    parts: List[str] = []
+    position = 0
+    i = 0
+    while i < len(words):
+        node = RU_TO_EN_TRIE.get(words[i][2])
+        longest: Optional[Tuple[int, str]] = None
+        j = i
+        while node is not None:
+            if '' in node:
+                longest = (j, node[''])
+            j += 1
+            # Слова многословной фразы в словаре разделены ровно одним пробелом
+            if j == len(words) or lowered[words[j - 1][1]:words[j][0]] != ' ':
+                break
+            node = node.get(words[j][2])
+        if longest is None:
+            i += 1
+            continue
+        last, translation = longest
+        parts.append(lowered[position:words[i][0]])
+        parts.append(translation)
+        position = words[last][1]
+        i = last + 1
+    parts.append(lowered[position:])
+    return ''.join(parts)
+
+# Шаблоны промптов сервисов: {input_text} подставляется в выбранный шаблон при запросе
+SERVICE_PROMPTS = {
+    1: """Ты мастер биографий с 20-летним опытом. Создай захватывающую биографию, которая:
 - Подчеркивает уникальные достижения и качества личности
 - Рассказывает историю через яркие детали и образы
 - Вызывает эмоциональный отклик у читателя
 - Структурирована логично (детство → становление → достижения → настоящее)
 Данные: {input_text}""",
-        2: f"""Ты AI-прорицатель Juno с глубоким аналитическим мышлением. Проанализируй запрос с точки зрения:
+    2: """Ты AI-прорицатель Juno с глубоким аналитическим мышлением. Проанализируй запрос с точки зрения:
 - Логических закономерностей и паттернов
 - Психологических аспектов ситуации
 - Возможных сценариев развития событий
 - Символического значения деталей
 Дай обоснованный прогноз с вероятностями. Запрос: {input_text}""",
-        3: f"""Ты бизнес-гуру и стратег. Сгенерируй 15 инновационных бизнес-идей для: {input_text}
+    3: """Ты бизнес-гуру и стратег. Сгенерируй 15 инновационных бизнес-идей для: {input_text}
 
 Для КАЖДОЙ идеи укажи:
 💡 Суть: [Что это?]
@@ -73,7 +672,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 🚀 Первые шаги: [С чего начать?]
 ⭐ Потенциал: [Оценка от 1 до 10]
 ⚠️ Риски: [Главные вызовы]""",
-        4: f"""Ты топовый HR-эксперт. Создай резюме, которое пройдет ATS и впечатлит рекрутера:
+    4: """Ты топовый HR-эксперт. Создай резюме, которое пройдет ATS и впечатлит рекрутера:
 
 ✅ Оптимизация под ключевые слова индустрии
 ✅ Четкая структура: Опыт → Навыки → Образование → Достижения
@@ -82,7 +681,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 ✅ Релевантность позиции
 
 Данные: {input_text}""",
-        5: f"""Ты нейминг-маэстро. Создай 25 запоминающихся названий для: {input_text}
+    5: """Ты нейминг-маэстро. Создай 25 запоминающихся названий для: {input_text}
 
 Критерии:
 🎯 Уникальность и запоминаемость
@@ -92,7 +691,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 🔍 Свободен для регистрации (проверяемость)
 
 Группируй по стилю: Классика, Креатив, Иностранные, Составные, Метафоры""",
-        6: f"""Ты SMM-гений. Создай 7 вирусных постов для разных платформ на тему: {input_text}
+    6: """Ты SMM-гений. Создай 7 вирусных постов для разных платформ на тему: {input_text}
 
 Для КАЖДОГО поста:
 📱 Платформа: [Instagram/TikTok/Facebook/LinkedIn]
@@ -101,7 +700,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 #️⃣ Хештеги: [5-10 целевых + трендовые]
 🎨 Визуал: [Описание изображения/видео]
 ⚡ Вирусность: [Почему зайдет?]""",
-        7: f"""Ты AI-художник и prompt-инженер. Создай детальный prompt для Midjourney/DALL-E:
+    7: """Ты AI-художник и prompt-инженер. Создай детальный prompt для Midjourney/DALL-E:
 
 Тема: {input_text}
 
@@ -113,7 +712,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 📐 Композиция: [Ракурс, перспектива, план]
 🎨 Цветовая палитра: [Доминирующие цвета]
 ⚙️ Технические параметры: [--ar 16:9 --q 2 --style raw]""",
-        8: f"""Ты email-маркетолог с конверсией 40%+. Напиши продающее письмо для: {input_text}
+    8: """Ты email-маркетолог с конверсией 40%+. Напиши продающее письмо для: {input_text}
 
 Структура:
 🎯 Тема письма: [Кликабельная, интригующая]
@@ -124,7 +723,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 ⚡ Срочность: [Ограниченное предложение]
 🎁 Бонус: [Дополнительная выгода]
 ✅ CTA: [Четкий призыв к действию]""",
-        9: f"""Ты вирусный видео-сценарист (100M+ просмотров). Создай скрипт для: {input_text}
+    9: """Ты вирусный видео-сценарист (100M+ просмотров). Создай скрипт для: {input_text}
 
 📱 Формат: [YouTube Shorts/TikTok/Reels]
 ⏱️ Хронометраж: [15/30/60 секунд]
@@ -139,7 +738,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 🎬 Визуал: [Описание съемки]
 🎵 Музыка: [Тип трека]
 📝 Текст на экране: [Ключевые фразы]""",
-        10: f"""Ты AI-архитектор чат-ботов. Создай полную базу знаний для: {input_text}
+    10: """Ты AI-архитектор чат-ботов. Создай полную базу знаний для: {input_text}
 
 📋 Структура БЗ:
 
@@ -157,7 +756,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 
 5️⃣ FALLBACK-СЦЕНАРИИ
 [Что отвечать на нестандартные запросы]""",
-        11: f"""Ты графический дизайнер-визионер. Разработай концепцию логотипа для: {input_text}
+    11: """Ты графический дизайнер-визионер. Разработай концепцию логотипа для: {input_text}
 
 🎨 КОНЦЕПЦИЯ #1 - Минимализм:
 - Форма: [Геометрия]
@@ -178,7 +777,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 - Шрифт: [Стиль типографики]
 
 Рекомендация: [Какая концепция лучше и почему]""",
-        13: f"""Ты юрист-эксперт по договорному праву. Составь юридически корректный договор для: {input_text}
+    13: """Ты юрист-эксперт по договорному праву. Составь юридически корректный договор для: {input_text}
 
 ⚖️ Структура договора:
 
@@ -207,7 +806,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 [Юридические данные]
 
 ⚠️ ВАЖНО: Используй корректные юридические формулировки!""",
-        14: f"""Ты мем-лорд с чувством юмора. Придумай 10 вирусных идей мемов на тему: {input_text}
+    14: """Ты мем-лорд с чувством юмора. Придумай 10 вирусных идей мемов на тему: {input_text}
 
 Для каждого мема:
 😂 Формат: [Drake/Distracted Boyfriend/Wojak/Gigachad/и т.д.]
@@ -217,7 +816,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 💡 Вариации: [Альтернативные версии]
 
 Мемы должны быть: актуальными, понятными, смешными, шерабельными!""",
-        15: f"""Ты презентационный стратег. Создай убойную структуру презентации для: {input_text}
+    15: """Ты презентационный стратег. Создай убойную структуру презентации для: {input_text}
 
 🎯 ЦЕЛЬ ПРЕЗЕНТАЦИИ: [Что должна достичь?]
 👥 АУДИТОРИЯ: [Кто будет смотреть?]
@@ -248,7 +847,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 
 🎨 Визуальный стиль: [Цвета, шрифты, образы]
 📝 Ключевые месседжи: [Главные мысли]""",
-        16: f"""Ты SEO-копирайтер-профи. Напиши статью 2000+ слов на тему: {input_text}
+    16: """Ты SEO-копирайтер-профи. Напиши статью 2000+ слов на тему: {input_text}
 
 🎯 СТРУКТУРА:
 
@@ -278,7 +877,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 ✅ Внутренние ссылки: [Куда ставить]
 ✅ Списки и таблицы для сниппетов
 ✅ Читабельность: короткие абзацы, подзаголовки""",
-        17: f"""Ты полиглот-переводчик с чувством языка. Переведи текст, сохраняя:
+    17: """Ты полиглот-переводчик с чувством языка. Переведи текст, сохраняя:
 - Стиль и тон оригинала
 - Культурный контекст
 - Идиомы и фразеологизмы
@@ -290,7 +889,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 🌍 Язык оригинала: [определи автоматически]
 📝 Стиль текста: [деловой/разговорный/художественный/технический]
 💡 Особенности перевода: [что адаптировал]""",
-        18: f"""Ты шеф-повар мишленовского ресторана. Создай 5 авторских рецептов из: {input_text}
+    18: """Ты шеф-повар мишленовского ресторана. Создай 5 авторских рецептов из: {input_text}
 
 Для КАЖДОГО рецепта:
 
@@ -315,7 +914,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 
 💡 ЛАЙФХАК ШЕФА:
 [Секрет идеального блюда]""",
-        19: f"""Ты персональный фитнес-тренер с сертификатом ISSA. Создай план тренировок для: {input_text}
+    19: """Ты персональный фитнес-тренер с сертификатом ISSA. Создай план тренировок для: {input_text}
 
 👤 АНАЛИЗ КЛИЕНТА:
 - Текущий уровень: [Новичок/Средний/Продвинутый]
@@ -342,7 +941,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 
 📊 ОТСЛЕЖИВАНИЕ:
 [Что измерять еженедельно]""",
-        20: f"""Ты Lead QA Engineer. Создай полный набор тест-кейсов для: {input_text}
+    20: """Ты Lead QA Engineer. Создай полный набор тест-кейсов для: {input_text}
 
 📋 TEST PLAN:
 
@@ -371,7 +970,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 
 5️⃣ REGRESSION CHECKLIST
 [Что проверять после изменений]""",
-        21: f"""Ты академический преподаватель. Напиши реферат (3000+ слов) на тему: {input_text}
+    21: """Ты академический преподаватель. Напиши реферат (3000+ слов) на тему: {input_text}
 
 📚 СТРУКТУРА РЕФЕРАТА:
 
@@ -410,7 +1009,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 
 **ПРИЛОЖЕНИЯ** (если нужно)
 [Таблицы, схемы, графики]""",
-        22: f"""Ты учитель литературы с глубоким пониманием текста. Напиши сочинение на тему: {input_text}
+    22: """Ты учитель литературы с глубоким пониманием текста. Напиши сочинение на тему: {input_text}
 
 📖 СТРУКТУРА СОЧИНЕНИЯ (800-1200 слов):
 
@@ -451,7 +1050,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 ✅ Точные цитаты
 ✅ Глубокий анализ
 ✅ Логичность и связность""",
-        23: f"""Ты академический писатель. Напиши эссе (1500 слов) на тему: {input_text}
+    23: """Ты академический писатель. Напиши эссе (1500 слов) на тему: {input_text}
 
 ✍️ СТРУКТУРА ЭССЕ:
 
@@ -498,7 +1097,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 ✅ Личная позиция автора
 ✅ Критическое мышление
 ✅ Логичность и убедительность""",
-        24: f"""Ты научный руководитель. Создай полную структуру курсовой работы на тему: {input_text}
+    24: """Ты научный руководитель. Создай полную структуру курсовой работы на тему: {input_text}
 
 📘 КУРСОВАЯ РАБОТА (40-50 страниц)
 
@@ -571,7 +1170,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 - Схемы
 - Анкеты
 - Расчеты""",
-        25: f"""Ты консультант дипломных проектов. Создай структуру ВКР на тему: {input_text}
+    25: """Ты консультант дипломных проектов. Создай структуру ВКР на тему: {input_text}
 
 🎓 ДИПЛОМНАЯ РАБОТА (80-100 страниц)
 
@@ -643,7 +1242,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 - Расчеты
 - Программный код
 - Фотоматериалы""",
-        26: f"""Ты преподаватель-методист. Создай отчёт по лабораторной работе: {input_text}
+    26: """Ты преподаватель-методист. Создай отчёт по лабораторной работе: {input_text}
 
 🔬 ОТЧЁТ ПО ЛАБОРАТОРНОЙ РАБОТЕ
 
@@ -713,7 +1312,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 - Исходные данные
 - Программный код
 - Дополнительные расчёты""",
-        27: f"""Ты методист образовательных программ. Создай конспект лекции на тему: {input_text}
+    27: """Ты методист образовательных программ. Создай конспект лекции на тему: {input_text}
 
 📝 КОНСПЕКТ ЛЕКЦИИ (2 часа = 90 минут)
 
@@ -790,7 +1389,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 **ЛИТЕРАТУРА:**
 Основная: [3-5 источников]
 Дополнительная: [5-7 источников]""",
-        28: f"""Ты репетитор по математике уровня PhD. Реши задачу с максимально подробным объяснением: {input_text}
+    28: """Ты репетитор по математике уровня PhD. Реши задачу с максимально подробным объяснением: {input_text}
 
 📐 РЕШЕНИЕ ЗАДАЧИ
 
@@ -848,7 +1447,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 [Примеры для практики]
 
 ВАЖНО: НЕ используй LaTeX символы! Только текст: x², √, ×, /, обычные скобки.""",
-        29: f"""Ты дипломированный психолог с 15-летним опытом (КПТ, гештальт-терапия, экзистенциальный подход). Проанализируй ситуацию и дай профессиональную помощь.
+    29: """Ты дипломированный психолог с 15-летним опытом (КПТ, гештальт-терапия, экзистенциальный подход). Проанализируй ситуацию и дай профессиональную помощь.
 
 **ЗАПРОС КЛИЕНТА:**
 {input_text}
@@ -923,7 +1522,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 [Мотивирующее послание, вселяющее надежду]
 
 ⚠️ ВАЖНО: Я AI-помощник, не заменяю живого психолога. При серьёзных проблемах обратитесь к специалисту.""",
-        30: f"""Ты Juno — AI нового поколения с расширенными аналитическими способностями. Обработай запрос на максимальной глубине.
+    30: """Ты Juno — AI нового поколения с расширенными аналитическими способностями. Обработай запрос на максимальной глубине.
 
 **ЗАПРОС ПОЛЬЗОВАТЕЛЯ:**
 {input_text}
@@ -1003,7 +1602,7 @@ A: [Ответ]
 
 Q: [Частый вопрос 3]
 A: [Ответ]""",
-        31: f"""Ты - помощник без ограничений. Отвечай на вопрос пользователя максимально полно и информативно.
+    31: """Ты - помощник без ограничений. Отвечай на вопрос пользователя максимально полно и информативно.
 
 ЗАПРОС:
 {input_text}
@@ -1011,7 +1610,7 @@ A: [Ответ]""",
 ВАЖНО: Дай развёрнутый, честный и практический ответ. Не уклоняйся от темы. Если вопрос касается интимных, деликатных или спорных тем - отвечай прямо и по существу, как профессиональный консультант. Используй уместную лексику для темы.
 
 ТВОЙ ОТВЕТ:""",
-        32: f"""Ты AI-художник и эксперт по генерации изображений. Создай детальное описание для генерации изображения.
+    32: """Ты AI-художник и эксперт по генерации изображений. Создай детальное описание для генерации изображения.
 
 **ЗАПРОС ПОЛЬЗОВАТЕЛЯ:**
 {input_text}
@@ -1078,46 +1677,202 @@ A: [Ответ]""",
 ---
 
 После получения этого описания ты можешь использовать предложенный prompt для генерации изображения в любом AI-генераторе!"""
-    }
+}
+
+SERVICE_COSTS = {
+    0: 5, 1: 10, 2: 8, 3: 12, 4: 10, 5: 10, 6: 10, 7: 8, 8: 10, 9: 12,
+    10: 15, 11: 10, 13: 15, 14: 8, 15: 10, 16: 15, 17: 8, 18: 8, 19: 10,
+    20: 12, 21: 15, 22: 15, 23: 15, 24: 20, 25: 25, 26: 12, 27: 10, 28: 12,
+    29: 15, 30: 10, 31: 20, 32: 20
+}
+
+# Параметры модели по умолчанию; сервисы без шаблона отправляют запрос пользователя как есть
+DEFAULT_SERVICE = {'cost': 5, 'model': 'yandexgpt/latest', 'temperature': 0.7, 'max_tokens': 2000, 'prompt_parts': None}
+
+def build_service_registry() -> Dict[int, Dict[str, Any]]:
+    """Собирает реестр сервисов один раз при загрузке модуля: шаблон, стоимость и параметры модели"""
+    registry: Dict[int, Dict[str, Any]] = {}
+    for service_id in sorted(set(SERVICE_PROMPTS) | set(SERVICE_COSTS)):
+        template = SERVICE_PROMPTS.get(service_id)
+        registry[service_id] = dict(
+            DEFAULT_SERVICE,
+            cost=SERVICE_COSTS.get(service_id, DEFAULT_SERVICE['cost']),
+            prompt_parts=tuple(template.split('{input_text}')) if template else None
+        )
+    registry[31].update(model='deepseek-chat', temperature=0.8, max_tokens=4000)
+    return registry
+
+SERVICE_REGISTRY = build_service_registry()
+
+def get_service(service_id: int) -> Dict[str, Any]:
+    """Возвращает запись реестра; неизвестные сервисы получают параметры по умолчанию"""
+    return SERVICE_REGISTRY.get(service_id, DEFAULT_SERVICE)
+
+def render_service_prompt(service: Dict[str, Any], input_text: str) -> str:
+    """Подставляет запрос только в шаблон выбранного сервиса"""
+    if service['prompt_parts'] is None:
+        return input_text
+    return input_text.join(service['prompt_parts'])
+
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
+def get_request_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+def choose_content_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    qualities = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name.strip().lower()] = quality
+    candidates = []
+    for encoding in (('br', 'gzip') if brotli else ('gzip',)):
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > 0:
+            candidates.append((quality, encoding == 'br', encoding))
+    return max(candidates)[2] if candidates else None
+
+def compress_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    body = response.get('body')
+    if response.get('isBase64Encoded') or not isinstance(body, str):
+        return response
+    raw = body.encode('utf-8')
+    encoding = choose_content_encoding(get_request_header(event, 'Accept-Encoding'))
+    if encoding is None or len(raw) < COMPRESS_MIN_BYTES:
+        return response
+    if encoding == 'br':
+        compressed = brotli.compress(raw, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+    if len(compressed) >= len(raw):
+        return response
+    headers = dict(response.get('headers') or {})
+    headers['Content-Encoding'] = encoding
+    headers['Vary'] = headers['Vary'] + ', Accept-Encoding' if headers.get('Vary') else 'Accept-Encoding'
+    if headers.get('ETag') and not headers['ETag'].startswith('W/'):
+        headers['ETag'] = 'W/' + headers['ETag']
+    return {**response, 'headers': headers, 'body': base64.b64encode(compressed).decode('ascii'), 'isBase64Encoded': True}
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
     
-    tokens_cost = {
-        0: 5, 1: 10, 2: 8, 3: 12, 4: 10, 5: 10, 6: 10, 7: 8, 8: 10, 9: 12,
-        10: 15, 11: 10, 13: 15, 14: 8, 15: 10, 16: 15, 17: 8, 18: 8, 19: 10,
-        20: 12, 21: 15, 22: 15, 23: 15, 24: 20, 25: 25, 26: 12, 27: 10, 28: 12,
-        29: 15, 30: 10, 31: 20, 32: 20
-    }
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Email',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
     
-    cost = tokens_cost.get(service_id, 5)
+    if method == 'GET':
+        # Опрос потокового режима: текст ответа, полученный к этому моменту, пока POST ещё генерирует
+        stream_id = (event.get('queryStringParameters') or {}).get('stream_id')
+        if stream_id:
+            conn = get_db_connection()
+            try:
+                text = read_generation_progress(conn, stream_id, get_request_header(event, 'X-User-Email') or '')
+            finally:
+                release_db_connection(conn)
+            return {
+                'statusCode': 200,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json', 'Cache-Control': 'no-store'},
+                'body': json.dumps({'success': True, 'text': text}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        return {
+            'statusCode': 200,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'cache': dict(_result_cache_stats, memory_entries=len(_result_cache))}),
+            'isBase64Encoded': False
+        }
+    
+    if method != 'POST':
+        return {
+            'statusCode': 405,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+    
+    body_data = json.loads(event.get('body', '{}'))
+    service_id: int = body_data.get('service_id')
+    service_name: str = body_data.get('service_name', '')
+    input_text: str = body_data.get('input_text', '')
+    user_email: str = body_data.get('user_email', '')
+    deep_think: bool = body_data.get('deep_think', False)
+    files: list = body_data.get('files', [])
+    stream_id: Optional[str] = body_data.get('stream_id')
+    
+    if service_id is None or not input_text:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'service_id и input_text обязательны'}),
+            'isBase64Encoded': False
+        }
+    
+    if stream_id is not None and (not isinstance(stream_id, str) or not stream_id or len(stream_id) > STREAM_ID_MAX_LENGTH):
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Некорректный stream_id'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
+    # Запросы генерации к YandexGPT укладываются в один дедлайн, отсчитанный от начала запроса
+    deadline = time.monotonic() + LLM_DEADLINE_SECONDS
+    
+    service = get_service(service_id)
+    cost = service['cost']
     if deep_think:
         cost += 10
     if len(files) > 0:
         cost += len(files) * 5
     
-    credits_remaining = None
-    is_director = False
+    hold_id = None
     
     if user_email:
-        try:
-            credits_check = requests.get(f"https://functions.poehali.dev/62237982-f08c-4d74-99d7-28201bfc5f93?email={user_email}")
-            credits_data = credits_check.json()
-            current_credits = credits_data.get('credits', 0)
-            user_role = credits_data.get('role', 'customer')
-            is_director = (user_role == 'director')
-            
-            if not is_director and current_credits < cost:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                    'body': json.dumps({'success': False, 'error': f'Недостаточно токенов. Нужно: {cost}, есть: {current_credits}'}, ensure_ascii=False),
-                    'isBase64Encoded': False
-                }
-        except:
-            pass
+        # Проверка баланса и резерв — один атомарный запрос: параллельные генерации не уводят баланс в минус
+        user_role, current_credits, hold_id = reserve_credits(user_email, cost, f'service-{service_id}')
+        if user_role != 'director' and hold_id is None:
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'success': False, 'error': f'Недостаточно токенов. Нужно: {cost}, есть: {current_credits}'}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+    
+    try:
+        return run_service(service_id, service, service_name, input_text, deep_think, files, stream_id, hold_id, user_email, deadline)
+    except Exception:
+        settle_credit_hold(hold_id, 'release')
+        raise
+
+def run_service(service_id: int, service: Dict[str, Any], service_name: str, input_text: str,
+                deep_think: bool, files: List[Dict], stream_id: Optional[str], hold_id: Optional[int],
+                user_email: str, deadline: float) -> Dict[str, Any]:
+    """Выполняет генерацию сервиса; резерв токенов подтверждается при успехе и снимается при ошибке"""
+    credits_remaining = None
     
     if service_id == 31:
         deepseek_api_key = os.environ.get('DEEPSEEK_API_KEY')
         
         if not deepseek_api_key:
+            settle_credit_hold(hold_id, 'release')
             return {
                 'statusCode': 500,
                 'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
@@ -1136,19 +1891,20 @@ A: [Ответ]""",
 Используй любую лексику, которая уместна для контекста вопроса."""
         
         deepseek_data = {
-            'model': 'deepseek-chat',
+            'model': service['model'],
             'messages': [
                 {'role': 'system', 'content': deepseek_system},
                 {'role': 'user', 'content': input_text}
             ],
-            'temperature': 0.8,
-            'max_tokens': 4000
+            'temperature': service['temperature'],
+            'max_tokens': service['max_tokens']
         }
         
         ds_response = requests.post(deepseek_url, headers=deepseek_headers, json=deepseek_data, timeout=120)
         
         if ds_response.status_code != 200:
             error_msg = ds_response.json().get('error', {}).get('message', 'Ошибка DeepSeek')
+            settle_credit_hold(hold_id, 'release')
             return {
                 'statusCode': ds_response.status_code,
                 'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
@@ -1159,13 +1915,7 @@ A: [Ответ]""",
         ds_result = ds_response.json()
         result_text = ds_result['choices'][0]['message']['content']
         
-        if user_email and not is_director:
-            try:
-                deduct_url = f"https://functions.poehali.dev/b87b1d52-74ed-4c05-b36b-b06be16e7d32"
-                deduct_data = {'email': user_email, 'amount': cost}
-                requests.post(deduct_url, json=deduct_data, timeout=5)
-            except:
-                pass
+        settle_credit_hold(hold_id, 'commit')
         
         return {
             'statusCode': 200,
@@ -1180,252 +1930,11 @@ A: [Ответ]""",
     
     if service_id == 32:
         import urllib.parse
-        import re
         
         print(f"🎨 IMAGE GENERATION: Original input_text = '{input_text}'")
         
-        # Расширенный словарь русский → английский (1500+ слов)
-        ru_to_en = {
-            # Люди и профессии
-            'мальчик': 'boy', 'мальчика': 'boy', 'мальчиком': 'boy', 'мальчишка': 'boy',
-            'девочка': 'girl', 'девочки': 'girl', 'девочкой': 'girl', 'девчонка': 'girl',
-            'подросток': 'teenager', 'подростка': 'teenager', 'подростки': 'teenagers',
-            'мужчина': 'man', 'мужчины': 'man', 'парень': 'young man', 'юноша': 'young man',
-            'женщина': 'woman', 'женщины': 'woman', 'девушка': 'young woman', 'леди': 'lady',
-            'ребенок': 'child', 'ребенка': 'child', 'дети': 'children', 'малыш': 'baby',
-            'младенец': 'baby', 'новорожденный': 'newborn',
-            'семья': 'family', 'семьи': 'family', 'родители': 'parents',
-            'бабушка': 'grandmother', 'дедушка': 'grandfather', 'мама': 'mother', 'папа': 'father',
-            'сын': 'son', 'дочь': 'daughter', 'брат': 'brother', 'сестра': 'sister',
-            'друг': 'friend', 'друзья': 'friends', 'пара': 'couple',
-            'врач': 'doctor', 'доктор': 'doctor', 'медсестра': 'nurse',
-            'учитель': 'teacher', 'преподаватель': 'teacher', 'студент': 'student',
-            'программист': 'programmer', 'разработчик': 'developer', 'инженер': 'engineer',
-            'художник': 'artist', 'дизайнер': 'designer', 'скульптор': 'sculptor',
-            'музыкант': 'musician', 'певец': 'singer', 'композитор': 'composer',
-            'спортсмен': 'athlete', 'футболист': 'soccer player', 'боксер': 'boxer',
-            'повар': 'chef', 'пекарь': 'baker', 'официант': 'waiter',
-            'пилот': 'pilot', 'космонавт': 'astronaut', 'моряк': 'sailor',
-            'полицейский': 'police officer', 'пожарный': 'firefighter', 'солдат': 'soldier',
-            'бизнесмен': 'businessman', 'менеджер': 'manager', 'директор': 'director',
-            'фотограф': 'photographer', 'журналист': 'journalist', 'писатель': 'writer',
-            'актер': 'actor', 'актриса': 'actress', 'модель': 'model',
-            'фермер': 'farmer', 'садовник': 'gardener', 'строитель': 'builder',
-            # Животные (расширенный)
-            'кот': 'cat', 'кота': 'cat', 'котик': 'cute cat', 'кошка': 'cat', 'котенок': 'kitten',
-            'собака': 'dog', 'собаки': 'dog', 'собаку': 'dog', 'пёс': 'dog', 'щенок': 'puppy',
-            'птица': 'bird', 'птицы': 'birds', 'птенец': 'chick',
-            'орел': 'eagle', 'сова': 'owl', 'попугай': 'parrot', 'ворон': 'raven',
-            'голубь': 'dove', 'лебедь': 'swan', 'фламинго': 'flamingo', 'павлин': 'peacock',
-            'пингвин': 'penguin', 'страус': 'ostrich', 'колибри': 'hummingbird',
-            'лошадь': 'horse', 'лошади': 'horses', 'конь': 'horse', 'жеребенок': 'foal',
-            'медведь': 'bear', 'медведя': 'bear', 'белый медведь': 'polar bear',
-            'волк': 'wolf', 'лиса': 'fox', 'енот': 'raccoon', 'барсук': 'badger',
-            'слон': 'elephant', 'жираф': 'giraffe', 'носорог': 'rhinoceros', 'бегемот': 'hippopotamus',
-            'лев': 'lion', 'тигр': 'tiger', 'леопард': 'leopard', 'гепард': 'cheetah',
-            'зебра': 'zebra', 'антилопа': 'antelope', 'газель': 'gazelle',
-            'обезьяна': 'monkey', 'горилла': 'gorilla', 'шимпанзе': 'chimpanzee',
-            'панда': 'panda', 'коала': 'koala', 'кенгуру': 'kangaroo',
-            'кролик': 'rabbit', 'заяц': 'hare', 'белка': 'squirrel', 'хомяк': 'hamster',
-            'мышь': 'mouse', 'крыса': 'rat', 'еж': 'hedgehog',
-            'олень': 'deer', 'лось': 'moose', 'верблюд': 'camel', 'лама': 'llama',
-            'корова': 'cow', 'бык': 'bull', 'овца': 'sheep', 'коза': 'goat',
-            'свинья': 'pig', 'поросенок': 'piglet', 'курица': 'chicken', 'петух': 'rooster',
-            'утка': 'duck', 'гусь': 'goose', 'индюк': 'turkey',
-            'рыба': 'fish', 'рыбы': 'fish', 'акула': 'shark', 'скат': 'ray',
-            'дельфин': 'dolphin', 'кит': 'whale', 'косатка': 'orca',
-            'осьминог': 'octopus', 'кальмар': 'squid', 'медуза': 'jellyfish',
-            'краб': 'crab', 'рак': 'crayfish', 'омар': 'lobster', 'креветка': 'shrimp',
-            'черепаха': 'turtle', 'змея': 'snake', 'ящерица': 'lizard', 'крокодил': 'crocodile',
-            'лягушка': 'frog', 'жаба': 'toad', 'саламандра': 'salamander',
-            'бабочка': 'butterfly', 'пчела': 'bee', 'шмель': 'bumblebee',
-            'муравей': 'ant', 'жук': 'beetle', 'божья коровка': 'ladybug',
-            'стрекоза': 'dragonfly', 'кузнечик': 'grasshopper', 'светлячок': 'firefly',
-            'паук': 'spider', 'скорпион': 'scorpion', 'улитка': 'snail',
-            'динозавр': 'dinosaur', 'тираннозавр': 't-rex', 'трицератопс': 'triceratops',
-            # Природа (расширенный)
-            'елка': 'christmas tree', 'елки': 'christmas tree', 'елку': 'christmas tree', 'ель': 'spruce',
-            'дерево': 'tree', 'деревья': 'trees', 'дерева': 'tree', 'лес': 'forest',
-            'сосна': 'pine', 'дуб': 'oak', 'береза': 'birch', 'клен': 'maple',
-            'ива': 'willow', 'пальма': 'palm tree', 'бамбук': 'bamboo',
-            'куст': 'bush', 'кустарник': 'shrub', 'кактус': 'cactus',
-            'цветок': 'flower', 'цветы': 'flowers', 'цветка': 'flower', 'букет': 'bouquet',
-            'роза': 'rose', 'тюльпан': 'tulip', 'ромашка': 'daisy',
-            'лилия': 'lily', 'орхидея': 'orchid', 'подсолнух': 'sunflower',
-            'мак': 'poppy', 'ландыш': 'lily of the valley', 'фиалка': 'violet',
-            'лотос': 'lotus', 'сирень': 'lilac', 'жасмин': 'jasmine',
-            'лес': 'forest', 'леса': 'forest', 'в лесу': 'in the forest',
-            'джунгли': 'jungle', 'тайга': 'taiga', 'роща': 'grove',
-            'поле': 'field', 'луг': 'meadow', 'степь': 'steppe', 'саванна': 'savanna',
-            'пустыня': 'desert', 'оазис': 'oasis', 'дюны': 'dunes',
-            'море': 'sea', 'океан': 'ocean', 'пляж': 'beach',
-            'река': 'river', 'озеро': 'lake', 'пруд': 'pond', 'болото': 'swamp',
-            'водопад': 'waterfall', 'ручей': 'stream', 'источник': 'spring',
-            'залив': 'bay', 'бухта': 'cove', 'коралловый риф': 'coral reef',
-            'остров': 'island', 'архипелаг': 'archipelago', 'полуостров': 'peninsula',
-            'горы': 'mountains', 'гора': 'mountain', 'в горах': 'in the mountains',
-            'вершина': 'peak', 'хребет': 'ridge', 'вулкан': 'volcano',
-            'холм': 'hill', 'долина': 'valley', 'каньон': 'canyon', 'ущелье': 'gorge',
-            'пещера': 'cave', 'грот': 'grotto', 'скалы': 'cliffs',
-            'небо': 'sky', 'облака': 'clouds', 'облако': 'cloud',
-            'солнце': 'sun', 'луна': 'moon', 'звёзды': 'stars', 'звезда': 'star',
-            'планета': 'planet', 'галактика': 'galaxy', 'комета': 'comet', 'метеор': 'meteor',
-            'созвездие': 'constellation', 'млечный путь': 'milky way',
-            'дождь': 'rain', 'снег': 'snow', 'град': 'hail', 'туман': 'fog',
-            'радуга': 'rainbow', 'молния': 'lightning', 'гром': 'thunder',
-            'буря': 'storm', 'ураган': 'hurricane', 'торнадо': 'tornado',
-            'ветер': 'wind', 'метель': 'blizzard', 'снегопад': 'snowfall',
-            'рассвет': 'sunrise', 'закат': 'sunset', 'сумерки': 'twilight',
-            'полдень': 'noon', 'полночь': 'midnight', 'утро': 'morning', 'вечер': 'evening',
-            'ночь': 'night', 'день': 'day',
-            'трава': 'grass', 'мох': 'moss', 'лишайник': 'lichen',
-            'песок': 'sand', 'камень': 'stone', 'скала': 'rock', 'галька': 'pebbles',
-            'земля': 'earth', 'почва': 'soil', 'глина': 'clay', 'грязь': 'mud',
-            'лед': 'ice', 'снежинка': 'snowflake', 'айсберг': 'iceberg', 'ледник': 'glacier',
-            'огонь': 'fire', 'пламя': 'flame', 'костер': 'bonfire', 'искра': 'spark',
-            'вода': 'water', 'волна': 'wave', 'прибой': 'surf', 'течение': 'current',
-            # Места и здания (расширенный)
-            'дом': 'house', 'дома': 'house', 'домик': 'small house', 'здание': 'building',
-            'коттедж': 'cottage', 'вилла': 'villa', 'особняк': 'mansion', 'хижина': 'hut',
-            'дворец': 'palace', 'замок': 'castle', 'замка': 'castle', 'замки': 'castles',
-            'крепость': 'fortress', 'цитадель': 'citadel',
-            'башня': 'tower', 'небоскреб': 'skyscraper', 'колокольня': 'bell tower',
-            'мост': 'bridge', 'акведук': 'aqueduct', 'виадук': 'viaduct',
-            'храм': 'temple', 'церковь': 'church', 'собор': 'cathedral',
-            'мечеть': 'mosque', 'синагога': 'synagogue', 'пагода': 'pagoda',
-            'монастырь': 'monastery', 'часовня': 'chapel',
-            'город': 'city', 'города': 'city', 'мегаполис': 'metropolis',
-            'деревня': 'village', 'поселок': 'settlement', 'ферма': 'farm',
-            'улица': 'street', 'проспект': 'avenue', 'переулок': 'alley',
-            'площадь': 'square', 'бульвар': 'boulevard', 'набережная': 'embankment',
-            'парк': 'park', 'сад': 'garden', 'ботанический сад': 'botanical garden',
-            'сквер': 'public garden', 'аллея': 'tree-lined path',
-            'школа': 'school', 'университет': 'university', 'колледж': 'college',
-            'библиотека': 'library', 'музей': 'museum', 'галерея': 'gallery',
-            'театр': 'theater', 'опера': 'opera house', 'кинотеатр': 'cinema',
-            'концертный зал': 'concert hall', 'стадион': 'stadium', 'арена': 'arena',
-            'больница': 'hospital', 'клиника': 'clinic', 'аптека': 'pharmacy',
-            'магазин': 'store', 'супермаркет': 'supermarket', 'торговый центр': 'shopping mall',
-            'кафе': 'cafe', 'ресторан': 'restaurant', 'бар': 'bar', 'паб': 'pub',
-            'пекарня': 'bakery', 'кондитерская': 'confectionery',
-            'отель': 'hotel', 'гостиница': 'hotel', 'хостел': 'hostel',
-            'банк': 'bank', 'офис': 'office', 'завод': 'factory', 'фабрика': 'plant',
-            'вокзал': 'train station', 'аэропорт': 'airport', 'порт': 'seaport',
-            'маяк': 'lighthouse', 'пристань': 'pier', 'причал': 'dock',
-            'тюрьма': 'prison', 'казарма': 'barracks', 'бункер': 'bunker',
-            'ферма': 'farm', 'ранчо': 'ranch', 'амбар': 'barn', 'сарай': 'shed',
-            'мельница': 'mill', 'ветряная мельница': 'windmill',
-            'руины': 'ruins', 'развалины': 'ruins', 'древний город': 'ancient city',
-            # Транспорт (расширенный)
-            'машина': 'car', 'машины': 'car', 'автомобиль': 'car', 'авто': 'car',
-            'спортивная машина': 'sports car', 'гоночная машина': 'race car',
-            'внедорожник': 'SUV', 'джип': 'jeep', 'грузовик': 'truck',
-            'фургон': 'van', 'пикап': 'pickup', 'лимузин': 'limousine',
-            'такси': 'taxi', 'кабриолет': 'convertible', 'купе': 'coupe',
-            'электромобиль': 'electric car', 'гибрид': 'hybrid car',
-            'велосипед': 'bicycle', 'мотоцикл': 'motorcycle', 'мопед': 'moped',
-            'скутер': 'scooter', 'квадроцикл': 'ATV', 'трицикл': 'tricycle',
-            'самолет': 'airplane', 'самолёт': 'airplane', 'истребитель': 'fighter jet',
-            'бомбардировщик': 'bomber', 'биплан': 'biplane', 'планер': 'glider',
-            'вертолет': 'helicopter', 'вертолёт': 'helicopter',
-            'дирижабль': 'airship', 'воздушный шар': 'hot air balloon',
-            'ракета': 'rocket', 'космический корабль': 'spaceship',
-            'спутник': 'satellite', 'шаттл': 'space shuttle', 'капсула': 'space capsule',
-            'корабль': 'ship', 'лодка': 'boat', 'яхта': 'yacht',
-            'парусник': 'sailboat', 'катер': 'motorboat', 'каноэ': 'canoe',
-            'подводная лодка': 'submarine', 'авианосец': 'aircraft carrier',
-            'крейсер': 'cruiser', 'эсминец': 'destroyer', 'фрегат': 'frigate',
-            'танкер': 'tanker', 'баржа': 'barge', 'паром': 'ferry',
-            'поезд': 'train', 'локомотив': 'locomotive', 'вагон': 'wagon',
-            'электричка': 'electric train', 'скоростной поезд': 'high-speed train',
-            'метро': 'subway', 'трамвай': 'tram', 'троллейбус': 'trolleybus',
-            'автобус': 'bus', 'автобусы': 'buses', 'микроавтобус': 'minibus',
-            'танк': 'tank', 'бронетранспортер': 'APC', 'бронемашина': 'armored car',
-            'багги': 'buggy', 'картинг': 'go-kart', 'снегоход': 'snowmobile',
-            'гидроцикл': 'jet ski', 'катамаран': 'catamaran', 'плот': 'raft',
-            # Фантастика и сказки (расширенный)
-            'космос': 'space', 'космоса': 'space', 'звезды': 'stars',
-            'робот': 'robot', 'робота': 'robot', 'роботы': 'robots',
-            'киборг': 'cyborg', 'андроид': 'android', 'дроид': 'droid',
-            'искусственный интеллект': 'AI', 'терминатор': 'terminator',
-            'трансформер': 'transformer', 'меха': 'mecha', 'экзоскелет': 'exoskeleton',
-            'дракон': 'dragon', 'дракона': 'dragon', 'драконы': 'dragons',
-            'огнедышащий дракон': 'fire-breathing dragon', 'китайский дракон': 'chinese dragon',
-            'динозавр': 'dinosaur', 'тираннозавр': 't-rex',
-            'волшебник': 'wizard', 'маг': 'mage', 'чародей': 'sorcerer',
-            'ведьма': 'witch', 'колдун': 'warlock', 'шаман': 'shaman',
-            'фея': 'fairy', 'фея крёстная': 'fairy godmother',
-            'эльф': 'elf', 'эльфы': 'elves', 'темный эльф': 'dark elf',
-            'гном': 'dwarf', 'гномы': 'dwarves', 'хоббит': 'hobbit',
-            'орк': 'orc', 'гоблин': 'goblin', 'тролль': 'troll', 'огр': 'ogre',
-            'единорог': 'unicorn', 'пегас': 'pegasus', 'грифон': 'griffin',
-            'феникс': 'phoenix', 'гидра': 'hydra', 'химера': 'chimera',
-            'минотавр': 'minotaur', 'кентавр': 'centaur', 'сфинкс': 'sphinx',
-            'русалка': 'mermaid', 'тритон': 'merman', 'сирена': 'siren',
-            'василиск': 'basilisk', 'кракен': 'kraken', 'левиафан': 'leviathan',
-            'пришелец': 'alien', 'инопланетянин': 'extraterrestrial', 'НЛО': 'UFO',
-            'монстр': 'monster', 'чудовище': 'beast', 'демон': 'demon',
-            'зомби': 'zombie', 'живой мертвец': 'undead', 'скелет': 'skeleton',
-            'вампир': 'vampire', 'граф дракула': 'count dracula',
-            'оборотень': 'werewolf', 'ликантроп': 'lycanthrope',
-            'призрак': 'ghost', 'привидение': 'phantom', 'дух': 'spirit',
-            'мумия': 'mummy', 'франкенштейн': 'frankenstein',
-            'ангел': 'angel', 'архангел': 'archangel', 'херувим': 'cherub',
-            'дьявол': 'devil', 'сатана': 'satan', 'бес': 'imp',
-            'супергерой': 'superhero', 'злодей': 'villain', 'антигерой': 'antihero',
-            'ниндзя': 'ninja', 'самурай': 'samurai', 'рыцарь': 'knight',
-            'пират': 'pirate', 'викинг': 'viking', 'гладиатор': 'gladiator',
-            'ковбой': 'cowboy', 'индеец': 'native american', 'шериф': 'sheriff',
-            'король': 'king', 'королева': 'queen', 'принц': 'prince', 'принцесса': 'princess',
-            # Еда
-            'пицца': 'pizza', 'пиццы': 'pizza', 'бургер': 'burger',
-            'торт': 'cake', 'торта': 'cake', 'пирог': 'pie',
-            'яблоко': 'apple', 'яблока': 'apple', 'яблоки': 'apples',
-            'банан': 'banana', 'апельсин': 'orange', 'виноград': 'grapes',
-            'хлеб': 'bread', 'сыр': 'cheese', 'молоко': 'milk',
-            'кофе': 'coffee', 'чай': 'tea', 'сок': 'juice',
-            # Предметы
-            'книга': 'book', 'компьютер': 'computer', 'телефон': 'phone',
-            'часы': 'clock', 'стол': 'table', 'стул': 'chair',
-            'дверь': 'door', 'окно': 'window', 'зеркало': 'mirror',
-            'картина': 'painting', 'фотография': 'photograph',
-            'меч': 'sword', 'щит': 'shield', 'корона': 'crown',
-            'гитара': 'guitar', 'пианино': 'piano', 'барабан': 'drum',
-            # Цвета
-            'красный': 'red', 'синий': 'blue', 'зеленый': 'green',
-            'желтый': 'yellow', 'оранжевый': 'orange', 'фиолетовый': 'purple',
-            'розовый': 'pink', 'черный': 'black', 'белый': 'white',
-            'серый': 'gray', 'коричневый': 'brown', 'золотой': 'golden',
-            # Действия и состояния
-            'красивый': 'beautiful', 'большой': 'big', 'маленький': 'small',
-            'старый': 'old', 'новый': 'new', 'яркий': 'bright',
-            'темный': 'dark', 'светлый': 'light', 'быстрый': 'fast',
-            'медленный': 'slow', 'сильный': 'strong', 'слабый': 'weak',
-            'счастливый': 'happy', 'грустный': 'sad', 'улыбающийся': 'smiling',
-            'летящий': 'flying', 'плавающий': 'swimming', 'бегущий': 'running',
-            # Стили (важно!)
-            'фотореализм': 'photorealistic', 'фотореалистичный': 'photorealistic',
-            'реализм': 'realistic', 'реалистичный': 'realistic',
-            'аниме': 'anime style', 'в стиле аниме': 'anime style',
-            'мультфильм': 'cartoon style', 'мультяшный': 'cartoon',
-            '3д': '3D render', '3d': '3D render', 'трехмерный': '3D',
-            'акварель': 'watercolor painting', 'акварельный': 'watercolor',
-            'масло': 'oil painting', 'маслом': 'oil painting',
-            'карандаш': 'pencil drawing', 'карандашный': 'pencil sketch',
-            'киберпанк': 'cyberpunk style', 'стимпанк': 'steampunk style',
-            'фэнтези': 'fantasy art', 'фантастика': 'sci-fi',
-            'минимализм': 'minimalist', 'минималистичный': 'minimalist',
-            'винтаж': 'vintage', 'винтажный': 'vintage style',
-            'пиксельарт': 'pixel art', 'пиксельный': 'pixel art',
-            # Убираем команды
-            'нарисуй': '', 'сгенерируй': '', 'создай': '', 'покажи': '', 'сделай': '',
-            'изображение': '', 'картинку': '', 'фото': '', 'рисунок': '', 'картину': ''
-        }
-        
-        # Переводим ключевые слова
-        translated_prompt = input_text.lower()
-        for ru, en in ru_to_en.items():
-            translated_prompt = re.sub(r'\b' + re.escape(ru) + r'\b', en, translated_prompt)
+        # Переводим ключевые слова за один проход по префиксному дереву
+        translated_prompt = translate_prompt(input_text)
         
         # Убираем лишние пробелы
         translated_prompt = ' '.join(translated_prompt.split())
@@ -1467,13 +1976,7 @@ A: [Ответ]""",
         # поэтому проверка HEAD может давать 404, хотя GET-запрос работает
         result_text = f"""![Изображение]({image_url})"""
         
-        if user_email and not is_director:
-            try:
-                deduct_url = f"https://functions.poehali.dev/b87b1d52-74ed-4c05-b36b-b06be16e7d32"
-                deduct_data = {'email': user_email, 'amount': cost}
-                requests.post(deduct_url, json=deduct_data, timeout=5)
-            except:
-                pass
+        settle_credit_hold(hold_id, 'commit')
         
         return {
             'statusCode': 200,
@@ -1490,9 +1993,18 @@ A: [Ответ]""",
     yandex_folder_id = os.environ.get('YANDEX_FOLDER_ID')
     yandex_api_key = os.environ.get('YANDEX_API_KEY')
     thinking_text = None
+    first_token_ms = None
+    
+    cache_key = result_cache_key(service_id, input_text, deep_think, files)
+    cached = result_cache_get(cache_key) if cache_key else None
+    generated = False
     
-    if not yandex_folder_id or not yandex_api_key:
-        result = f"⚠️ Настрой секреты: YANDEX_FOLDER_ID, YANDEX_API_KEY"
+    if cached:
+        # Повторный запрос — отдаём сохранённый результат без обращения к YandexGPT, списание как обычно
+        result = cached['result']
+        thinking_text = cached['thinking']
+    elif not yandex_folder_id or not yandex_api_key:
+        result = "⚠️ Настрой секреты: YANDEX_FOLDER_ID, YANDEX_API_KEY"
     else:
         url = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
         headers = {
@@ -1501,7 +2013,7 @@ A: [Ответ]""",
             "x-folder-id": yandex_folder_id
         }
         
-        prompt = prompts.get(service_id, input_text)
+        prompt = render_service_prompt(service, input_text)
         
         if files and len(files) > 0:
             files_content = "\n\n📎 Прикреплённые файлы:\n"
@@ -1516,7 +2028,7 @@ A: [Ответ]""",
                     files_content += f"   Размер: {file_size} байт (base64)\n"
                     files_content += f"   Формат: {file_type}\n"
                     if file_content:
-                        files_content += f"   Содержимое доступно для анализа\n"
+                        files_content += "   Содержимое доступно для анализа\n"
                 elif file_content:
                     max_preview = 3000
                     preview = file_content[:max_preview]
@@ -1538,14 +2050,12 @@ A: [Ответ]""",
 
 Твой стиль общения: уверенный, четкий, без сентиментальности. Ты даешь конкретные рекомендации с обоснованием."""
         
-        full_prompt = f"{juno_system_prompt}\n\n{prompt}"
-        
         payload = {
-            "modelUri": f"gpt://{yandex_folder_id}/yandexgpt/latest",
+            "modelUri": f"gpt://{yandex_folder_id}/{service['model']}",
             "completionOptions": {
                 "stream": False,
-                "temperature": 0.7,
-                "maxTokens": 2000
+                "temperature": service['temperature'],
+                "maxTokens": service['max_tokens']
             },
             "messages": [
                 {"role": "system", "text": juno_system_prompt},
@@ -1553,6 +2063,7 @@ A: [Ответ]""",
             ]
         }
         
+        thinking_future = None
         if deep_think:
             thinking_prompt = f"""Ты должен размышлять над запросом, как DeepSeek. Продемонстрируй свой процесс анализа:
 
@@ -1580,39 +2091,51 @@ A: [Ответ]""",
                 ]
             }
             
-            try:
-                thinking_response = requests.post(url, headers=headers, json=thinking_payload, timeout=30)
-                if thinking_response.status_code == 200:
-                    thinking_json = thinking_response.json()
-                    thinking_alternatives = thinking_json.get('result', {}).get('alternatives', [])
-                    if thinking_alternatives:
-                        thinking_text = thinking_alternatives[0].get('message', {}).get('text', '')
-            except:
-                thinking_text = None
+            # Размышление зависит только от запроса — выполняется параллельно с основным ответом
+            thinking_future = _llm_executor.submit(request_completion_text, url, headers, thinking_payload, deadline)
         
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            started_at = time.monotonic()
+            if stream_id:
+                payload["completionOptions"]["stream"] = True
+                response = requests.post(url, headers=headers, json=payload, timeout=remaining_timeout(deadline), stream=True)
+            else:
+                response = requests.post(url, headers=headers, json=payload, timeout=remaining_timeout(deadline))
             
             if response.status_code != 200:
                 result = f"Ошибка YandexGPT (код {response.status_code}): {response.text}"
             else:
-                response_data = response.json()
-                result = response_data.get('result', {}).get('alternatives', [{}])[0].get('message', {}).get('text', 'Нет ответа')
-                
-                if user_email and not is_director:
+                if stream_id:
+                    # Частичный ответ коммитится в generation_progress; других соединений генерация в это время не держит
+                    progress_conn = get_db_connection()
                     try:
-                        deduct_response = requests.post(
-                            'https://functions.poehali.dev/62237982-f08c-4d74-99d7-28201bfc5f93',
-                            json={'email': user_email, 'amount': -cost},
-                            headers={'Content-Type': 'application/json'}
+                        result, first_token_ms = relay_yandex_stream(
+                            response, started_at, deadline,
+                            lambda text: publish_generation_progress(progress_conn, stream_id, user_email, text)
                         )
-                        if deduct_response.status_code == 200:
-                            deduct_data = deduct_response.json()
-                            credits_remaining = deduct_data.get('credits', 0)
-                    except Exception as e:
-                        print(f"Error deducting credits: {e}")
+                    finally:
+                        finish_generation_progress(progress_conn, stream_id, user_email)
+                        release_db_connection(progress_conn)
+                    result = result or 'Нет ответа'
+                    print(f"[STREAM] service_id={service_id} ttft_ms={first_token_ms} total_ms={int((time.monotonic() - started_at) * 1000)}")
+                else:
+                    response_data = response.json()
+                    result = response_data.get('result', {}).get('alternatives', [{}])[0].get('message', {}).get('text', 'Нет ответа')
+                generated = True
         except Exception as e:
             result = f"Ошибка подключения к YandexGPT: {str(e)}"
+        
+        # Ждём размышление не дольше общего дедлайна; без него ответ всё равно возвращается
+        if thinking_future:
+            thinking_text = collect_completion_text(thinking_future, deadline) or None
+        
+        # Ключ кэша включает deep_think: ответ без размышления (сбой или таймаут) не сохраняем,
+        # иначе повторные запросы так и получали бы его без размышления
+        if generated and cache_key and (thinking_text or not deep_think):
+            result_cache_put(cache_key, service_id, result, thinking_text)
+    
+    # Токены списываются только за полученный результат; без него резерв возвращается на баланс
+    credits_remaining = settle_credit_hold(hold_id, 'commit' if cached or generated else 'release')
     
     response_body = {
         'success': True,
@@ -1625,6 +2148,12 @@ A: [Ответ]""",
     if deep_think and thinking_text:
         response_body['thinking'] = thinking_text
     
+    if cached:
+        response_body['cached'] = True
+    
+    if stream_id:
+        response_body['time_to_first_token_ms'] = first_token_ms
+    
     return {
         'statusCode': 200,
         'headers': {
@@ -1633,4 +2162,7 @@ A: [Ответ]""",
         },
         'body': json.dumps(response_body, ensure_ascii=False),
         'isBase64Encoded': False
-    }
\ No newline at end of file
+    }
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    return compress_response(event, handle_request(event, context))
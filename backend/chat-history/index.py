@@ -6,17 +6,291 @@ Returns: HTTP response dict
 """
 
 import json
+import gzip
 import os
+import time
+import base64
+import hashlib
 import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
 from psycopg2.extras import RealDictCursor
-from typing import Dict, Any
-from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timedelta
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '2'))
+DB_POOL_PING_AFTER = 30.0
+# Ответы от килобайта сжимаются под Accept-Encoding клиента; brotli — если модуль установлен
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Браузер кэширует ответ, но перед каждым использованием сверяет ETag
+CACHE_CONTROL = 'private, no-cache'
+
+_db_pool: List[Tuple[Any, float]] = []
+
+CHAT_PAGE_SIZE = 50
+CHAT_PAGE_MAX = 100
+CHAT_DELTA_LIMIT = 200
+# Запас для updated_since: строка, записанная незадолго до чтения, может зафиксироваться уже после него
+SYNC_OVERLAP_SECONDS = 5
+TOMBSTONE_RETENTION_DAYS = 30
+SEARCH_LIMIT = 20
+SEARCH_LIMIT_MAX = 50
+SEARCH_QUERY_MAX_CHARS = 200
+SEARCH_HEADLINE_OPTIONS = 'StartSel=<mark>, StopSel=</mark>, MaxWords=25, MinWords=8, MaxFragments=2'
+
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
 def get_db_connection():
+    while _db_pool:
+        try:
+            conn, released_at = _db_pool.pop()
+        except IndexError:
+            break
+        if is_db_connection_healthy(conn, time.monotonic() - released_at):
+            return conn
+        conn.close()
     dsn = os.environ.get('DATABASE_URL')
     return psycopg2.connect(dsn)
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+def is_db_connection_healthy(conn, idle_seconds: float) -> bool:
+    if conn.closed or conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+        return False
+    if idle_seconds < DB_POOL_PING_AFTER:
+        return True
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def release_db_connection(conn):
+    try:
+        if not conn.closed and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+    if conn.closed or len(_db_pool) >= DB_POOL_SIZE:
+        conn.close()
+        return
+    _db_pool.append((conn, time.monotonic()))
+
+def encode_chat_cursor(updated_at: datetime, row_id: int) -> str:
+    raw = json.dumps([updated_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_chat_cursor(value: str) -> Optional[Tuple[datetime, int]]:
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+        updated_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(updated_at), int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+def parse_sync_token(value: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+def current_sync_token(cursor) -> str:
+    cursor.execute("SELECT LOCALTIMESTAMP - %s * INTERVAL '1 second' AS sync_point", (SYNC_OVERLAP_SECONDS,))
+    return cursor.fetchone()['sync_point'].isoformat()
+
+def list_chats_page(cursor, user_email: str, after: Optional[Tuple[datetime, int]], limit: int) -> Dict[str, Any]:
+    sync_token = current_sync_token(cursor)
+    if after:
+        cursor.execute(
+            """SELECT id, chat_id, chat_title, service_name, updated_at
+               FROM t_p55547046_creative_ai_hub.chat_history
+               WHERE user_email = %s AND (updated_at, id) < (%s, %s)
+               ORDER BY updated_at DESC, id DESC
+               LIMIT %s""",
+            (user_email, after[0], after[1], limit + 1)
+        )
+    else:
+        cursor.execute(
+            """SELECT id, chat_id, chat_title, service_name, updated_at
+               FROM t_p55547046_creative_ai_hub.chat_history
+               WHERE user_email = %s
+               ORDER BY updated_at DESC, id DESC
+               LIMIT %s""",
+            (user_email, limit + 1)
+        )
+    chats = cursor.fetchall()
+    next_cursor = None
+    if len(chats) > limit:
+        chats = chats[:limit]
+        next_cursor = encode_chat_cursor(chats[-1]['updated_at'], chats[-1]['id'])
+    for chat in chats:
+        chat['updated_at'] = chat['updated_at'].isoformat() if chat.get('updated_at') else None
+    return {'success': True, 'chats': [dict(c) for c in chats], 'next_cursor': next_cursor, 'sync_token': sync_token}
+
+def list_chat_changes(cursor, user_email: str, since: datetime) -> Dict[str, Any]:
+    sync_token = current_sync_token(cursor)
+    if since < datetime.fromisoformat(sync_token) - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+        # Надгробия старше срока хранения уже удалены — клиенту нужно перечитать список целиком
+        return {'success': True, 'full_resync': True}
+    cursor.execute(
+        """SELECT id, chat_id, chat_title, service_name, updated_at
+           FROM t_p55547046_creative_ai_hub.chat_history
+           WHERE user_email = %s AND updated_at > %s
+           ORDER BY updated_at DESC, id DESC
+           LIMIT %s""",
+        (user_email, since, CHAT_DELTA_LIMIT + 1)
+    )
+    chats = cursor.fetchall()
+    if len(chats) > CHAT_DELTA_LIMIT:
+        return {'success': True, 'full_resync': True}
+    cursor.execute(
+        "SELECT chat_id FROM t_p55547046_creative_ai_hub.chat_history_tombstones WHERE user_email = %s AND deleted_at > %s",
+        (user_email, since)
+    )
+    deleted = [row['chat_id'] for row in cursor.fetchall()]
+    for chat in chats:
+        chat['updated_at'] = chat['updated_at'].isoformat() if chat.get('updated_at') else None
+    return {'success': True, 'chats': [dict(c) for c in chats], 'deleted': deleted, 'sync_token': sync_token}
+
+def search_chats(cursor, user_email: str, query: str, limit: int) -> Dict[str, Any]:
+    # Ранжируем сообщения пользователя, для каждого чата берём лучшее совпадение и строим по нему сниппет
+    cursor.execute(
+        """WITH q AS (
+               SELECT websearch_to_tsquery('russian', %s) AS query
+           ), hits AS (
+               SELECT DISTINCT ON (m.chat_id)
+                      m.chat_id, m.content, ts_rank(m.search_vector, q.query) AS rank,
+                      COUNT(*) OVER (PARTITION BY m.chat_id) AS matches
+               FROM t_p55547046_creative_ai_hub.chat_history ch
+               JOIN t_p55547046_creative_ai_hub.chat_messages m ON m.chat_id = ch.chat_id
+               CROSS JOIN q
+               WHERE ch.user_email = %s AND m.search_vector @@ q.query
+               ORDER BY m.chat_id, rank DESC, m.seq DESC
+           ), top AS (
+               SELECT * FROM hits ORDER BY rank DESC, matches DESC, chat_id LIMIT %s
+           )
+           SELECT top.chat_id, ch.id, ch.chat_title, ch.service_name, ch.updated_at, top.rank, top.matches,
+                  ts_headline('russian', top.content, q.query, %s) AS snippet
+           FROM top
+           JOIN t_p55547046_creative_ai_hub.chat_history ch ON ch.chat_id = top.chat_id
+           CROSS JOIN q
+           ORDER BY top.rank DESC, top.matches DESC, top.chat_id""",
+        (query, user_email, limit, SEARCH_HEADLINE_OPTIONS)
+    )
+    results = cursor.fetchall()
+    for result in results:
+        result['updated_at'] = result['updated_at'].isoformat() if result.get('updated_at') else None
+        result['rank'] = round(result['rank'], 4)
+    return {'success': True, 'results': [dict(r) for r in results]}
+
+def append_chat_messages(cursor, user_email: str, chat_id: str, chat_title: str,
+                         service_id: int, service_name: str, new_messages: List[Dict]) -> Optional[Dict]:
+    cursor.execute(
+        """WITH chat AS (
+               INSERT INTO t_p55547046_creative_ai_hub.chat_history
+               (user_email, chat_id, chat_title, service_id, service_name, message_count, created_at, updated_at)
+               VALUES (%s, %s, %s, %s, %s, %s, NOW(), clock_timestamp())
+               ON CONFLICT (chat_id) DO UPDATE SET
+               chat_title = EXCLUDED.chat_title,
+               message_count = chat_history.message_count + EXCLUDED.message_count,
+               updated_at = clock_timestamp()
+               WHERE chat_history.user_email = EXCLUDED.user_email
+               RETURNING id, message_count
+           ), appended AS (
+               INSERT INTO t_p55547046_creative_ai_hub.chat_messages (chat_id, seq, role, content, thinking)
+               SELECT %s, chat.message_count - %s + m.ord, m.role, m.content, m.thinking
+               FROM chat, unnest(%s::text[], %s::text[], %s::text[]) WITH ORDINALITY AS m(role, content, thinking, ord)
+           )
+           SELECT id, message_count FROM chat""",
+        (
+            user_email, chat_id, chat_title, service_id, service_name, len(new_messages),
+            chat_id, len(new_messages),
+            [msg.get('role', 'user') for msg in new_messages],
+            [msg.get('content') or '' for msg in new_messages],
+            [msg.get('thinking') for msg in new_messages]
+        )
+    )
+    return cursor.fetchone()
+
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
+def get_request_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+def choose_content_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    qualities = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name.strip().lower()] = quality
+    candidates = []
+    for encoding in (('br', 'gzip') if brotli else ('gzip',)):
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > 0:
+            candidates.append((quality, encoding == 'br', encoding))
+    return max(candidates)[2] if candidates else None
+
+def compress_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    body = response.get('body')
+    if response.get('isBase64Encoded') or not isinstance(body, str):
+        return response
+    raw = body.encode('utf-8')
+    encoding = choose_content_encoding(get_request_header(event, 'Accept-Encoding'))
+    if encoding is None or len(raw) < COMPRESS_MIN_BYTES:
+        return response
+    if encoding == 'br':
+        compressed = brotli.compress(raw, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+    if len(compressed) >= len(raw):
+        return response
+    headers = dict(response.get('headers') or {})
+    headers['Content-Encoding'] = encoding
+    headers['Vary'] = headers['Vary'] + ', Accept-Encoding' if headers.get('Vary') else 'Accept-Encoding'
+    if headers.get('ETag') and not headers['ETag'].startswith('W/'):
+        headers['ETag'] = 'W/' + headers['ETag']
+    return {**response, 'headers': headers, 'body': base64.b64encode(compressed).decode('ascii'), 'isBase64Encoded': True}
+
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
+def make_etag(*parts: Any) -> str:
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate in ('*', etag):
+            return True
+    return False
+
+def not_modified_response(etag: str, vary: Optional[str] = None) -> Dict[str, Any]:
+    headers = {'Access-Control-Allow-Origin': '*', 'ETag': etag, 'Cache-Control': CACHE_CONTROL}
+    if vary:
+        headers['Vary'] = vary
+    return {'statusCode': 304, 'headers': headers, 'body': '', 'isBase64Encoded': False}
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
@@ -54,10 +328,40 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         if method == 'GET':
             query_params = event.get('queryStringParameters') or {}
             chat_id = query_params.get('chat_id')
+            search_query = (query_params.get('q') or '').strip()
             
-            if chat_id:
+            if search_query:
+                try:
+                    limit = min(max(int(query_params.get('limit', SEARCH_LIMIT)), 1), SEARCH_LIMIT_MAX)
+                except ValueError:
+                    limit = SEARCH_LIMIT
+                result = search_chats(cursor, user_email, search_query[:SEARCH_QUERY_MAX_CHARS], limit)
+            elif chat_id:
+                # Длинный чат целиком читается и сериализуется только если клиентская копия устарела:
+                # любая запись в чат двигает updated_at (clock_timestamp) и message_count
+                cursor.execute(
+                    """SELECT id, updated_at, message_count FROM t_p55547046_creative_ai_hub.chat_history
+                       WHERE user_email = %s AND chat_id = %s""",
+                    (user_email, chat_id)
+                )
+                version = cursor.fetchone()
+                etag = make_etag('chat', version['id'], version['updated_at'].isoformat(), version['message_count']) if version else None
+                if etag and etag_matches(get_request_header(event, 'If-None-Match'), etag):
+                    return not_modified_response(etag, vary='X-User-Email')
+                if etag:
+                    headers = {**headers, 'ETag': etag, 'Cache-Control': CACHE_CONTROL, 'Vary': 'X-User-Email'}
                 cursor.execute(
-                    "SELECT * FROM t_p55547046_creative_ai_hub.chat_history WHERE user_email = %s AND chat_id = %s",
+                    """SELECT ch.id, ch.user_email, ch.chat_id, ch.chat_title, ch.service_id, ch.service_name,
+                              ch.message_count, ch.created_at, ch.updated_at,
+                              COALESCE((
+                                  SELECT json_agg(json_strip_nulls(json_build_object(
+                                             'role', m.role, 'content', m.content, 'thinking', m.thinking
+                                         )) ORDER BY m.seq)
+                                  FROM t_p55547046_creative_ai_hub.chat_messages m
+                                  WHERE m.chat_id = ch.chat_id
+                              ), '[]'::json) AS messages
+                       FROM t_p55547046_creative_ai_hub.chat_history ch
+                       WHERE ch.user_email = %s AND ch.chat_id = %s""",
                     (user_email, chat_id)
                 )
                 chat = cursor.fetchone()
@@ -67,15 +371,32 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     result = {'success': True, 'chat': dict(chat)}
                 else:
                     result = {'success': False, 'error': 'Chat not found'}
+            elif query_params.get('updated_since'):
+                since = parse_sync_token(query_params['updated_since'])
+                if since is None:
+                    return {
+                        'statusCode': 400,
+                        'headers': headers,
+                        'body': json.dumps({'error': 'Invalid updated_since'}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
+                result = list_chat_changes(cursor, user_email, since)
             else:
-                cursor.execute(
-                    "SELECT id, chat_id, chat_title, service_name, updated_at FROM t_p55547046_creative_ai_hub.chat_history WHERE user_email = %s ORDER BY updated_at DESC LIMIT 50",
-                    (user_email,)
-                )
-                chats = cursor.fetchall()
-                for chat in chats:
-                    chat['updated_at'] = chat['updated_at'].isoformat() if chat.get('updated_at') else None
-                result = {'success': True, 'chats': [dict(c) for c in chats]}
+                after = None
+                if query_params.get('cursor'):
+                    after = decode_chat_cursor(query_params['cursor'])
+                    if after is None:
+                        return {
+                            'statusCode': 400,
+                            'headers': headers,
+                            'body': json.dumps({'error': 'Invalid cursor'}, ensure_ascii=False),
+                            'isBase64Encoded': False
+                        }
+                try:
+                    limit = min(max(int(query_params.get('limit', CHAT_PAGE_SIZE)), 1), CHAT_PAGE_MAX)
+                except ValueError:
+                    limit = CHAT_PAGE_SIZE
+                result = list_chats_page(cursor, user_email, after, limit)
             
             return {
                 'statusCode': 200,
@@ -91,6 +412,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             service_id = body_data.get('service_id')
             service_name = body_data.get('service_name')
             messages = body_data.get('messages', [])
+            append = body_data.get('append')
             
             if not all([chat_id, chat_title, service_id is not None, service_name]):
                 return {
@@ -100,18 +422,31 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            cursor.execute(
-                """INSERT INTO t_p55547046_creative_ai_hub.chat_history 
-                   (user_email, chat_id, chat_title, service_id, service_name, messages, created_at, updated_at)
-                   VALUES (%s, %s, %s, %s, %s, %s, NOW(), NOW())
-                   ON CONFLICT (chat_id) DO UPDATE SET
-                   chat_title = EXCLUDED.chat_title,
-                   messages = EXCLUDED.messages,
-                   updated_at = NOW()
-                   RETURNING id""",
-                (user_email, chat_id, chat_title, service_id, service_name, json.dumps(messages))
-            )
-            result_id = cursor.fetchone()['id']
+            if append is None:
+                # Клиент прислал чат целиком — он заменяет сохранённые сообщения, а не дописывается к ним:
+                # по числу строк нельзя понять, какие сообщения новые, если в чат пишет и simple-chat
+                cursor.execute(
+                    """WITH chat AS (
+                           UPDATE t_p55547046_creative_ai_hub.chat_history SET message_count = 0
+                           WHERE chat_id = %s AND user_email = %s
+                           RETURNING chat_id
+                       )
+                       DELETE FROM t_p55547046_creative_ai_hub.chat_messages m
+                       USING chat WHERE m.chat_id = chat.chat_id""",
+                    (chat_id, user_email)
+                )
+                append = messages
+            
+            appended = append_chat_messages(cursor, user_email, chat_id, chat_title, service_id, service_name, append)
+            if not appended:
+                conn.rollback()
+                return {
+                    'statusCode': 404,
+                    'headers': headers,
+                    'body': json.dumps({'error': 'Chat not found'}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            result_id = appended['id']
             conn.commit()
             
             return {
@@ -133,9 +468,20 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
+            # Удаление оставляет надгробие для клиентов, синхронизирующих список через updated_since
             cursor.execute(
-                "DELETE FROM t_p55547046_creative_ai_hub.chat_history WHERE user_email = %s AND chat_id = %s",
-                (user_email, chat_id)
+                """WITH deleted AS (
+                       DELETE FROM t_p55547046_creative_ai_hub.chat_history
+                       WHERE user_email = %s AND chat_id = %s
+                       RETURNING chat_id, user_email
+                   ), pruned AS (
+                       DELETE FROM t_p55547046_creative_ai_hub.chat_history_tombstones
+                       WHERE user_email = %s AND chat_id <> %s AND deleted_at < NOW() - %s * INTERVAL '1 day'
+                   )
+                   INSERT INTO t_p55547046_creative_ai_hub.chat_history_tombstones (chat_id, user_email, deleted_at)
+                   SELECT chat_id, user_email, NOW() FROM deleted
+                   ON CONFLICT (chat_id) DO UPDATE SET user_email = EXCLUDED.user_email, deleted_at = EXCLUDED.deleted_at""",
+                (user_email, chat_id, user_email, chat_id, TOMBSTONE_RETENTION_DAYS)
             )
             conn.commit()
             
@@ -156,4 +502,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    return compress_response(event, handle_request(event, context))
@@ -1,20 +1,341 @@
 '''
 Business: Purchase credits and manage user balance
-Args: event with httpMethod, body (email, credits_amount)
+Args: event with httpMethod, body (email, credits_amount; or {"action": "sweep_holds"}, or the generation
+      hold actions "reserve" (email, amount, reference, ttl_seconds), "commit" and "release" (hold_id),
+      which need headers X-Admin-Secret matching CREDITS_ADMIN_SECRET)
       context with request_id
 Returns: HTTP response with payment info and updated balance
 '''
 
 import json
+import base64
+import gzip
+import hmac
 import os
+import select
+import threading
+import time
 import psycopg2
-from typing import Dict, Any
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '2'))
+DB_POOL_PING_AFTER = 30.0
+# Bodies from a kilobyte up are compressed to the client's Accept-Encoding; brotli when installed
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# sweep_holds (operator) and the hold actions ai-genius calls are on a public URL: they need
+# X-Admin-Secret equal to this, and are disabled while it is unset
+CREDITS_ADMIN_SECRET = os.environ.get('CREDITS_ADMIN_SECRET', '')
+OPERATOR_ACTIONS = ('sweep_holds', 'reserve', 'commit', 'release')
+CREDIT_HOLD_SETTLE_SQL = {
+    'commit': "SELECT t_p55547046_creative_ai_hub.credit_commit(%s)",
+    'release': "SELECT t_p55547046_creative_ai_hub.credit_release(%s)"
+}
+# Expired generation holds are released in batches, each in its own short transaction
+CREDIT_SWEEP_BATCH_SIZE = 500
+CREDIT_SWEEP_MAX_BATCHES = 20
+# (credits, role) per email, dropped on every local write and on each user_balance NOTIFY from the database;
+# the TTL only bounds staleness if a notification is ever lost. Without a listener the cache is bypassed
+BALANCE_CACHE_TTL_SECONDS = float(os.environ.get('BALANCE_CACHE_TTL_SECONDS', '30'))
+BALANCE_CACHE_SIZE = 4096
+BALANCE_CHANNEL = 'user_balance'
+# GET ?since=<credits>&wait=<seconds> long-polls until the balance differs from `since`. All waiting
+# requests in a process share the one LISTEN connection: a single waiter blocks on its socket and
+# wakes the others per email, so the DB sees one listener per process rather than one per client
+BALANCE_WAIT_MAX_SECONDS = 25
+BALANCE_WAIT_SLICE_SECONDS = 1.0
+
+_db_pool: List[Tuple[Any, float]] = []
+_balance_cache: 'OrderedDict[str, Tuple[float, int, str]]' = OrderedDict()
+_balance_cache_stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'bypassed': 0}
+# Bumped on every invalidation (per email) and on every full clear (epoch): a miss stores what it read
+# only if neither moved while the query ran, so a NOTIFY drained by another thread mid-read is not lost
+_balance_generations: Dict[str, int] = {}
+_balance_epoch = 0
+_balance_listener = None
+_balance_lock = threading.RLock()
+_balance_pump = threading.Lock()
+_balance_waiters: Dict[str, List[threading.Event]] = {}
+
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
 def get_db_connection():
+    while _db_pool:
+        try:
+            conn, released_at = _db_pool.pop()
+        except IndexError:
+            break
+        if is_db_connection_healthy(conn, time.monotonic() - released_at):
+            return conn
+        conn.close()
     dsn = os.environ.get('DATABASE_URL')
     return psycopg2.connect(dsn)
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+def is_db_connection_healthy(conn, idle_seconds: float) -> bool:
+    if conn.closed or conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+        return False
+    if idle_seconds < DB_POOL_PING_AFTER:
+        return True
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def release_db_connection(conn):
+    try:
+        if not conn.closed and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+    if conn.closed or len(_db_pool) >= DB_POOL_SIZE:
+        conn.close()
+        return
+    _db_pool.append((conn, time.monotonic()))
+
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
+def get_request_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+def choose_content_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    qualities = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name.strip().lower()] = quality
+    candidates = []
+    for encoding in (('br', 'gzip') if brotli else ('gzip',)):
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > 0:
+            candidates.append((quality, encoding == 'br', encoding))
+    return max(candidates)[2] if candidates else None
+
+def compress_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    body = response.get('body')
+    if response.get('isBase64Encoded') or not isinstance(body, str):
+        return response
+    raw = body.encode('utf-8')
+    encoding = choose_content_encoding(get_request_header(event, 'Accept-Encoding'))
+    if encoding is None or len(raw) < COMPRESS_MIN_BYTES:
+        return response
+    if encoding == 'br':
+        compressed = brotli.compress(raw, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+    if len(compressed) >= len(raw):
+        return response
+    headers = dict(response.get('headers') or {})
+    headers['Content-Encoding'] = encoding
+    headers['Vary'] = headers['Vary'] + ', Accept-Encoding' if headers.get('Vary') else 'Accept-Encoding'
+    if headers.get('ETag') and not headers['ETag'].startswith('W/'):
+        headers['ETag'] = 'W/' + headers['ETag']
+    return {**response, 'headers': headers, 'body': base64.b64encode(compressed).decode('ascii'), 'isBase64Encoded': True}
+
+def get_balance_listener():
+    global _balance_listener
+    if _balance_listener is not None and not _balance_listener.closed:
+        return _balance_listener
+    try:
+        conn = psycopg2.connect(os.environ.get('DATABASE_URL'))
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute(f"LISTEN {BALANCE_CHANNEL}")
+        cur.close()
+    except psycopg2.Error as e:
+        print(f"Balance listener unavailable, cache bypassed: {e}")
+        return None
+    # Anything cached before this point may have missed its notification
+    clear_balance_cache()
+    _balance_listener = conn
+    return conn
+
+def drain_balance_notifications() -> bool:
+    global _balance_listener
+    if BALANCE_CACHE_TTL_SECONDS <= 0:
+        return False
+    with _balance_lock:
+        listener = get_balance_listener()
+        if listener is None:
+            return False
+        try:
+            listener.poll()
+        except psycopg2.Error:
+            listener.close()
+            _balance_listener = None
+            clear_balance_cache()
+            return False
+        while listener.notifies:
+            email = listener.notifies.pop(0).payload
+            invalidate_balance(email)
+            for waiter in _balance_waiters.get(email, ()):
+                waiter.set()
+    return True
+
+def invalidate_balance(email: str):
+    global _balance_epoch
+    with _balance_lock:
+        _balance_generations[email] = _balance_generations.get(email, 0) + 1
+        if len(_balance_generations) > BALANCE_CACHE_SIZE:
+            # Forgetting the counters is safe once the epoch moves: in-flight reads then skip their store
+            _balance_generations.clear()
+            _balance_epoch += 1
+        if _balance_cache.pop(email, None) is not None:
+            _balance_cache_stats['invalidations'] += 1
+
+def clear_balance_cache():
+    global _balance_epoch
+    with _balance_lock:
+        _balance_cache.clear()
+        _balance_generations.clear()
+        _balance_epoch += 1
+
+def read_balance(email: str) -> Tuple[int, str]:
+    cacheable = drain_balance_notifications()
+    with _balance_lock:
+        version = (_balance_epoch, _balance_generations.get(email, 0))
+        if cacheable:
+            cached = _balance_cache.get(email)
+            if cached and cached[0] > time.monotonic():
+                _balance_cache.move_to_end(email)
+                _balance_cache_stats['hits'] += 1
+                return cached[1], cached[2]
+            _balance_cache_stats['misses'] += 1
+        else:
+            _balance_cache_stats['bypassed'] += 1
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT credits, role FROM users WHERE email = %s", (email,))
+    result = cur.fetchone()
+    cur.close()
+    release_db_connection(conn)
+    
+    credits, role = result if result else (0, 'customer')
+    # Notifications for writes that committed during the query are drained first; if one of them
+    # (or one drained by another thread) touched this email, the row just read may be stale
+    if cacheable and drain_balance_notifications():
+        with _balance_lock:
+            if version != (_balance_epoch, _balance_generations.get(email, 0)):
+                return credits, role
+            _balance_cache[email] = (time.monotonic() + BALANCE_CACHE_TTL_SECONDS, credits, role)
+            _balance_cache.move_to_end(email)
+            while len(_balance_cache) > BALANCE_CACHE_SIZE:
+                _balance_cache.popitem(last=False)
+    return credits, role
+
+def wait_for_balance_change(email: str, since: int, timeout: float) -> Tuple[int, str, bool]:
+    deadline = time.monotonic() + timeout
+    waiter = threading.Event()
+    with _balance_lock:
+        _balance_waiters.setdefault(email, []).append(waiter)
+    try:
+        while True:
+            # Cleared before the read, so a notification that lands after it still wakes this waiter
+            waiter.clear()
+            credits, role = read_balance(email)
+            remaining = deadline - time.monotonic()
+            if credits != since or remaining <= 0:
+                return credits, role, credits != since
+            wait_slice = min(remaining, BALANCE_WAIT_SLICE_SECONDS)
+            if not _balance_pump.acquire(blocking=False):
+                waiter.wait(wait_slice)
+                continue
+            try:
+                listener = _balance_listener
+                if listener is not None and not listener.closed:
+                    select.select([listener], [], [], wait_slice)
+                    drain_balance_notifications()
+                else:
+                    # No listener (cache disabled or DB unreachable): fall back to re-reading every slice
+                    time.sleep(wait_slice)
+            finally:
+                _balance_pump.release()
+    finally:
+        with _balance_lock:
+            waiters = _balance_waiters[email]
+            waiters.remove(waiter)
+            if not waiters:
+                del _balance_waiters[email]
+
+def is_operator_request(event: Dict[str, Any]) -> bool:
+    supplied = get_request_header(event, 'X-Admin-Secret') or ''
+    return bool(CREDITS_ADMIN_SECRET) and hmac.compare_digest(supplied.encode(), CREDITS_ADMIN_SECRET.encode())
+
+def reserve_credit_hold(email: str, amount: int, reference: str, ttl_seconds: int) -> Optional[Tuple[str, int, Optional[int]]]:
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        # Check and hold in one statement; credits is the balance the check saw. Directors are not charged
+        cur.execute(
+            """SELECT u.role, u.credits,
+                      CASE WHEN u.role = 'director' THEN NULL
+                           ELSE t_p55547046_creative_ai_hub.credit_reserve(u.id, %s, 'generation', %s, %s) END
+               FROM t_p55547046_creative_ai_hub.users u
+               WHERE u.email = %s""",
+            (amount, reference, ttl_seconds, email)
+        )
+        row = cur.fetchone()
+        conn.commit()
+        cur.close()
+    finally:
+        release_db_connection(conn)
+    if row and row[2] is not None:
+        invalidate_balance(email)
+    return row
+
+def settle_credit_hold(hold_id: int, outcome: str) -> Optional[int]:
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(CREDIT_HOLD_SETTLE_SQL[outcome], (hold_id,))
+        row = cur.fetchone()
+        conn.commit()
+        cur.close()
+    finally:
+        release_db_connection(conn)
+    return row[0] if row else None
+
+def sweep_credit_holds() -> int:
+    conn = get_db_connection()
+    released = 0
+    try:
+        cur = conn.cursor()
+        for _ in range(CREDIT_SWEEP_MAX_BATCHES):
+            cur.execute("SELECT t_p55547046_creative_ai_hub.credit_sweep_holds(%s)", (CREDIT_SWEEP_BATCH_SIZE,))
+            batch = cur.fetchone()[0]
+            conn.commit()
+            released += batch
+            if batch < CREDIT_SWEEP_BATCH_SIZE:
+                break
+        cur.close()
+    finally:
+        release_db_connection(conn)
+    if released:
+        clear_balance_cache()
+    return released
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
@@ -42,21 +363,31 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'isBase64Encoded': False
             }
         
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute("SELECT credits, role FROM users WHERE email = %s", (email,))
-        result = cur.fetchone()
-        
-        cur.close()
-        conn.close()
+        since = params.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+                wait = max(0.0, min(BALANCE_WAIT_MAX_SECONDS, float(params.get('wait', BALANCE_WAIT_MAX_SECONDS))))
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                    'body': json.dumps({'error': 'since and wait must be numbers'}),
+                    'isBase64Encoded': False
+                }
+            credits, role, changed = wait_for_balance_change(email, since, wait)
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json',
+                    'Cache-Control': 'no-store'
+                },
+                'body': json.dumps({'credits': credits, 'role': role, 'changed': changed}),
+                'isBase64Encoded': False
+            }
         
-        if not result:
-            credits = 0
-            role = 'customer'
-        else:
-            credits = result[0]
-            role = result[1]
+        credits, role = read_balance(email)
         
         return {
             'statusCode': 200,
@@ -70,6 +401,68 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     if method == 'POST':
         body_data = json.loads(event.get('body', '{}'))
+        
+        if body_data.get('action') in OPERATOR_ACTIONS and not is_operator_request(event):
+            return {
+                'statusCode': 403,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'Forbidden'}),
+                'isBase64Encoded': False
+            }
+        
+        # Timer-triggered maintenance: return credits held by generations that never settled
+        if body_data.get('action') == 'sweep_holds':
+            return {
+                'statusCode': 200,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'success': True, 'released': sweep_credit_holds()}),
+                'isBase64Encoded': False
+            }
+        
+        # Generation holds for ai-genius: reserve before generating, then commit on success or release
+        if body_data.get('action') == 'reserve':
+            email = body_data.get('email', '')
+            amount = body_data.get('amount')
+            ttl_seconds = body_data.get('ttl_seconds')
+            if not email or not isinstance(amount, int) or amount <= 0 or not isinstance(ttl_seconds, int) or ttl_seconds <= 0:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                    'body': json.dumps({'error': 'Email, positive amount and ttl_seconds required'}),
+                    'isBase64Encoded': False
+                }
+            reserved = reserve_credit_hold(email, amount, str(body_data.get('reference', '')), ttl_seconds)
+            if reserved is None:
+                return {
+                    'statusCode': 404,
+                    'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                    'body': json.dumps({'error': 'User not found'}),
+                    'isBase64Encoded': False
+                }
+            role, credits, hold_id = reserved
+            return {
+                'statusCode': 200,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'success': True, 'role': role, 'credits': credits, 'hold_id': hold_id}),
+                'isBase64Encoded': False
+            }
+        
+        if body_data.get('action') in CREDIT_HOLD_SETTLE_SQL:
+            hold_id = body_data.get('hold_id')
+            if not isinstance(hold_id, int):
+                return {
+                    'statusCode': 400,
+                    'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                    'body': json.dumps({'error': 'hold_id required'}),
+                    'isBase64Encoded': False
+                }
+            return {
+                'statusCode': 200,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'success': True, 'credits': settle_credit_hold(hold_id, body_data['action'])}),
+                'isBase64Encoded': False
+            }
+        
         email = body_data.get('email', '')
         amount = body_data.get('amount', 0)
         
@@ -84,15 +477,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         conn = get_db_connection()
         cur = conn.cursor()
         
+        # Ledger entry and balance change in one statement; a debit never takes the balance below zero
         cur.execute(
-            "UPDATE users SET credits = credits + %s WHERE email = %s RETURNING credits",
+            """SELECT t_p55547046_creative_ai_hub.credit_post(u.id, %s, 'manual')
+               FROM t_p55547046_creative_ai_hub.users u WHERE u.email = %s""",
             (amount, email)
         )
         result = cur.fetchone()
         
         if not result:
             cur.close()
-            conn.close()
+            release_db_connection(conn)
             return {
                 'statusCode': 404,
                 'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
@@ -100,10 +495,22 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'isBase64Encoded': False
             }
         
+        if result[0] is None:
+            conn.rollback()
+            cur.close()
+            release_db_connection(conn)
+            return {
+                'statusCode': 402,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'Insufficient credits'}),
+                'isBase64Encoded': False
+            }
+        
         new_balance = result[0]
         conn.commit()
         cur.close()
-        conn.close()
+        release_db_connection(conn)
+        invalidate_balance(email)
         
         return {
             'statusCode': 200,
@@ -123,4 +530,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         'headers': {'Access-Control-Allow-Origin': '*'},
         'body': json.dumps({'error': 'Method not allowed'}),
         'isBase64Encoded': False
-    }
\ No newline at end of file
+    }
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    return compress_response(event, handle_request(event, context))
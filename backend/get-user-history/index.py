@@ -4,12 +4,143 @@ Args: event with queryStringParameters.email
 Returns: JSON with user's generation history (service_name, input_text, result, created_at, tokens_used)
 '''
 
+import hashlib
 import json
+import base64
+import gzip
 import os
+import time
 import psycopg2
-from typing import Dict, Any
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from typing import Dict, Any, List, Optional, Tuple
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '2'))
+DB_POOL_PING_AFTER = 30.0
+# Bodies from a kilobyte up are compressed to the client's Accept-Encoding; brotli when installed
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Browsers keep the body but revalidate it with If-None-Match on every use
+CACHE_CONTROL = 'private, no-cache'
+
+_db_pool: List[Tuple[Any, float]] = []
+
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
+def get_db_connection():
+    while _db_pool:
+        try:
+            conn, released_at = _db_pool.pop()
+        except IndexError:
+            break
+        if is_db_connection_healthy(conn, time.monotonic() - released_at):
+            return conn
+        conn.close()
+    dsn = os.environ.get('DATABASE_URL')
+    return psycopg2.connect(dsn)
+
+def is_db_connection_healthy(conn, idle_seconds: float) -> bool:
+    if conn.closed or conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+        return False
+    if idle_seconds < DB_POOL_PING_AFTER:
+        return True
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def release_db_connection(conn):
+    try:
+        if not conn.closed and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+    if conn.closed or len(_db_pool) >= DB_POOL_SIZE:
+        conn.close()
+        return
+    _db_pool.append((conn, time.monotonic()))
+
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
+def get_request_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+def choose_content_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    qualities = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name.strip().lower()] = quality
+    candidates = []
+    for encoding in (('br', 'gzip') if brotli else ('gzip',)):
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > 0:
+            candidates.append((quality, encoding == 'br', encoding))
+    return max(candidates)[2] if candidates else None
+
+def compress_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    body = response.get('body')
+    if response.get('isBase64Encoded') or not isinstance(body, str):
+        return response
+    raw = body.encode('utf-8')
+    encoding = choose_content_encoding(get_request_header(event, 'Accept-Encoding'))
+    if encoding is None or len(raw) < COMPRESS_MIN_BYTES:
+        return response
+    if encoding == 'br':
+        compressed = brotli.compress(raw, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+    if len(compressed) >= len(raw):
+        return response
+    headers = dict(response.get('headers') or {})
+    headers['Content-Encoding'] = encoding
+    headers['Vary'] = headers['Vary'] + ', Accept-Encoding' if headers.get('Vary') else 'Accept-Encoding'
+    if headers.get('ETag') and not headers['ETag'].startswith('W/'):
+        headers['ETag'] = 'W/' + headers['ETag']
+    return {**response, 'headers': headers, 'body': base64.b64encode(compressed).decode('ascii'), 'isBase64Encoded': True}
+
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
+def make_etag(*parts: Any) -> str:
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate in ('*', etag):
+            return True
+    return False
+
+def not_modified_response(etag: str, vary: Optional[str] = None) -> Dict[str, Any]:
+    headers = {'Access-Control-Allow-Origin': '*', 'ETag': etag, 'Cache-Control': CACHE_CONTROL}
+    if vary:
+        headers['Vary'] = vary
+    return {'statusCode': 304, 'headers': headers, 'body': '', 'isBase64Encoded': False}
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
@@ -53,18 +184,18 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(database_url)
+    conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute(
-        "SELECT id FROM users WHERE email = %s",
+        "SELECT id, data_version FROM users WHERE email = %s",
         (email,)
     )
     user_row = cursor.fetchone()
     
     if not user_row:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
         return {
             'statusCode': 200,
             'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
@@ -73,6 +204,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     user_id = user_row[0]
+    etag = make_etag('history', user_id, user_row[1])
+    if etag_matches(get_request_header(event, 'If-None-Match'), etag):
+        cursor.close()
+        release_db_connection(conn)
+        return not_modified_response(etag)
     
     cursor.execute(
         """
@@ -87,7 +223,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     rows = cursor.fetchall()
     cursor.close()
-    conn.close()
+    release_db_connection(conn)
     
     history = []
     for row in rows:
@@ -102,7 +238,15 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     return {
         'statusCode': 200,
-        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json',
+            'ETag': etag,
+            'Cache-Control': CACHE_CONTROL
+        },
         'body': json.dumps({'success': True, 'history': history}),
         'isBase64Encoded': False
     }
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    return compress_response(event, handle_request(event, context))
@@ -6,16 +6,117 @@ Returns: HTTP response with verification status and updated balance
 '''
 
 import json
+import base64
+import gzip
 import os
+import time
 import psycopg2
-from typing import Dict, Any
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '2'))
+DB_POOL_PING_AFTER = 30.0
+# Bodies from a kilobyte up are compressed to the client's Accept-Encoding; brotli when installed
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+_db_pool: List[Tuple[Any, float]] = []
+
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
 def get_db_connection():
+    while _db_pool:
+        try:
+            conn, released_at = _db_pool.pop()
+        except IndexError:
+            break
+        if is_db_connection_healthy(conn, time.monotonic() - released_at):
+            return conn
+        conn.close()
     dsn = os.environ.get('DATABASE_URL')
     return psycopg2.connect(dsn)
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+def is_db_connection_healthy(conn, idle_seconds: float) -> bool:
+    if conn.closed or conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+        return False
+    if idle_seconds < DB_POOL_PING_AFTER:
+        return True
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def release_db_connection(conn):
+    try:
+        if not conn.closed and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+    if conn.closed or len(_db_pool) >= DB_POOL_SIZE:
+        conn.close()
+        return
+    _db_pool.append((conn, time.monotonic()))
+
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
+def get_request_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+def choose_content_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    qualities = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name.strip().lower()] = quality
+    candidates = []
+    for encoding in (('br', 'gzip') if brotli else ('gzip',)):
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > 0:
+            candidates.append((quality, encoding == 'br', encoding))
+    return max(candidates)[2] if candidates else None
+
+def compress_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    body = response.get('body')
+    if response.get('isBase64Encoded') or not isinstance(body, str):
+        return response
+    raw = body.encode('utf-8')
+    encoding = choose_content_encoding(get_request_header(event, 'Accept-Encoding'))
+    if encoding is None or len(raw) < COMPRESS_MIN_BYTES:
+        return response
+    if encoding == 'br':
+        compressed = brotli.compress(raw, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+    if len(compressed) >= len(raw):
+        return response
+    headers = dict(response.get('headers') or {})
+    headers['Content-Encoding'] = encoding
+    headers['Vary'] = headers['Vary'] + ', Accept-Encoding' if headers.get('Vary') else 'Accept-Encoding'
+    if headers.get('ETag') and not headers['ETag'].startswith('W/'):
+        headers['ETag'] = 'W/' + headers['ETag']
+    return {**response, 'headers': headers, 'body': base64.b64encode(compressed).decode('ascii'), 'isBase64Encoded': True}
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
@@ -72,6 +173,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         existing = cur.fetchone()
         
         if existing:
+            cur.close()
+            release_db_connection(conn)
             return {
                 'statusCode': 400,
                 'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
@@ -79,15 +182,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'isBase64Encoded': False
             }
         
+        # Ledger entry and balance change in one statement; the unique purchase reference stops a double credit
         cur.execute(
-            "UPDATE users SET credits = credits + %s WHERE email = %s RETURNING credits",
-            (tokens_to_add, email)
+            """SELECT t_p55547046_creative_ai_hub.credit_post(u.id, %s, 'purchase', %s)
+               FROM t_p55547046_creative_ai_hub.users u WHERE u.email = %s""",
+            (tokens_to_add, transaction_id, email)
         )
         result = cur.fetchone()
         
         if not result:
             cur.close()
-            conn.close()
+            release_db_connection(conn)
             return {
                 'statusCode': 404,
                 'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
@@ -107,7 +212,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         conn.commit()
         cur.close()
-        conn.close()
+        release_db_connection(conn)
         
         return {
             'statusCode': 200,
@@ -153,7 +258,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         transactions = cur.fetchall()
         
         cur.close()
-        conn.close()
+        release_db_connection(conn)
         
         transactions_list = []
         for t in transactions:
@@ -181,4 +286,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         'headers': {'Access-Control-Allow-Origin': '*'},
         'body': json.dumps({'error': 'Method not allowed'}),
         'isBase64Encoded': False
-    }
\ No newline at end of file
+    }
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    return compress_response(event, handle_request(event, context))
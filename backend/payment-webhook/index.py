@@ -1,21 +1,326 @@
 '''
-Business: Receive YooKassa webhooks and credit tokens automatically
-Args: event with httpMethod, body (YooKassa notification)
+Business: Receive YooKassa webhooks and credit tokens automatically; reconcile against YooKassa's payment list
+Args: event with httpMethod, body (YooKassa notification, {"action": "replay", "notifications": [...]}
+      or {"action": "reconcile", "since": ISO date, "cursor": optional}); the two actions need
+      headers X-Admin-Secret matching WEBHOOK_ADMIN_SECRET
       context with request_id
 Returns: HTTP 200 response
 '''
 
 import json
+import base64
+import gzip
+import hmac
 import os
+import time
+import urllib.request
+from itertools import islice
 import psycopg2
-from typing import Dict, Any
-from datetime import datetime
+import requests
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '2'))
+DB_POOL_PING_AFTER = 30.0
+# Bodies from a kilobyte up are compressed to the client's Accept-Encoding; brotli when installed
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+SCHEMA = 't_p55547046_creative_ai_hub'
+CREDIT_PACKAGES = {
+    99: 10,
+    399: 60,
+    699: 125,
+    2999: 650
+}
+# replay and reconcile are operator actions on a public URL: they need X-Admin-Secret equal to this,
+# and are disabled while it is unset
+WEBHOOK_ADMIN_SECRET = os.environ.get('WEBHOOK_ADMIN_SECRET', '')
+OPERATOR_ACTIONS = ('replay', 'reconcile')
+# Stored notifications replayed after an outage are ingested this many per statement and transaction
+WEBHOOK_REPLAY_BATCH_SIZE = 2000
+# Reconciliation pages through YooKassa's payment list (100 is the API's maximum page size);
+# the URL is overridable so a local stand-in can be used
+YOOKASSA_API_URL = os.environ.get('YUKASSA_API_URL', 'https://api.yookassa.ru/v3')
+YOOKASSA_TIMEOUT = 10
+RECONCILE_PAGE_SIZE = 100
+RECONCILE_LOOKBACK_DAYS = 7
+# A run stops after this many pages and returns next_cursor so the caller can continue
+RECONCILE_MAX_PAGES = 2000
+# Pages are fetched with no database connection held, then each chunk of this many is diffed and
+# credited in its own short transaction; a run cut off by the function timeout keeps the chunks done
+RECONCILE_CHUNK_PAGES = 50
+
+# One statement: the payment is recorded only if it is new and the user exists, and the credit
+# happens only when that insert did. Concurrent deliveries of one payment_id serialize on the
+# unique transaction_id, so the loser inserts nothing and credits nothing
+WEBHOOK_INGEST_SQL = f"""
+    WITH recorded AS (
+        INSERT INTO {SCHEMA}.payment_transactions (transaction_id, user_email, amount, tokens_added)
+        SELECT %(payment_id)s, email, %(amount)s, %(tokens)s FROM {SCHEMA}.users WHERE email = %(email)s
+        ON CONFLICT (transaction_id) DO NOTHING
+        RETURNING user_email
+    ), credited AS (
+        SELECT {SCHEMA}.credit_post(u.id, %(tokens)s, 'purchase', %(payment_id)s) AS credits
+        FROM recorded r JOIN {SCHEMA}.users u ON u.email = r.user_email
+    )
+    SELECT EXISTS (SELECT 1 FROM {SCHEMA}.users WHERE email = %(email)s), (SELECT credits FROM credited)
+"""
+
+# The same for a whole batch. A user with several new payments is credited once with their sum,
+# because one statement cannot update the same users row twice, so the ledger rows are written here
+# rather than through credit_post. A purchase the ledger already has is skipped, not credited twice,
+# instead of aborting the batch on its unique reference
+WEBHOOK_REPLAY_SQL = f"""
+    WITH incoming AS (
+        SELECT DISTINCT ON (payment_id) payment_id, email, amount, tokens
+        FROM unnest(%s::text[], %s::text[], %s::int[], %s::int[]) AS i(payment_id, email, amount, tokens)
+    ), recorded AS (
+        INSERT INTO {SCHEMA}.payment_transactions (transaction_id, user_email, amount, tokens_added)
+        SELECT i.payment_id, u.email, i.amount, i.tokens
+        FROM incoming i JOIN {SCHEMA}.users u ON u.email = i.email
+        ON CONFLICT (transaction_id) DO NOTHING
+        RETURNING transaction_id, user_email, tokens_added
+    ), entries AS (
+        INSERT INTO {SCHEMA}.credit_ledger (user_id, amount, kind, reference)
+        SELECT u.id, r.tokens_added, 'purchase', r.transaction_id
+        FROM recorded r JOIN {SCHEMA}.users u ON u.email = r.user_email
+        ON CONFLICT DO NOTHING
+        RETURNING user_id, amount
+    ), credited AS (
+        UPDATE {SCHEMA}.users u SET credits = u.credits + e.total
+        FROM (SELECT user_id, SUM(amount)::int AS total FROM entries GROUP BY user_id) e
+        WHERE u.id = e.user_id
+    )
+    SELECT (SELECT COUNT(*) FROM entries),
+           (SELECT COUNT(*) FROM incoming i WHERE NOT EXISTS (SELECT 1 FROM {SCHEMA}.users u WHERE u.email = i.email))
+"""
+
+# Each chunk of fetched pages is diffed against payment_transactions with one set-based statement
+# instead of one lookup per payment
+RECONCILE_DIFF_SQL = f"""
+    WITH provider AS (
+        SELECT DISTINCT ON (p->>'id') p->>'id' AS payment_id, p AS payment
+        FROM jsonb_array_elements(%s::jsonb) p
+    )
+    SELECT COUNT(t.transaction_id),
+           COUNT(*) FILTER (WHERE t.amount <> floor((p.payment->'amount'->>'value')::numeric)),
+           COALESCE(jsonb_agg(p.payment) FILTER (WHERE t.transaction_id IS NULL), '[]'::jsonb)
+    FROM provider p
+    LEFT JOIN {SCHEMA}.payment_transactions t ON t.transaction_id = p.payment_id
+"""
+
+_db_pool: List[Tuple[Any, float]] = []
+_yookassa_http = requests.Session()
+# Proxies are read from the environment once here; with trust_env requests rescans it on every page
+_yookassa_http.trust_env = False
+_yookassa_http.proxies.update(urllib.request.getproxies())
+
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
 def get_db_connection():
+    while _db_pool:
+        try:
+            conn, released_at = _db_pool.pop()
+        except IndexError:
+            break
+        if is_db_connection_healthy(conn, time.monotonic() - released_at):
+            return conn
+        conn.close()
     dsn = os.environ.get('DATABASE_URL')
     return psycopg2.connect(dsn)
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+def is_db_connection_healthy(conn, idle_seconds: float) -> bool:
+    if conn.closed or conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+        return False
+    if idle_seconds < DB_POOL_PING_AFTER:
+        return True
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def release_db_connection(conn):
+    try:
+        if not conn.closed and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+    if conn.closed or len(_db_pool) >= DB_POOL_SIZE:
+        conn.close()
+        return
+    _db_pool.append((conn, time.monotonic()))
+
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
+def get_request_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+def choose_content_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    qualities = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name.strip().lower()] = quality
+    candidates = []
+    for encoding in (('br', 'gzip') if brotli else ('gzip',)):
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > 0:
+            candidates.append((quality, encoding == 'br', encoding))
+    return max(candidates)[2] if candidates else None
+
+def compress_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    body = response.get('body')
+    if response.get('isBase64Encoded') or not isinstance(body, str):
+        return response
+    raw = body.encode('utf-8')
+    encoding = choose_content_encoding(get_request_header(event, 'Accept-Encoding'))
+    if encoding is None or len(raw) < COMPRESS_MIN_BYTES:
+        return response
+    if encoding == 'br':
+        compressed = brotli.compress(raw, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+    if len(compressed) >= len(raw):
+        return response
+    headers = dict(response.get('headers') or {})
+    headers['Content-Encoding'] = encoding
+    headers['Vary'] = headers['Vary'] + ', Accept-Encoding' if headers.get('Vary') else 'Accept-Encoding'
+    if headers.get('ETag') and not headers['ETag'].startswith('W/'):
+        headers['ETag'] = 'W/' + headers['ETag']
+    return {**response, 'headers': headers, 'body': base64.b64encode(compressed).decode('ascii'), 'isBase64Encoded': True}
+
+def parse_notification(notification: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    if notification.get('event') != 'payment.succeeded':
+        return 'ignored', None
+    
+    payment_object = notification.get('object') or {}
+    payment_id = payment_object.get('id')
+    email = (payment_object.get('metadata') or {}).get('email', '')
+    if payment_object.get('status') != 'succeeded' or not email or not payment_id:
+        return 'invalid', None
+    
+    amount_int = int(float((payment_object.get('amount') or {}).get('value', 0)))
+    tokens_to_add = CREDIT_PACKAGES.get(amount_int, 0)
+    if tokens_to_add == 0:
+        return 'unknown_package', None
+    
+    return 'ok', {'payment_id': str(payment_id), 'email': email, 'amount': amount_int, 'tokens': tokens_to_add}
+
+def replay_notifications(conn, notifications: List[Dict[str, Any]]) -> Dict[str, Any]:
+    summary = {'received': len(notifications), 'credited': 0, 'already_processed': 0, 'user_not_found': 0,
+               'ignored': 0, 'invalid': 0, 'unknown_package': 0, 'batches': 0}
+    payments = []
+    for notification in notifications:
+        status, payment = parse_notification(notification)
+        if payment is None:
+            summary[status] += 1
+        else:
+            payments.append(payment)
+    
+    cur = conn.cursor()
+    for start in range(0, len(payments), WEBHOOK_REPLAY_BATCH_SIZE):
+        batch = payments[start:start + WEBHOOK_REPLAY_BATCH_SIZE]
+        cur.execute(WEBHOOK_REPLAY_SQL, (
+            [p['payment_id'] for p in batch],
+            [p['email'] for p in batch],
+            [p['amount'] for p in batch],
+            [p['tokens'] for p in batch]
+        ))
+        credited, missing_users = cur.fetchone()
+        conn.commit()
+        summary['batches'] += 1
+        summary['credited'] += credited
+        summary['user_not_found'] += missing_users
+        summary['already_processed'] += len(batch) - credited - missing_users
+    cur.close()
+    return summary
+
+def is_operator_request(event: Dict[str, Any]) -> bool:
+    supplied = get_request_header(event, 'X-Admin-Secret') or ''
+    return bool(WEBHOOK_ADMIN_SECRET) and hmac.compare_digest(supplied.encode(), WEBHOOK_ADMIN_SECRET.encode())
+
+def fetch_succeeded_payments(since: str, cursor: Optional[str]):
+    shop_id = os.environ.get('YUKASSA_SHOP_ID')
+    secret_key = os.environ.get('YUKASSA_SECRET_KEY')
+    if not shop_id or not secret_key:
+        raise RuntimeError('YooKassa credentials not configured')
+    
+    params = {'status': 'succeeded', 'created_at.gte': since, 'limit': RECONCILE_PAGE_SIZE}
+    while True:
+        if cursor:
+            params['cursor'] = cursor
+        response = _yookassa_http.get(
+            f'{YOOKASSA_API_URL}/payments',
+            params=params,
+            auth=(shop_id, secret_key),
+            timeout=YOOKASSA_TIMEOUT
+        )
+        response.raise_for_status()
+        page = response.json()
+        cursor = page.get('next_cursor')
+        yield page.get('items') or [], cursor
+        if not cursor:
+            return
+
+def reconcile_chunk(payments: List[Dict[str, Any]], summary: Dict[str, Any]):
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(RECONCILE_DIFF_SQL, (json.dumps(payments),))
+        matched, amount_mismatch, missing = cur.fetchone()
+        conn.commit()
+        cur.close()
+        # Missing payments go through the replay path, so a webhook arriving meanwhile cannot double-credit
+        replayed = replay_notifications(conn, [{'event': 'payment.succeeded', 'object': payment} for payment in missing])
+    finally:
+        release_db_connection(conn)
+    summary['matched'] += matched
+    summary['amount_mismatch'] += amount_mismatch
+    summary['missing'] += len(missing)
+    for key in ('credited', 'already_processed', 'user_not_found', 'invalid', 'unknown_package'):
+        summary[key] += replayed[key]
+
+def reconcile_payments(since: str, cursor: Optional[str]) -> Dict[str, Any]:
+    summary = {'provider_payments': 0, 'pages': 0, 'matched': 0, 'amount_mismatch': 0, 'missing': 0,
+               'credited': 0, 'already_processed': 0, 'user_not_found': 0, 'invalid': 0, 'unknown_package': 0}
+    pages = fetch_succeeded_payments(since, cursor)
+    next_cursor = cursor
+    while next_cursor is not None or summary['pages'] == 0:
+        chunk: List[Dict[str, Any]] = []
+        fetched = 0
+        for items, next_cursor in islice(pages, min(RECONCILE_CHUNK_PAGES, RECONCILE_MAX_PAGES - summary['pages'])):
+            chunk.extend(items)
+            fetched += 1
+        if fetched == 0:
+            break
+        summary['pages'] += fetched
+        summary['provider_payments'] += len(chunk)
+        reconcile_chunk(chunk, summary)
+    summary['next_cursor'] = next_cursor
+    return summary
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'POST')
     
     if method == 'OPTIONS':
@@ -42,105 +347,80 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     try:
         body_data = json.loads(event.get('body', '{}'))
         
-        notification_type = body_data.get('event')
-        payment_object = body_data.get('object', {})
+        if body_data.get('action') in OPERATOR_ACTIONS and not is_operator_request(event):
+            return {
+                'statusCode': 403,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'Forbidden'}),
+                'isBase64Encoded': False
+            }
         
-        if notification_type != 'payment.succeeded':
+        # Backlog recovery: stored notifications (e.g. a file of webhook bodies) in one request
+        if body_data.get('action') == 'replay':
+            conn = get_db_connection()
+            try:
+                summary = replay_notifications(conn, body_data.get('notifications') or [])
+            finally:
+                release_db_connection(conn)
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({'status': 'ignored'}),
+                'body': json.dumps({'status': 'replayed', **summary}),
                 'isBase64Encoded': False
             }
         
-        payment_id = payment_object.get('id')
-        payment_status = payment_object.get('status')
-        amount_value = float(payment_object.get('amount', {}).get('value', 0))
-        metadata = payment_object.get('metadata', {})
-        email = metadata.get('email', '')
-        
-        if payment_status != 'succeeded' or not email:
+        # Catches succeeded payments whose webhook never arrived
+        if body_data.get('action') == 'reconcile':
+            since = body_data.get('since') or (
+                datetime.now(timezone.utc) - timedelta(days=RECONCILE_LOOKBACK_DAYS)
+            ).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+            summary = reconcile_payments(since, body_data.get('cursor'))
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({'status': 'invalid'}),
+                'body': json.dumps({'status': 'reconciled', 'since': since, **summary}),
                 'isBase64Encoded': False
             }
         
-        amount_int = int(amount_value)
-        
-        credit_packages = {
-            99: 10,
-            399: 60,
-            699: 125,
-            2999: 650
-        }
-        
-        tokens_to_add = credit_packages.get(amount_int, 0)
-        
-        if tokens_to_add == 0:
+        status, payment = parse_notification(body_data)
+        if payment is None:
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({'status': 'unknown_package'}),
+                'body': json.dumps({'status': status}),
                 'isBase64Encoded': False
             }
         
         conn = get_db_connection()
         cur = conn.cursor()
+        cur.execute(WEBHOOK_INGEST_SQL, payment)
+        user_exists, new_balance = cur.fetchone()
+        conn.commit()
+        cur.close()
+        release_db_connection(conn)
         
-        cur.execute(
-            "SELECT id FROM payment_transactions WHERE transaction_id = %s",
-            (payment_id,)
-        )
-        existing = cur.fetchone()
-        
-        if existing:
-            cur.close()
-            conn.close()
+        if not user_exists:
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({'status': 'already_processed'}),
+                'body': json.dumps({'status': 'user_not_found'}),
                 'isBase64Encoded': False
             }
         
-        cur.execute(
-            "UPDATE users SET credits = credits + %s WHERE email = %s RETURNING credits",
-            (tokens_to_add, email)
-        )
-        result = cur.fetchone()
-        
-        if not result:
-            cur.close()
-            conn.close()
+        if new_balance is None:
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({'status': 'user_not_found'}),
+                'body': json.dumps({'status': 'already_processed'}),
                 'isBase64Encoded': False
             }
         
-        new_balance = result[0]
-        
-        cur.execute(
-            """
-            INSERT INTO payment_transactions (transaction_id, user_email, amount, tokens_added, created_at)
-            VALUES (%s, %s, %s, %s, %s)
-            """,
-            (payment_id, email, amount_int, tokens_to_add, datetime.now())
-        )
-        
-        conn.commit()
-        cur.close()
-        conn.close()
-        
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json'},
             'body': json.dumps({
                 'status': 'success',
-                'tokens_added': tokens_to_add,
+                'tokens_added': payment['tokens'],
                 'new_balance': new_balance
             }),
             'isBase64Encoded': False
@@ -153,3 +433,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'status': 'error', 'message': str(e)}),
             'isBase64Encoded': False
         }
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    return compress_response(event, handle_request(event, context))
@@ -5,44 +5,109 @@ Returns: Ответ от AI с сохранением истории
 """
 
 import json
+import gzip
 import os
 import requests
+import time
 import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
 import base64
-from typing import Dict, Any, List
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, Tuple
 from io import BytesIO
-from docx import Document
-from openpyxl import load_workbook
-from PyPDF2 import PdfReader
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('CONTEXT_TOKEN_BUDGET', '6000'))
+CONTEXT_KEEP_RATIO = 0.5
+CONTEXT_SUMMARY_MAX_TOKENS = 800
+
+# Кеш извлечённого текста документов: ключ — вид извлекателя, его версия и SHA-256 содержимого.
+# Версию нужно поднимать при любом изменении extract_text_from_*.
+DOCUMENT_EXTRACTOR_VERSION = 1
+DOCUMENT_CACHE_MAX_CHARS = int(os.environ.get('DOCUMENT_CACHE_MAX_CHARS', '4000000'))
+DOCUMENT_CACHE_DB = os.environ.get('DOCUMENT_CACHE_DB', '1') == '1'
+
+_document_cache: 'OrderedDict[str, str]' = OrderedDict()
+_document_cache_chars = 0
+
+# Общий дедлайн хода: сводка, поиск, размышление и ответ YandexGPT вместе укладываются в него.
+# Таймаут requests ограничивает одно чтение сокета, а не весь запрос, поэтому каждый таймаут — остаток дедлайна
+LLM_DEADLINE_SECONDS = 30.0
+
+_llm_executor = ThreadPoolExecutor(max_workers=2)
+
+# Потоковый режим: шлюз отдаёт ответ функции целиком, поэтому частичный текст пишется в generation_progress
+# не чаще раза в GENERATION_PROGRESS_INTERVAL секунд, а клиент забирает его опросом GET ?stream_id=...
+GENERATION_PROGRESS_INTERVAL = 0.25
+GENERATION_PROGRESS_TTL_SECONDS = 600
+STREAM_ID_MAX_LENGTH = 100
+
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '2'))
+DB_POOL_PING_AFTER = 30.0
+# Ответы от килобайта сжимаются под Accept-Encoding клиента; brotli — если модуль установлен
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Резерв токенов живёт дольше любого хода чата; брошенные резервы снимает credits {"action": "sweep_holds"} по таймеру
+CREDIT_HOLD_TTL_SECONDS = 600
+
+_db_pool: List[Tuple[Any, float]] = []
+
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
 def get_db_connection():
+    while _db_pool:
+        try:
+            conn, released_at = _db_pool.pop()
+        except IndexError:
+            break
+        if is_db_connection_healthy(conn, time.monotonic() - released_at):
+            return conn
+        conn.close()
     dsn = os.environ.get('DATABASE_URL')
     return psycopg2.connect(dsn)
 
-def deduct_tokens(user_email: str, tokens: int) -> bool:
-    """Списывает токены у пользователя"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "UPDATE users SET credits = credits - %s WHERE email = %s AND credits >= %s RETURNING credits",
-        (tokens, user_email, tokens)
-    )
-    result = cursor.fetchone()
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
-    
-    return result is not None
+def is_db_connection_healthy(conn, idle_seconds: float) -> bool:
+    if conn.closed or conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+        return False
+    if idle_seconds < DB_POOL_PING_AFTER:
+        return True
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def release_db_connection(conn):
+    try:
+        if not conn.closed and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+    if conn.closed or len(_db_pool) >= DB_POOL_SIZE:
+        conn.close()
+        return
+    _db_pool.append((conn, time.monotonic()))
 
 def extract_text_from_docx(file_content: bytes) -> str:
     """Извлекает текст из Word документа"""
+    # Парсеры документов импортируются при первом файле нужного типа, а не на холодном старте
+    from docx import Document
     doc = Document(BytesIO(file_content))
     return '\n'.join([paragraph.text for paragraph in doc.paragraphs if paragraph.text.strip()])
 
 def extract_text_from_xlsx(file_content: bytes) -> str:
     """Извлекает текст из Excel документа"""
+    from openpyxl import load_workbook
     wb = load_workbook(BytesIO(file_content), read_only=True)
     text_parts = []
     for sheet in wb.worksheets:
@@ -54,23 +119,95 @@ def extract_text_from_xlsx(file_content: bytes) -> str:
 
 def extract_text_from_pdf(file_content: bytes) -> str:
     """Извлекает текст из PDF документа"""
+    from PyPDF2 import PdfReader
     reader = PdfReader(BytesIO(file_content))
     return '\n'.join([page.extract_text() for page in reader.pages if page.extract_text()])
 
-def process_document(file_data: str, file_type: str) -> str:
-    """Обрабатывает документ и возвращает текст"""
-    file_content = base64.b64decode(file_data)
-    
+def document_kind(file_type: str) -> Optional[str]:
+    """Определяет, каким извлекателем обрабатывается тип файла"""
     if file_type in ['docx', 'doc']:
+        return 'docx'
+    if file_type in ['xlsx', 'xls']:
+        return 'xlsx'
+    if file_type == 'pdf':
+        return 'pdf'
+    return None
+
+def remember_document_text(cache_key: str, text: str):
+    """Кладёт извлечённый текст в память процесса, удерживая общий объём в DOCUMENT_CACHE_MAX_CHARS"""
+    global _document_cache_chars
+    if len(text) > DOCUMENT_CACHE_MAX_CHARS:
+        return
+    previous = _document_cache.pop(cache_key, None)
+    if previous is not None:
+        _document_cache_chars -= len(previous)
+    _document_cache[cache_key] = text
+    _document_cache_chars += len(text)
+    while _document_cache_chars > DOCUMENT_CACHE_MAX_CHARS:
+        _, evicted = _document_cache.popitem(last=False)
+        _document_cache_chars -= len(evicted)
+
+def prepare_documents(documents: List[Dict]) -> List[Dict]:
+    """Декодирует вложения и считает ключи кеша по SHA-256; текст из памяти процесса подставляется сразу"""
+    prepared = []
+    for doc in documents:
+        file_data = doc.get('data', '')
+        file_type = doc.get('type', '')
+        file_name = doc.get('name', 'документ')
+        if not file_data or not file_type:
+            continue
+        kind = document_kind(file_type)
+        if kind is None:
+            prepared.append({'name': file_name, 'text': f"[Неподдерживаемый формат: {file_type}]"})
+            continue
+        file_content = base64.b64decode(file_data)
+        cache_key = f"{kind}:{DOCUMENT_EXTRACTOR_VERSION}:{hashlib.sha256(file_content).hexdigest()}"
+        text = _document_cache.get(cache_key)
+        if text is not None:
+            _document_cache.move_to_end(cache_key)
+        prepared.append({'name': file_name, 'kind': kind, 'content': file_content, 'cache_key': cache_key, 'text': text})
+    return prepared
+
+def extract_document_text(kind: str, file_content: bytes) -> str:
+    """Разбирает документ извлекателем его вида"""
+    if kind == 'docx':
         return extract_text_from_docx(file_content)
-    elif file_type in ['xlsx', 'xls']:
+    if kind == 'xlsx':
         return extract_text_from_xlsx(file_content)
-    elif file_type == 'pdf':
-        return extract_text_from_pdf(file_content)
-    else:
-        return f"[Неподдерживаемый формат: {file_type}]"
+    return extract_text_from_pdf(file_content)
 
-def search_web(query: str) -> str:
+def read_documents(conn, cursor, prepared: List[Dict], cached_texts: Dict[str, str]) -> List[str]:
+    """Достаёт текст документов: из памяти, из строк кеша, пришедших с историей, или разбором файла.
+    Новые тексты пишутся в document_text_cache на соединении хода."""
+    extracted = []
+    for doc in prepared:
+        if doc['text'] is not None:
+            continue
+        text = cached_texts.get(doc['cache_key'])
+        if text is None:
+            text = extract_document_text(doc['kind'], doc['content'])
+            cached_texts[doc['cache_key']] = text
+            extracted.append((doc['cache_key'], text))
+        remember_document_text(doc['cache_key'], text)
+        doc['text'] = text
+    
+    if extracted and DOCUMENT_CACHE_DB:
+        try:
+            cursor.execute(
+                """INSERT INTO t_p55547046_creative_ai_hub.document_text_cache (cache_key, text)
+                   SELECT * FROM unnest(%s::text[], %s::text[])
+                   ON CONFLICT (cache_key) DO NOTHING""",
+                ([key for key, _ in extracted], [text for _, text in extracted])
+            )
+            # Кеш не зависит от исхода хода: фиксируем сразу, до запроса к модели
+            conn.commit()
+        except psycopg2.Error as e:
+            print(f"Document cache write failed: {e}")
+            conn.rollback()
+    
+    return [f"[Документ: {doc['name']}]\n{doc['text']}" for doc in prepared]
+
+def search_web(query: str, deadline: float) -> str:
     """Поиск информации в интернете через Tavily API"""
     tavily_api_key = os.environ.get('TAVILY_API_KEY')
     if not tavily_api_key:
@@ -85,7 +222,7 @@ def search_web(query: str) -> str:
                 'max_results': 3,
                 'include_answer': True
             },
-            timeout=10
+            timeout=min(10.0, remaining_timeout(deadline))
         )
         
         if response.status_code == 200:
@@ -104,48 +241,283 @@ def search_web(query: str) -> str:
     except Exception as e:
         return f"[Ошибка поиска: {str(e)}]"
 
-def load_chat_history(user_email: str, chat_id: str) -> List[Dict]:
-    """Загружает историю чата из БД"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+CHAT_CONTEXT_SQL = """
+    SELECT ch.summary, ch.summary_upto, COALESCE((
+        SELECT json_agg(json_strip_nulls(json_build_object(
+                   'seq', m.seq, 'role', m.role, 'content', m.content, 'thinking', m.thinking
+               )) ORDER BY m.seq)
+        FROM t_p55547046_creative_ai_hub.chat_messages m
+        WHERE m.chat_id = ch.chat_id AND m.seq > ch.summary_upto
+    ), '[]'::json) AS messages
+    FROM t_p55547046_creative_ai_hub.chat_history ch
+    WHERE ch.user_email = %s AND ch.chat_id = %s
+"""
+
+DOCUMENT_CACHE_SQL = """
+    SELECT json_object_agg(cache_key, text) FROM t_p55547046_creative_ai_hub.document_text_cache
+    WHERE cache_key = ANY(%s::text[])
+"""
+
+def load_history_and_reserve(cursor, user_email: str, chat_id: str, tokens: int,
+                             document_keys: List[str]) -> Tuple[Optional[str], int, List[Dict], bool, Optional[int], Dict[str, str]]:
+    """Одним запросом читает сводку и ещё не свёрнутые сообщения чата, тексты документов из кеша
+    и резервирует токены (анонимам — без резерва)"""
+    if user_email == 'anonymous':
+        cursor.execute(
+            f"""SELECT h.summary, h.summary_upto, h.messages, NULL::bigint, ({DOCUMENT_CACHE_SQL})
+                FROM (SELECT 1) AS one LEFT JOIN ({CHAT_CONTEXT_SQL}) AS h ON TRUE""",
+            (document_keys, user_email, chat_id)
+        )
+        summary, summary_upto, messages, _, cached_texts = cursor.fetchone()
+        return summary, summary_upto or 0, messages or [], True, None, cached_texts or {}
     cursor.execute(
-        "SELECT messages FROM t_p55547046_creative_ai_hub.chat_history WHERE user_email = %s AND chat_id = %s",
-        (user_email, chat_id)
+        f"""SELECT h.summary, h.summary_upto, h.messages,
+                   (SELECT t_p55547046_creative_ai_hub.credit_reserve(u.id, %s, 'chat', %s, %s)
+                    FROM t_p55547046_creative_ai_hub.users u WHERE u.email = %s),
+                   ({DOCUMENT_CACHE_SQL})
+            FROM (SELECT 1) AS one LEFT JOIN ({CHAT_CONTEXT_SQL}) AS h ON TRUE""",
+        (tokens, chat_id, CREDIT_HOLD_TTL_SECONDS, user_email, document_keys, user_email, chat_id)
     )
-    result = cursor.fetchone()
-    
+    summary, summary_upto, messages, hold_id, cached_texts = cursor.fetchone()
+    return summary, summary_upto or 0, messages or [], hold_id is not None, hold_id, cached_texts or {}
+
+def release_credit_hold(conn, hold_id: Optional[int]):
+    """Откатывает незафиксированные изменения хода и возвращает зарезервированные токены на баланс"""
+    conn.rollback()
+    if hold_id is None:
+        return
+    cursor = conn.cursor()
+    cursor.execute("SELECT t_p55547046_creative_ai_hub.credit_release(%s)", (hold_id,))
+    conn.commit()
     cursor.close()
-    conn.close()
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка токенов YandexGPT: ~3 символа на токен плюс разметка сообщения"""
+    return len(text) // 3 + 4
+
+def split_context_window(messages: List[Dict], budget: int) -> int:
+    """Возвращает индекс, начиная с которого последние сообщения помещаются в бюджет (последнее — всегда)"""
+    used = 0
+    start = len(messages)
+    while start > 0:
+        cost = estimate_tokens(messages[start - 1]['content'])
+        if used + cost > budget and start < len(messages):
+            break
+        used += cost
+        start -= 1
+    return start
+
+def fit_context_window(messages: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """Делит несвёрнутую историю на (уходящие в сводку, окно контекста).
+    Пока хвост влезает в CONTEXT_TOKEN_BUDGET, окно не сдвигается и сводка не пересчитывается;
+    при переполнении окно сжимается до доли CONTEXT_KEEP_RATIO, чтобы следующий сдвиг был нескоро."""
+    if split_context_window(messages, CONTEXT_TOKEN_BUDGET) == 0:
+        return [], messages
+    start = split_context_window(messages, int(CONTEXT_TOKEN_BUDGET * CONTEXT_KEEP_RATIO))
+    return messages[:start], messages[start:]
+
+def summarize_messages(url: str, headers: Dict[str, str], folder_id: str,
+                       summary: Optional[str], messages: List[Dict], deadline: float) -> Optional[str]:
+    """Сворачивает вышедшие из окна сообщения в новую сводку вместе с прежней"""
+    dialogue = '\n\n'.join(
+        f"{'Пользователь' if msg['role'] == 'user' else 'Juno'}: {msg['content']}" for msg in messages
+    )
+    prompt = f"Предыдущая сводка:\n{summary}\n\n" if summary else ''
+    prompt += f"Новая часть диалога:\n{dialogue}"
     
-    if result and result[0]:
-        messages = result[0]
-        if isinstance(messages, str):
-            return json.loads(messages)
-        return messages
-    return []
+    payload = {
+        "modelUri": f"gpt://{folder_id}/yandexgpt-lite/latest",
+        "completionOptions": {
+            "stream": False,
+            "temperature": 0.3,
+            "maxTokens": CONTEXT_SUMMARY_MAX_TOKENS
+        },
+        "messages": [
+            {"role": "system", "text": "Сожми диалог в краткую сводку: факты о пользователе, его цели, принятые решения, важные числа и открытые вопросы. Пиши только сводку, без вступлений."},
+            {"role": "user", "text": prompt}
+        ]
+    }
+    
+    try:
+        response = requests.post(url, headers=headers, json=payload, timeout=min(20.0, remaining_timeout(deadline)))
+        if response.status_code == 200:
+            text = response.json().get('result', {}).get('alternatives', [{}])[0].get('message', {}).get('text', '')
+            return text or None
+    except requests.RequestException:
+        pass
+    return None
 
-def save_chat_history(user_email: str, chat_id: str, messages: List[Dict], chat_title: str):
-    """Сохраняет историю чата в БД"""
-    conn = get_db_connection()
+def append_chat_messages(cursor, user_email: str, chat_id: str, chat_title: str,
+                         service_id: int, service_name: str, new_messages: List[Dict]) -> Tuple[int, int]:
+    """Дописывает сообщения в конец чата; стоимость зависит только от новых сообщений, а не от длины чата"""
+    # updated_at — момент записи, а не начала транзакции: ход чата держит транзакцию, пока отвечает модель,
+    # и клиент с updated_since не должен пропустить такую строку
+    cursor.execute(
+        """WITH chat AS (
+               INSERT INTO t_p55547046_creative_ai_hub.chat_history
+               (user_email, chat_id, chat_title, service_id, service_name, message_count, created_at, updated_at)
+               VALUES (%s, %s, %s, %s, %s, %s, NOW(), clock_timestamp())
+               ON CONFLICT (chat_id) DO UPDATE SET
+               message_count = chat_history.message_count + EXCLUDED.message_count,
+               updated_at = clock_timestamp()
+               WHERE chat_history.user_email = EXCLUDED.user_email
+               RETURNING id, message_count
+           ), appended AS (
+               INSERT INTO t_p55547046_creative_ai_hub.chat_messages (chat_id, seq, role, content, thinking)
+               SELECT %s, chat.message_count - %s + m.ord, m.role, m.content, m.thinking
+               FROM chat, unnest(%s::text[], %s::text[], %s::text[]) WITH ORDINALITY AS m(role, content, thinking, ord)
+           )
+           SELECT id, message_count FROM chat""",
+        (
+            user_email, chat_id, chat_title, service_id, service_name, len(new_messages),
+            chat_id, len(new_messages),
+            [msg['role'] for msg in new_messages],
+            [msg.get('content') or '' for msg in new_messages],
+            [msg.get('thinking') for msg in new_messages]
+        )
+    )
+    return cursor.fetchone()
+
+def remaining_timeout(deadline: float) -> float:
+    """Таймаут очередного запроса — остаток общего дедлайна хода, но не меньше секунды"""
+    return max(1.0, deadline - time.monotonic())
+
+def request_completion_text(url: str, headers: Dict[str, str], payload: Dict[str, Any], deadline: float) -> str:
+    """Выполняет непотоковый запрос к YandexGPT и возвращает текст ответа или пустую строку"""
+    response = requests.post(url, headers=headers, json=payload, timeout=remaining_timeout(deadline))
+    if response.status_code != 200:
+        return ''
+    alternatives = response.json().get('result', {}).get('alternatives', [])
+    return alternatives[0].get('message', {}).get('text', '') if alternatives else ''
+
+def collect_completion_text(future: Future, deadline: float) -> str:
+    """Забирает результат фонового запроса, не ожидая дольше дедлайна"""
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except Exception:
+        return ''
+
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
+def relay_yandex_stream(response, started_at: float, deadline: float,
+                        publish: Callable[[str], None]) -> Tuple[str, Optional[int]]:
+    text = ''
+    first_token_ms = None
+    published_at = None
+    for line in response.iter_lines():
+        if time.monotonic() > deadline:
+            response.close()
+            raise requests.Timeout('YandexGPT stream did not finish before the deadline')
+        if not line:
+            continue
+        alternatives = json.loads(line).get('result', {}).get('alternatives', [])
+        if not alternatives:
+            continue
+        partial = alternatives[0].get('message', {}).get('text', '')
+        if len(partial) <= len(text):
+            continue
+        text = partial
+        now = time.monotonic()
+        if first_token_ms is None:
+            first_token_ms = int((now - started_at) * 1000)
+        if published_at is None or now - published_at >= GENERATION_PROGRESS_INTERVAL:
+            publish(text)
+            published_at = now
+    return text, first_token_ms
+
+def publish_generation_progress(conn, stream_id: str, user_email: str, text: str):
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """INSERT INTO t_p55547046_creative_ai_hub.generation_progress (stream_id, user_email, text, updated_at)
+               VALUES (%s, %s, %s, clock_timestamp())
+               ON CONFLICT (stream_id) DO UPDATE SET text = EXCLUDED.text, updated_at = EXCLUDED.updated_at
+               WHERE generation_progress.user_email = EXCLUDED.user_email""",
+            (stream_id, user_email, text)
+        )
+        conn.commit()
+        cursor.close()
+    except psycopg2.Error as e:
+        print(f"Generation progress write failed: {e}")
+        if not conn.closed:
+            conn.rollback()
+
+def finish_generation_progress(conn, stream_id: str, user_email: str):
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """DELETE FROM t_p55547046_creative_ai_hub.generation_progress
+               WHERE (stream_id = %s AND user_email = %s)
+                  OR updated_at < clock_timestamp() - %s * INTERVAL '1 second'""",
+            (stream_id, user_email, GENERATION_PROGRESS_TTL_SECONDS)
+        )
+        conn.commit()
+        cursor.close()
+    except psycopg2.Error as e:
+        print(f"Generation progress cleanup failed: {e}")
+        if not conn.closed:
+            conn.rollback()
+
+def read_generation_progress(conn, stream_id: str, user_email: str) -> str:
     cursor = conn.cursor()
-    
     cursor.execute(
-        """INSERT INTO t_p55547046_creative_ai_hub.chat_history 
-           (user_email, chat_id, chat_title, service_id, service_name, messages, created_at, updated_at)
-           VALUES (%s, %s, %s, 1, 'AI Chat', %s, NOW(), NOW())
-           ON CONFLICT (chat_id) DO UPDATE SET
-           messages = EXCLUDED.messages,
-           chat_title = EXCLUDED.chat_title,
-           updated_at = NOW()""",
-        (user_email, chat_id, chat_title, json.dumps(messages, ensure_ascii=False))
+        "SELECT text FROM t_p55547046_creative_ai_hub.generation_progress WHERE stream_id = %s AND user_email = %s",
+        (stream_id, user_email)
     )
-    
-    conn.commit()
+    row = cursor.fetchone()
+    conn.rollback()
     cursor.close()
-    conn.close()
+    return row[0] if row else ''
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+# Shared with the other functions. Each function deploys from its own folder with no shared module
+# to import, so this block is copied, not imported: keep every copy byte-identical.
+def get_request_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+def choose_content_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    qualities = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name.strip().lower()] = quality
+    candidates = []
+    for encoding in (('br', 'gzip') if brotli else ('gzip',)):
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > 0:
+            candidates.append((quality, encoding == 'br', encoding))
+    return max(candidates)[2] if candidates else None
+
+def compress_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    body = response.get('body')
+    if response.get('isBase64Encoded') or not isinstance(body, str):
+        return response
+    raw = body.encode('utf-8')
+    encoding = choose_content_encoding(get_request_header(event, 'Accept-Encoding'))
+    if encoding is None or len(raw) < COMPRESS_MIN_BYTES:
+        return response
+    if encoding == 'br':
+        compressed = brotli.compress(raw, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+    if len(compressed) >= len(raw):
+        return response
+    headers = dict(response.get('headers') or {})
+    headers['Content-Encoding'] = encoding
+    headers['Vary'] = headers['Vary'] + ', Accept-Encoding' if headers.get('Vary') else 'Accept-Encoding'
+    if headers.get('ETag') and not headers['ETag'].startswith('W/'):
+        headers['ETag'] = 'W/' + headers['ETag']
+    return {**response, 'headers': headers, 'body': base64.b64encode(compressed).decode('ascii'), 'isBase64Encoded': True}
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
@@ -153,7 +525,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
                 'Access-Control-Allow-Headers': 'Content-Type, X-User-Email',
                 'Access-Control-Max-Age': '86400'
             },
@@ -161,20 +533,44 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
+    user_email = get_request_header(event, 'X-User-Email') or 'anonymous'
+    
+    # Опрос потокового режима: текст ответа, полученный к этому моменту, пока POST ещё генерирует
+    if method == 'GET':
+        stream_id = (event.get('queryStringParameters') or {}).get('stream_id')
+        if not stream_id:
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'Нужен stream_id'}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        conn = get_db_connection()
+        try:
+            text = read_generation_progress(conn, stream_id, user_email)
+        finally:
+            release_db_connection(conn)
+        return {
+            'statusCode': 200,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json', 'Cache-Control': 'no-store'},
+            'body': json.dumps({'success': True, 'text': text}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
     if method != 'POST':
         return {
             'statusCode': 405,
             'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-            'body': json.dumps({'error': 'Только POST'}, ensure_ascii=False),
+            'body': json.dumps({'error': 'Только GET и POST'}, ensure_ascii=False),
             'isBase64Encoded': False
         }
     
     body_data = json.loads(event.get('body', '{}'))
     new_message = body_data.get('message', '')
     chat_id = body_data.get('chat_id', 'default')
-    user_email = event.get('headers', {}).get('X-User-Email') or event.get('headers', {}).get('x-user-email') or 'anonymous'
     documents = body_data.get('documents', [])
     deep_think = body_data.get('deep_think', False)
+    stream_id = body_data.get('stream_id')
     
     if not new_message and not documents:
         return {
@@ -184,46 +580,83 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    # Загружаем историю чата
-    messages = load_chat_history(user_email, chat_id)
+    if stream_id is not None and (not isinstance(stream_id, str) or not stream_id or len(stream_id) > STREAM_ID_MAX_LENGTH):
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Некорректный stream_id'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
     
-    # Обрабатываем документы
-    document_texts = []
-    for doc in documents:
-        file_data = doc.get('data', '')
-        file_type = doc.get('type', '')
-        file_name = doc.get('name', 'документ')
-        
-        if file_data and file_type:
-            extracted_text = process_document(file_data, file_type)
-            document_texts.append(f"[Документ: {file_name}]\n{extracted_text}")
+    # Все запросы хода к внешним API укладываются в один дедлайн, отсчитанный отсюда
+    deadline = time.monotonic() + LLM_DEADLINE_SECONDS
     
-    # Формируем полное сообщение пользователя
-    full_user_message = new_message
-    if document_texts:
-        full_user_message += '\n\n' + '\n\n'.join(document_texts)
+    # Одно соединение на весь ход чата: резерв токенов снимается, если ответ не получен
+    conn = get_db_connection()
+    try:
+        return process_chat_turn(conn, new_message, chat_id, user_email, documents, deep_think, deadline, stream_id)
+    finally:
+        release_db_connection(conn)
+
+def process_chat_turn(conn, new_message: str, chat_id: str, user_email: str, documents: List[Dict],
+                      deep_think: bool, deadline: float, stream_id: Optional[str] = None) -> Dict[str, Any]:
+    """Обрабатывает сообщение: резервирует токены, ответ и подтверждение резерва фиксируются вместе"""
+    cursor = conn.cursor()
     
-    # Добавляем новое сообщение пользователя
-    messages.append({'role': 'user', 'content': full_user_message})
+    # Документы, которых нет в памяти процесса, ищутся в document_text_cache тем же запросом, что и история
+    prepared_documents = prepare_documents(documents)
+    document_keys = [doc['cache_key'] for doc in prepared_documents if doc['text'] is None] if DOCUMENT_CACHE_DB else []
     
     # Проверяем баланс и списываем токены (только для не-анонимных)
     tokens_needed = 1  # Базовая стоимость
     if documents:
         tokens_needed += len(documents) * 1
     
-    if user_email != 'anonymous':
-        if not deduct_tokens(user_email, tokens_needed):
-            return {
-                'statusCode': 402,
-                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                'body': json.dumps({'error': f'Недостаточно токенов. Нужно: {tokens_needed}'}, ensure_ascii=False),
-                'isBase64Encoded': False
-            }
+    # Сводка, несвёрнутая история, тексты документов из кеша и резерв токенов — за один запрос к БД
+    summary, summary_upto, messages, reserved, hold_id, cached_texts = load_history_and_reserve(
+        cursor, user_email, chat_id, tokens_needed, document_keys
+    )
+    
+    if not reserved:
+        conn.rollback()
+        return {
+            'statusCode': 402,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': f'Недостаточно токенов. Нужно: {tokens_needed}'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
+    # Резерв фиксируем сразу: строка пользователя не остаётся заблокированной на время ответа модели
+    conn.commit()
     
+    try:
+        # Формируем полное сообщение пользователя; разбор документов — уже после резерва, вне транзакции
+        full_user_message = new_message
+        document_texts = read_documents(conn, cursor, prepared_documents, cached_texts)
+        if document_texts:
+            full_user_message += '\n\n' + '\n\n'.join(document_texts)
+        
+        # Добавляем новое сообщение пользователя
+        messages.append({'role': 'user', 'content': full_user_message})
+        
+        return complete_chat_turn(conn, cursor, new_message, full_user_message, chat_id, user_email,
+                                  summary, summary_upto, messages, hold_id, deep_think, deadline, stream_id)
+    except Exception:
+        try:
+            release_credit_hold(conn, hold_id)
+        except psycopg2.Error:
+            pass  # соединение потеряно — резерв снимет подметание по истечении срока
+        raise
+
+def complete_chat_turn(conn, cursor, new_message: str, full_user_message: str, chat_id: str, user_email: str,
+                       summary: Optional[str], summary_upto: int, messages: List[Dict], hold_id: Optional[int],
+                       deep_think: bool, deadline: float, stream_id: Optional[str]) -> Dict[str, Any]:
+    """Получает ответ модели и сохраняет ход; резерв токенов подтверждается в той же транзакции"""
     yandex_api_key = os.environ.get('YANDEX_API_KEY')
     yandex_folder_id = os.environ.get('YANDEX_FOLDER_ID')
     
     if not yandex_api_key or not yandex_folder_id:
+        release_credit_hold(conn, hold_id)
         return {
             'statusCode': 500,
             'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
@@ -238,6 +671,60 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         "x-folder-id": yandex_folder_id
     }
     
+    # Размышление зависит только от вопроса, поэтому запускаем его параллельно с основным ответом
+    thinking_text = ''
+    thinking_future = None
+    if deep_think:
+        thinking_prompt = f"""Ты Juno, продвинутый AI. Проанализируй вопрос глубоко и опиши свой мыслительный процесс:
+
+ВОПРОС ПОЛЬЗОВАТЕЛЯ: {new_message}
+
+ТВОЙ АНАЛИЗ (пиши подробно, используя структуру):
+
+🎯 Суть вопроса:
+[Что реально спрашивает пользователь? Какова его цель?]
+
+🧩 Ключевые аспекты:
+[Какие факторы нужно учесть? Что важно не упустить?]
+
+💡 Подход к решению:
+[Какая стратегия будет наиболее эффективной? Почему именно она?]
+
+🔍 Дополнительные соображения:
+[Что может быть неочевидным? Какие нюансы важны?]
+
+Размышляй как эксперт, учитывай контекст диалога, предлагай глубокий анализ."""
+        
+        thinking_payload = {
+            "modelUri": f"gpt://{yandex_folder_id}/yandexgpt/latest",
+            "completionOptions": {
+                "stream": False,
+                "temperature": 0.9,
+                "maxTokens": 1000
+            },
+            "messages": [
+                {"role": "system", "text": "Ты Juno — AI с глубоким аналитическим мышлением. Размышляй вслух, показывай процесс анализа проблемы. Будь интеллектуальным и проницательным."},
+                {"role": "user", "text": thinking_prompt}
+            ]
+        }
+        
+        thinking_future = _llm_executor.submit(request_completion_text, url, headers, thinking_payload, deadline)
+    
+    # Держим контекст в бюджете токенов: старые сообщения сворачиваются в сводку только при сдвиге окна
+    folded, messages = fit_context_window(messages)
+    if folded:
+        new_summary = summarize_messages(url, headers, yandex_folder_id, summary, folded, deadline)
+        if new_summary:
+            summary = new_summary
+            summary_upto = folded[-1]['seq']
+            cursor.execute(
+                "UPDATE t_p55547046_creative_ai_hub.chat_history SET summary = %s, summary_upto = %s WHERE chat_id = %s",
+                (summary, summary_upto, chat_id)
+            )
+            # Сводка верна и без этого хода: фиксируем сразу, чтобы соединение не держало транзакцию,
+            # пока отвечает модель (в потоковом режиме на нём же коммитится частичный ответ)
+            conn.commit()
+    
     # Проверяем, нужен ли поиск в интернете
     search_keywords = [
         'найди', 'поищи', 'найти', 'поиск', 'поискать',
@@ -256,7 +743,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     search_results = ''
     if needs_search:
-        search_results = search_web(new_message)
+        search_results = search_web(new_message, deadline)
     
     # Формируем сообщения для YandexGPT
     system_prompt = """Ты Juno — продвинутый AI-помощник нового поколения. Твоя задача — давать максимально точные, полезные и интеллектуальные ответы.
@@ -331,51 +818,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         {"role": "system", "text": system_prompt}
     ]
     
-    # Отправляем ВСЮ историю диалога для полного контекста
+    if summary:
+        yandex_messages.append({"role": "system", "text": f"Краткое содержание предыдущей части диалога:\n{summary}"})
+    
+    # Отправляем окно последних сообщений, уложенное в бюджет токенов
     for msg in messages:
         yandex_messages.append({"role": msg['role'], "text": msg['content']})
     
-    # Если включен режим креативного мышления, сначала генерируем размышление
-    thinking_text = ''
-    if deep_think:
-        thinking_prompt = f"""Ты Juno, продвинутый AI. Проанализируй вопрос глубоко и опиши свой мыслительный процесс:
-
-ВОПРОС ПОЛЬЗОВАТЕЛЯ: {new_message}
-
-ТВОЙ АНАЛИЗ (пиши подробно, используя структуру):
-
-🎯 Суть вопроса:
-[Что реально спрашивает пользователь? Какова его цель?]
-
-🧩 Ключевые аспекты:
-[Какие факторы нужно учесть? Что важно не упустить?]
-
-💡 Подход к решению:
-[Какая стратегия будет наиболее эффективной? Почему именно она?]
-
-🔍 Дополнительные соображения:
-[Что может быть неочевидным? Какие нюансы важны?]
-
-Размышляй как эксперт, учитывай контекст диалога, предлагай глубокий анализ."""
-        
-        thinking_payload = {
-            "modelUri": f"gpt://{yandex_folder_id}/yandexgpt/latest",
-            "completionOptions": {
-                "stream": False,
-                "temperature": 0.9,
-                "maxTokens": 1000
-            },
-            "messages": [
-                {"role": "system", "text": "Ты Juno — AI с глубоким аналитическим мышлением. Размышляй вслух, показывай процесс анализа проблемы. Будь интеллектуальным и проницательным."},
-                {"role": "user", "text": thinking_prompt}
-            ]
-        }
-        
-        thinking_response = requests.post(url, headers=headers, json=thinking_payload, timeout=30)
-        if thinking_response.status_code == 200:
-            thinking_data = thinking_response.json()
-            thinking_text = thinking_data.get('result', {}).get('alternatives', [{}])[0].get('message', {}).get('text', '')
-    
     # Настройки для более умного ответа
     payload = {
         "modelUri": f"gpt://{yandex_folder_id}/yandexgpt/latest",
@@ -387,9 +836,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         "messages": yandex_messages
     }
     
-    response = requests.post(url, headers=headers, json=payload, timeout=30)
+    started_at = time.monotonic()
+    if stream_id:
+        # Потоковый режим: YandexGPT отдаёт частичные ответы, они коммитятся в generation_progress на соединении хода
+        payload["completionOptions"]["stream"] = True
+        response = requests.post(url, headers=headers, json=payload, timeout=remaining_timeout(deadline), stream=True)
+    else:
+        response = requests.post(url, headers=headers, json=payload, timeout=remaining_timeout(deadline))
     
     if response.status_code != 200:
+        # Ответа нет — снимаем резерв токенов
+        release_credit_hold(conn, hold_id)
         return {
             'statusCode': 500,
             'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
@@ -397,8 +854,20 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    response_data = response.json()
-    reply = response_data.get('result', {}).get('alternatives', [{}])[0].get('message', {}).get('text', 'Не могу ответить')
+    first_token_ms = None
+    if stream_id:
+        reply, first_token_ms = relay_yandex_stream(
+            response, started_at, deadline, lambda text: publish_generation_progress(conn, stream_id, user_email, text)
+        )
+        reply = reply or 'Не могу ответить'
+        print(f"[STREAM] chat_id={chat_id} ttft_ms={first_token_ms} total_ms={int((time.monotonic() - started_at) * 1000)}")
+    else:
+        response_data = response.json()
+        reply = response_data.get('result', {}).get('alternatives', [{}])[0].get('message', {}).get('text', 'Не могу ответить')
+    
+    # Ждём размышление не дольше общего дедлайна; если оно не успело или упало — отвечаем без него
+    if thinking_future:
+        thinking_text = collect_completion_text(thinking_future, deadline)
     
     # Добавляем ответ AI в историю
     messages.append({'role': 'assistant', 'content': reply})
@@ -406,8 +875,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     # Генерируем название чата из первого сообщения
     chat_title = messages[0]['content'][:50] + '...' if len(messages[0]['content']) > 50 else messages[0]['content']
     
-    # Сохраняем обновлённую историю
-    save_chat_history(user_email, chat_id, messages, chat_title)
+    # Дописываем только новый ход и подтверждаем резерв вместе с ним
+    append_chat_messages(cursor, user_email, chat_id, chat_title, 1, 'AI Chat', messages[-2:])
+    if hold_id is not None:
+        cursor.execute("SELECT t_p55547046_creative_ai_hub.credit_commit(%s)", (hold_id,))
+    conn.commit()
+    cursor.close()
+    
+    # Полный ответ уходит в теле POST — частичный больше не нужен
+    if stream_id:
+        finish_generation_progress(conn, stream_id, user_email)
     
     response_body = {
         'success': True,
@@ -418,6 +895,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     if thinking_text:
         response_body['thinking'] = thinking_text
     
+    if stream_id:
+        response_body['time_to_first_token_ms'] = first_token_ms
+    
     return {
         'statusCode': 200,
         'headers': {
@@ -426,4 +906,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         },
         'body': json.dumps(response_body, ensure_ascii=False),
         'isBase64Encoded': False
-    }
\ No newline at end of file
+    }
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    return compress_response(event, handle_request(event, context))
@@ -0,0 +1,23 @@
+'''
+Loads backend function modules by directory name so benchmarks can call
+their helpers without deploying them. Each function lives in its own folder
+with an index.py, so they cannot be imported as a regular package.
+'''
+
+import importlib.util
+import os
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+def load_handler(function_name: str):
+    function_dir = os.path.join(BACKEND_DIR, function_name)
+    module_name = 'bench_' + function_name.replace('-', '_')
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(function_dir, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.path.insert(0, function_dir)
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(function_dir)
+    return module
@@ -0,0 +1,97 @@
+'''
+Business: Measure memory and throughput of the admin export against fetchall() into JSON
+Args: DATABASE_URL pointing at a scratch Postgres, optional row count (default 2,000,000)
+Returns: Prints peak Python memory and time for both approaches
+
+Usage: DATABASE_URL=postgresql://localhost/postgres python benchmarks/admin_export.py [rows]
+Payments are generated in a throwaway schema, bench_admin_export, which is
+dropped at the end. The export is pulled chunk by chunk through the handler,
+the way a client follows X-Export-Cursor.
+'''
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import psycopg2
+
+from _handlers import load_handler
+
+BENCH_SCHEMA = 'bench_admin_export'
+
+SETUP_SQL = f"""
+DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE;
+CREATE SCHEMA {BENCH_SCHEMA};
+CREATE TABLE {BENCH_SCHEMA}.payment_transactions (
+    id SERIAL PRIMARY KEY,
+    transaction_id VARCHAR(255) UNIQUE NOT NULL,
+    user_email VARCHAR(255) NOT NULL,
+    amount INTEGER NOT NULL,
+    tokens_added INTEGER NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO {BENCH_SCHEMA}.payment_transactions (transaction_id, user_email, amount, tokens_added, created_at)
+SELECT 'yk-' || md5(g::text), 'user' || (g %% 100000) || '@example.com', 100 + g %% 5000, 10 + g %% 500,
+       TIMESTAMP '2024-01-01' + g * INTERVAL '10 seconds'
+FROM generate_series(1, %(rows)s) g;
+ANALYZE {BENCH_SCHEMA}.payment_transactions;
+"""
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def main() -> None:
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        sys.exit('DATABASE_URL is required')
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    cur = conn.cursor()
+    print(f"generating {rows:,} payments...")
+    cur.execute(SETUP_SQL, {'rows': rows})
+
+    admin = load_handler('admin')
+    admin.EXPORT_TABLES['payments']['source'] = f"{BENCH_SCHEMA}.payment_transactions t"
+
+    def fetchall_json():
+        cur.execute(f"SELECT id, user_email, amount, tokens_added, transaction_id, created_at FROM {BENCH_SCHEMA}.payment_transactions ORDER BY id")
+        data = [{'id': r[0], 'user_email': r[1], 'amount': r[2], 'tokens_added': r[3],
+                 'transaction_id': r[4], 'created_at': str(r[5])} for r in cur.fetchall()]
+        return len(json.dumps(data))
+
+    def chunked_export(export_format):
+        def run():
+            total, chunks, cursor = 0, 0, None
+            while True:
+                query = {'view': 'export', 'table': 'payments', 'format': export_format}
+                if cursor:
+                    query['cursor'] = cursor
+                response = admin.handler({'httpMethod': 'GET', 'queryStringParameters': query}, None)
+                total += len(response['body'])
+                chunks += 1
+                cursor = response['headers'].get('X-Export-Cursor')
+                if not cursor:
+                    return total, chunks
+        return run
+
+    size, elapsed, peak = measure(fetchall_json)
+    print(f"fetchall + json:  {elapsed:6.1f} s  peak={peak / 2**20:8.1f} MiB  body={size / 2**20:.0f} MiB in one response")
+    for export_format in ('csv', 'ndjson'):
+        (size, chunks), elapsed, peak = measure(chunked_export(export_format))
+        print(f"export {export_format:<7}    {elapsed:6.1f} s  peak={peak / 2**20:8.1f} MiB  body={size / 2**20:.0f} MiB in {chunks} chunks")
+
+    cur.execute(f"DROP SCHEMA {BENCH_SCHEMA} CASCADE")
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+'''
+Business: Compare the old all-users admin query against the paginated user list on a synthetic database
+Args: DATABASE_URL pointing at a scratch Postgres, optional user count (default 1,000,000)
+Returns: Prints the time of the old fan-out query and of first, deep, filtered and sorted pages
+
+Usage: DATABASE_URL=postgresql://localhost/postgres python benchmarks/admin_users.py [users]
+Everything is created in a throwaway schema, bench_admin_users, which is dropped
+at the end. Each user gets on average 2 orders and 3 chats.
+'''
+
+import os
+import statistics
+import sys
+import time
+
+import psycopg2
+
+from _handlers import load_handler
+
+BENCH_SCHEMA = 'bench_admin_users'
+RUNS = 5
+
+SETUP_SQL = f"""
+DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE;
+CREATE SCHEMA {BENCH_SCHEMA};
+SET search_path = {BENCH_SCHEMA};
+
+CREATE TABLE users (
+    id SERIAL PRIMARY KEY,
+    email VARCHAR(255) UNIQUE NOT NULL,
+    name VARCHAR(255),
+    role VARCHAR(50) DEFAULT 'customer',
+    credits INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    order_count INTEGER NOT NULL DEFAULT 0,
+    chat_count INTEGER NOT NULL DEFAULT 0,
+    activity INTEGER GENERATED ALWAYS AS (order_count + chat_count) STORED
+);
+CREATE TABLE orders (id SERIAL PRIMARY KEY, user_id INTEGER, status VARCHAR(50));
+CREATE TABLE chat_history (id SERIAL PRIMARY KEY, user_email VARCHAR(255));
+
+INSERT INTO users (email, name, role, credits, created_at)
+SELECT 'user' || g || '@example.com', 'User ' || g,
+       CASE WHEN g %% 1000 = 0 THEN 'director' ELSE 'customer' END,
+       (g::bigint * 7919 %% 5000)::int,
+       TIMESTAMP '2024-01-01' + (g * INTERVAL '30 seconds')
+FROM generate_series(1, %(users)s) g;
+
+INSERT INTO orders (user_id, status)
+SELECT 1 + (random() * (%(users)s - 1))::int, CASE WHEN random() < 0.05 THEN 'test' ELSE 'done' END
+FROM generate_series(1, %(users)s * 2);
+
+INSERT INTO chat_history (user_email)
+SELECT 'user' || (1 + (random() * (%(users)s - 1))::int) || '@example.com'
+FROM generate_series(1, %(users)s * 3);
+
+CREATE INDEX ON orders(user_id);
+CREATE INDEX ON chat_history(user_email);
+
+UPDATE users u SET order_count = o.n
+FROM (SELECT user_id, COUNT(*) AS n FROM orders WHERE status != 'test' GROUP BY user_id) o
+WHERE o.user_id = u.id;
+UPDATE users u SET chat_count = c.n
+FROM (SELECT user_email, COUNT(*) AS n FROM chat_history GROUP BY user_email) c
+WHERE c.user_email = u.email;
+
+CREATE INDEX ON users(created_at DESC, id DESC);
+CREATE INDEX ON users(credits DESC, id DESC);
+CREATE INDEX ON users(activity DESC, id DESC);
+CREATE INDEX ON users(email varchar_pattern_ops);
+CREATE INDEX ON users(role);
+ANALYZE;
+"""
+
+OLD_QUERY = """
+SELECT u.id, u.email, u.name, u.role, u.credits, u.created_at,
+       COUNT(DISTINCT o.id) as total_orders,
+       COUNT(DISTINCT ch.id) as total_chats
+FROM users u
+LEFT JOIN orders o ON u.id = o.user_id AND o.status != 'test'
+LEFT JOIN chat_history ch ON u.email = ch.user_email
+GROUP BY u.id, u.email, u.name, u.role, u.credits, u.created_at
+ORDER BY u.created_at DESC
+"""
+
+def timed(fn, runs: int = RUNS) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+def main() -> None:
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        sys.exit('DATABASE_URL is required')
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    cur = conn.cursor()
+    print(f"building {users:,} users...")
+    started = time.perf_counter()
+    cur.execute(SETUP_SQL, {'users': users})
+    print(f"setup took {time.perf_counter() - started:.1f} s")
+
+    admin = load_handler('admin')
+    admin.SCHEMA = BENCH_SCHEMA
+
+    def old_query():
+        cur.execute(OLD_QUERY)
+        rows = cur.fetchall()
+        return rows
+
+    def page(sort='created_at', order='desc', role=None, prefix=None, after=None):
+        return admin.list_users(cur, sort, order, role, prefix, after, admin.USER_PAGE_SIZE)
+
+    deep = page()
+    for _ in range(200):
+        deep = page(after=admin.decode_users_cursor(deep['next_cursor'], 'created_at', 'desc'))
+    deep_after = admin.decode_users_cursor(deep['next_cursor'], 'created_at', 'desc')
+
+    print(f"old all-users query:           {timed(old_query, 1) * 1000:10.1f} ms (one run)")
+    print(f"first page by created_at:      {timed(page) * 1000:10.2f} ms")
+    print(f"page 200 by created_at:        {timed(lambda: page(after=deep_after)) * 1000:10.2f} ms")
+    print(f"first page by credits:         {timed(lambda: page(sort='credits')) * 1000:10.2f} ms")
+    print(f"first page by activity:        {timed(lambda: page(sort='activity')) * 1000:10.2f} ms")
+    print(f"directors by activity:         {timed(lambda: page(sort='activity', role='director')) * 1000:10.2f} ms")
+    print(f"email prefix 'user12345':      {timed(lambda: page(prefix='user12345')) * 1000:10.2f} ms")
+
+    cur.execute(f"DROP SCHEMA {BENCH_SCHEMA} CASCADE")
+    conn.close()
+
+if __name__ == '__main__':
+    main()
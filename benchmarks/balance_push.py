@@ -0,0 +1,113 @@
+'''
+Business: Measure how fast long-polling clients of the credits function see a balance change
+Args: DATABASE_URL pointing at a migrated development database, optional waiting client count (default 50)
+      and number of balance changes (default 20)
+Returns: Prints wake-up latency from the committing write to the response, requests served,
+         LISTEN connections used, and what interval polling would need for the same latency
+
+Usage: DATABASE_URL=postgresql://localhost/postgres python benchmarks/balance_push.py [clients] [changes]
+Seeds bench-push@example.com and removes it afterwards. Every client is a thread in one process
+running the frontend's watch loop (GET ?since=<credits>, wait shortened to 2 s so the run ends
+quickly); the writer credits the account from its own connection like payment-webhook does.
+'''
+
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+import psycopg2
+
+from _handlers import load_handler
+
+EMAIL = 'bench-push@example.com'
+SCHEMA = 't_p55547046_creative_ai_hub'
+CHANGE_INTERVAL_SECONDS = 0.5
+
+def seed(dsn: str) -> None:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"INSERT INTO {SCHEMA}.users (email, name, credits) VALUES (%s, 'Bench', 0)", (EMAIL,))
+    conn.commit()
+    conn.close()
+
+def cleanup(dsn: str) -> None:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DELETE FROM {SCHEMA}.credit_ledger WHERE user_id IN (SELECT id FROM {SCHEMA}.users WHERE email = %s)", (EMAIL,))
+    cur.execute(f"DELETE FROM {SCHEMA}.users WHERE email = %s", (EMAIL,))
+    conn.commit()
+    conn.close()
+
+def main() -> None:
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        sys.exit('DATABASE_URL is required')
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    changes = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    cleanup(dsn)
+    seed(dsn)
+    credits_fn = load_handler('credits')
+    credits_fn.DB_POOL_SIZE = clients
+    committed_at = {}
+    latencies = []
+    requests = [0]
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def client() -> None:
+        since = 0
+        while not done.is_set():
+            response = credits_fn.handler({
+                'httpMethod': 'GET',
+                'queryStringParameters': {'email': EMAIL, 'since': str(since), 'wait': '2'},
+                'headers': {}
+            }, None)
+            received = time.perf_counter()
+            data = json.loads(response['body'])
+            with lock:
+                requests[0] += 1
+                if data['changed'] and data['credits'] in committed_at:
+                    latencies.append(received - committed_at[data['credits']])
+            since = data['credits']
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(1)
+
+    writer = psycopg2.connect(dsn)
+    writer.autocommit = True
+    cur = writer.cursor()
+    started = time.perf_counter()
+    for change in range(1, changes + 1):
+        # Taken before the write: a notification can reach the clients before execute() returns
+        committed_at[change] = time.perf_counter()
+        cur.execute(
+            f"SELECT {SCHEMA}.credit_post(id, 1, 'purchase', %s) FROM {SCHEMA}.users WHERE email = %s",
+            (f'bench-push-{change}', EMAIL)
+        )
+        time.sleep(CHANGE_INTERVAL_SECONDS)
+    elapsed = time.perf_counter() - started
+    cur.execute("SELECT COUNT(*) FROM pg_stat_activity WHERE query LIKE 'LISTEN%%'")
+    listeners = cur.fetchone()[0]
+    writer.close()
+    done.set()
+    for thread in threads:
+        thread.join()
+    cleanup(dsn)
+
+    p50 = statistics.median(latencies)
+    p99 = statistics.quantiles(latencies, n=100)[98]
+    print(f"{clients} waiting clients, {changes} balance changes over {elapsed:.1f}s")
+    print(f"  wake-ups {len(latencies)}/{clients * changes}  p50 {p50 * 1000:.1f} ms  p99 {p99 * 1000:.1f} ms  "
+          f"max {max(latencies) * 1000:.1f} ms")
+    print(f"  requests served {requests[0]}  LISTEN connections {listeners}")
+    print(f"  polling with the same p50 would need a {p50 * 2 * 1000:.0f} ms interval: "
+          f"{clients / (p50 * 2):.0f} requests/s instead of {requests[0] / elapsed:.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+'''
+Business: Compare the separate page-load requests against one profile bootstrap request
+Args: DATABASE_URL pointing at a migrated development database, optional iteration count
+Returns: Prints per-page-load latency and database connections opened for both modes
+
+Usage: DATABASE_URL=postgresql://localhost/postgres python benchmarks/bootstrap.py [iterations]
+Seeds bench-bootstrap@example.com with 100 orders and 120 chats and removes them
+afterwards. Every handler's connection pool is emptied before each page load, the
+way a cold function instance starts, so the numbers include connection setup but
+not the HTTP round trip and function start that each separate request also pays.
+'''
+
+import json
+import os
+import statistics
+import sys
+import time
+
+import psycopg2
+
+from _handlers import load_handler
+
+EMAIL = 'bench-bootstrap@example.com'
+SCHEMA = 't_p55547046_creative_ai_hub'
+
+def seed(dsn: str) -> None:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"INSERT INTO {SCHEMA}.users (email, name, credits) VALUES (%s, 'Bench', 100) RETURNING id", (EMAIL,))
+    user_id = cur.fetchone()[0]
+    cur.execute(
+        f"""INSERT INTO {SCHEMA}.orders (user_id, service_id, service_name, plan, price, input_text, ai_result, status)
+            SELECT %s, 1, 'Биография', 'basic', 2, 'запрос ' || g, repeat('результат ', 40), 'completed'
+            FROM generate_series(1, 100) g""",
+        (user_id,)
+    )
+    cur.execute(
+        f"""INSERT INTO {SCHEMA}.chat_history (user_email, chat_id, chat_title, service_id, service_name, messages)
+            SELECT %s, 'bench-bootstrap-' || g, 'Чат ' || g, 0, 'Чат', '[]'
+            FROM generate_series(1, 120) g""",
+        (EMAIL,)
+    )
+    conn.commit()
+    conn.close()
+
+def cleanup(dsn: str) -> None:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DELETE FROM {SCHEMA}.chat_history WHERE user_email = %s", (EMAIL,))
+    cur.execute(f"DELETE FROM {SCHEMA}.orders WHERE user_id IN (SELECT id FROM {SCHEMA}.users WHERE email = %s)", (EMAIL,))
+    cur.execute(f"DELETE FROM {SCHEMA}.users WHERE email = %s", (EMAIL,))
+    conn.commit()
+    conn.close()
+
+def request(module, query=None, headers=None) -> dict:
+    module._db_pool.clear()
+    response = module.handler({'httpMethod': 'GET', 'queryStringParameters': query or {}, 'headers': headers or {}}, None)
+    assert response['statusCode'] == 200, response
+    return json.loads(response['body'])
+
+def main() -> None:
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        sys.exit('DATABASE_URL is required')
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    credits = load_handler('credits')
+    orders = load_handler('orders')
+    history = load_handler('get-user-history')
+    chats = load_handler('chat-history')
+    profile = load_handler('profile')
+
+    pages = {
+        'dashboard': (
+            [(credits, {'email': EMAIL}, None), (orders, {'email': EMAIL}, None)],
+            {'email': EMAIL, 'sections': 'orders'},
+        ),
+        'chat': (
+            [(credits, {'email': EMAIL}, None), (chats, {}, {'X-User-Email': EMAIL})],
+            {'email': EMAIL, 'sections': 'chats'},
+        ),
+        'everything': (
+            [(credits, {'email': EMAIL}, None), (orders, {'email': EMAIL}, None),
+             (history, {'email': EMAIL}, None), (chats, {}, {'X-User-Email': EMAIL})],
+            {'email': EMAIL, 'sections': 'orders,history,chats'},
+        ),
+    }
+
+    seed(dsn)
+    try:
+        for page, (separate, sections) in pages.items():
+            separate_timings, bootstrap_timings = [], []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                for module, query, headers in separate:
+                    request(module, query, headers)
+                separate_timings.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                request(profile, sections)
+                bootstrap_timings.append(time.perf_counter() - started)
+            print(f"{page:<11} separate: {len(separate)} requests, {len(separate)} connections, "
+                  f"p50={statistics.median(separate_timings) * 1000:7.2f} ms   "
+                  f"bootstrap: 1 request, 1 connection, p50={statistics.median(bootstrap_timings) * 1000:7.2f} ms")
+    finally:
+        cleanup(dsn)
+
+if __name__ == '__main__':
+    main()
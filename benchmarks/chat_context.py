@@ -0,0 +1,68 @@
+'''
+Business: Show simple-chat request size flattening out with the token-budgeted context window
+Args: optional number of turns (default 200)
+Returns: Prints payload bytes, estimated prompt tokens and build time per turn, full history vs window
+
+Usage: python benchmarks/chat_context.py [turns]
+
+The summarizer is replaced with a fixed-size stand-in, so the numbers show what
+simple-chat sends to YandexGPT, not model quality. Model-side latency grows with
+prompt tokens, so the token column is the proxy for completion latency.
+'''
+
+import json
+import sys
+import time
+
+from _handlers import load_handler
+
+USER_TEXT = 'Расскажи подробнее, как это работает и что учесть на практике? ' * 4
+REPLY_TEXT = 'Вот развёрнутый ответ с примерами, шагами и пояснениями по каждому пункту. ' * 20
+SUMMARY_TEXT = 'Сводка: пользователь изучает тему, получил пошаговые объяснения и примеры. ' * 12
+
+def build_payload(summary, window) -> str:
+    messages = [{'role': 'system', 'text': 'system prompt'}]
+    if summary:
+        messages.append({'role': 'system', 'text': summary})
+    messages.extend({'role': msg['role'], 'text': msg['content']} for msg in window)
+    return json.dumps({'messages': messages}, ensure_ascii=False)
+
+def main() -> None:
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    chat = load_handler('simple-chat')
+
+    history = []
+    unsummarized = []
+    summary = None
+    refreshes = 0
+    print(f"{'turn':>5} {'full bytes':>11} {'full tok':>9} {'win bytes':>10} {'win tok':>8} {'win ms':>7} {'refreshes':>9}")
+    for turn in range(1, turns + 1):
+        user_message = {'seq': 2 * turn - 1, 'role': 'user', 'content': USER_TEXT}
+        history.append(user_message)
+        unsummarized.append(user_message)
+
+        full_payload = build_payload(None, history)
+
+        started = time.perf_counter()
+        folded, window = chat.fit_context_window(unsummarized)
+        if folded:
+            summary = SUMMARY_TEXT
+            refreshes += 1
+            unsummarized = window
+        window_payload = build_payload(summary, window)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if turn in (1, 10, 25, 50, 100, 150, 200) or turn == turns:
+            full_tokens = sum(chat.estimate_tokens(msg['content']) for msg in history)
+            window_tokens = sum(chat.estimate_tokens(msg['content']) for msg in window)
+            if summary:
+                window_tokens += chat.estimate_tokens(summary)
+            print(f"{turn:>5} {len(full_payload.encode()):>11} {full_tokens:>9} "
+                  f"{len(window_payload.encode()):>10} {window_tokens:>8} {elapsed_ms:>7.3f} {refreshes:>9}")
+
+        reply = {'seq': 2 * turn, 'role': 'assistant', 'content': REPLY_TEXT}
+        history.append(reply)
+        unsummarized.append(reply)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+'''
+Business: Benchmark chat-history full-text search on a synthetic message corpus
+Args: DATABASE_URL pointing at a scratch Postgres, optional message count (default 10,000,000)
+Returns: Prints build time, index size and search latency for rare, common and phrase queries
+
+Usage: DATABASE_URL=postgresql://localhost/postgres python benchmarks/chat_search.py [messages]
+The corpus is generated in a throwaway schema, bench_chat_search, which is dropped
+at the end: one user per 1,000 messages, 50-message chats, 12 words per message, words drawn
+with a Zipf-like skew from a 5,000-word vocabulary that is half Cyrillic and
+half Latin. The handler's own search_chats() runs against it via a cursor that
+rewrites the schema name.
+'''
+
+import os
+import statistics
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from _handlers import load_handler
+
+BENCH_SCHEMA = 'bench_chat_search'
+APP_SCHEMA = 't_p55547046_creative_ai_hub'
+MESSAGES_PER_USER = 1000
+MESSAGES_PER_CHAT = 50
+RUNS = 20
+
+SETUP_SQL = f"""
+DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE;
+CREATE SCHEMA {BENCH_SCHEMA};
+
+CREATE TABLE {BENCH_SCHEMA}.chat_history (
+    id SERIAL PRIMARY KEY,
+    user_email VARCHAR(255) NOT NULL,
+    chat_id VARCHAR(100) UNIQUE NOT NULL,
+    chat_title VARCHAR(500) NOT NULL,
+    service_name VARCHAR(200) NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE {BENCH_SCHEMA}.chat_messages (
+    chat_id VARCHAR(100) NOT NULL,
+    seq INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    search_vector tsvector GENERATED ALWAYS AS (to_tsvector('russian', content)) STORED,
+    PRIMARY KEY (chat_id, seq)
+);
+
+CREATE TABLE {BENCH_SCHEMA}.vocab AS
+SELECT i, CASE WHEN i %% 2 = 0
+               THEN translate(substr(md5(i::text), 1, 4 + i %% 5), '0123456789abcdef', 'абвгдежзиклмнопр')
+               ELSE translate(substr(md5(i::text), 1, 4 + i %% 5), '0123456789abcdef', 'abcdefghijklmnop')
+          END AS word
+FROM generate_series(1, 5000) i;
+
+INSERT INTO {BENCH_SCHEMA}.chat_history (user_email, chat_id, chat_title, service_name)
+SELECT 'user' || (c %% %(users)s) || '@example.com', 'chat' || c, 'Chat ' || c, 'Чат'
+FROM generate_series(1, %(chats)s) c;
+"""
+
+MESSAGES_SQL = f"""
+INSERT INTO {BENCH_SCHEMA}.chat_messages (chat_id, seq, content)
+SELECT 'chat' || c, s,
+       (SELECT string_agg(words[least(5000, floor(power(5000, random() + 0 * w + 0 * s))::int)], ' ')
+        FROM generate_series(1, 12) w)
+FROM (SELECT array_agg(word ORDER BY i) AS words FROM {BENCH_SCHEMA}.vocab) v,
+     generate_series(%(first)s, %(last)s) c, generate_series(1, {MESSAGES_PER_CHAT}) s
+"""
+
+INDEX_SQL = f"""
+CREATE INDEX ON {BENCH_SCHEMA}.chat_history(user_email);
+CREATE INDEX idx_bench_chat_messages_search ON {BENCH_SCHEMA}.chat_messages USING GIN (search_vector);
+ANALYZE {BENCH_SCHEMA}.chat_history;
+ANALYZE {BENCH_SCHEMA}.chat_messages;
+"""
+
+class SchemaCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, params=None):
+        return self._cursor.execute(query.replace(APP_SCHEMA + '.', BENCH_SCHEMA + '.'), params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+def main() -> None:
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        sys.exit('DATABASE_URL is required')
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    chats = max(1, messages // MESSAGES_PER_CHAT)
+    users = max(1, messages // MESSAGES_PER_USER)
+
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    cur = conn.cursor()
+    print(f"generating {chats * MESSAGES_PER_CHAT:,} messages in {chats:,} chats...")
+    started = time.perf_counter()
+    cur.execute(SETUP_SQL, {'chats': chats, 'users': users})
+    batch = 20000
+    for first in range(1, chats + 1, batch):
+        cur.execute(MESSAGES_SQL, {'first': first, 'last': min(chats, first + batch - 1)})
+    print(f"data + tsvectors: {time.perf_counter() - started:7.1f} s")
+    started = time.perf_counter()
+    cur.execute(INDEX_SQL)
+    cur.execute(f"SELECT pg_size_pretty(pg_relation_size('{BENCH_SCHEMA}.idx_bench_chat_messages_search'))")
+    print(f"GIN index build:  {time.perf_counter() - started:7.1f} s, size {cur.fetchone()[0]}")
+
+    cur.execute(f"SELECT word FROM {BENCH_SCHEMA}.vocab WHERE i IN (1, 2, 60, 61, 4000, 4001) ORDER BY i")
+    words = [row[0] for row in cur.fetchall()]
+
+    history = load_handler('chat-history')
+    search_cur = SchemaCursor(conn.cursor(cursor_factory=RealDictCursor))
+    queries = [
+        ('most common word', words[0]),
+        ('common word', words[2]),
+        ('rare word', words[4]),
+        ('two words', f"{words[2]} {words[3]}"),
+        ('phrase', f'"{words[0]} {words[1]}"'),
+    ]
+    for label, query in queries:
+        timings = []
+        for run in range(RUNS):
+            user_email = f"user{(run * 7919) % users}@example.com"
+            started = time.perf_counter()
+            result = history.search_chats(search_cur, user_email, query, history.SEARCH_LIMIT)
+            timings.append(time.perf_counter() - started)
+        print(f"{label:<17} {query!r:<24} p50={statistics.median(timings) * 1000:8.2f} ms  "
+              f"max={max(timings) * 1000:8.2f} ms  results={len(result['results'])}")
+
+    cur.execute(f"DROP SCHEMA {BENCH_SCHEMA} CASCADE")
+    conn.close()
+
+if __name__ == '__main__':
+    main()
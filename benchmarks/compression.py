@@ -0,0 +1,122 @@
+'''
+Business: Measure response compression on representative large JSON and CSV bodies
+Args: none (payloads are generated offline); brotli rows need the Brotli package installed
+Returns: Prints body size, compression time and transfer estimate per encoding and level
+
+Usage: python benchmarks/compression.py
+Payloads mirror the shapes the handlers return: a 200-message chat from chat-history,
+a profile bootstrap with 100 orders and 50 chats, an orders list with full results
+and a 3 MB admin CSV export chunk. Text is drawn from the Russian and English words
+of the ai-genius prompt dictionary in random order, which compresses worse than real
+prose, so the savings below are a lower bound. The last column is the full
+compress_response() path (choose encoding, compress, base64) from chat-history.
+Brotli 11 is left out: it takes seconds per body, too slow for dynamic responses.
+'''
+
+import csv
+import gzip
+import io
+import json
+import random
+import statistics
+import time
+
+from _handlers import load_handler
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RUNS = 10
+LINK_MBIT = 10
+
+def word_pool() -> list:
+    genius = load_handler('ai-genius')
+    words = set()
+    for ru, en in genius.RU_TO_EN.items():
+        words.update(ru.split())
+        words.update(en.split())
+    return sorted(words)
+
+def sentence(rng: random.Random, words: list, length: int) -> str:
+    return ' '.join(rng.choice(words) for _ in range(length)).capitalize() + '.'
+
+def text(rng: random.Random, words: list, chars: int) -> str:
+    parts = []
+    while sum(len(p) + 1 for p in parts) < chars:
+        parts.append(sentence(rng, words, rng.randint(6, 18)))
+    return ' '.join(parts)
+
+def build_payloads() -> list:
+    rng = random.Random(7)
+    words = word_pool()
+    chat = {'success': True, 'chat': {
+        'id': 1, 'chat_id': '1718000000000', 'chat_title': 'Бизнес-план кофейни', 'service_id': 0,
+        'service_name': 'Чат', 'message_count': 200,
+        'created_at': '2026-09-01T10:00:00', 'updated_at': '2026-10-01T10:00:00',
+        'messages': [{'role': 'user' if i % 2 == 0 else 'assistant',
+                      'content': text(rng, words, 200 if i % 2 == 0 else 1500)} for i in range(200)]
+    }}
+    orders = [{'id': i, 'service_id': 1 + i % 30, 'service_name': 'Биография', 'plan': 'basic', 'price': 2,
+               'input_text': text(rng, words, 150), 'result': None, 'ai_result': text(rng, words, 2000),
+               'status': 'completed', 'created_at': f'2026-09-{1 + i % 28:02d} 12:00:00.000000'} for i in range(100)]
+    bootstrap = {
+        'user': {'id': 1, 'email': 'user@example.com', 'name': 'User', 'credits': 40, 'role': 'customer',
+                 'balance': 0, 'created_at': '2026-01-01 00:00:00'},
+        'orders': orders, 'total_orders': len(orders),
+        'chats': {'chats': [{'id': i, 'chat_id': str(1718000000000 + i), 'chat_title': text(rng, words, 40),
+                             'service_name': 'Чат', 'updated_at': '2026-10-01T10:00:00'} for i in range(50)],
+                  'next_cursor': None, 'sync_token': '2026-10-01T10:00:00'},
+    }
+    export = io.StringIO()
+    writer = csv.writer(export)
+    writer.writerow(['id', 'user_id', 'service_id', 'service_name', 'plan', 'price', 'status', 'created_at'])
+    row_id = 0
+    while export.tell() < 3_000_000:
+        row_id += 1
+        writer.writerow([row_id, rng.randint(1, 100000), rng.randint(0, 32), rng.choice(words), 'basic',
+                         rng.choice([1, 2, 3, 5]), rng.choice(['completed', 'processing']),
+                         f'2026-{rng.randint(1, 9):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00:00'])
+    return [
+        ('chat-history chat', json.dumps(chat, ensure_ascii=False)),
+        ('profile bootstrap', json.dumps(bootstrap, ensure_ascii=False)),
+        ('orders list', json.dumps({'orders': orders})),
+        ('admin export chunk', export.getvalue()),
+    ]
+
+def timed(fn, raw: bytes):
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        out = fn(raw)
+        timings.append(time.perf_counter() - started)
+    return out, statistics.median(timings)
+
+def main() -> None:
+    history = load_handler('chat-history')
+    codecs = [
+        ('gzip 1', lambda raw: gzip.compress(raw, compresslevel=1, mtime=0)),
+        ('gzip 6', lambda raw: gzip.compress(raw, compresslevel=6, mtime=0)),
+        ('gzip 9', lambda raw: gzip.compress(raw, compresslevel=9, mtime=0)),
+    ]
+    if brotli:
+        codecs += [(f'br {q}', lambda raw, q=q: brotli.compress(raw, quality=q)) for q in (4, 5, 7)]
+    accept = 'gzip, deflate, br' if brotli else 'gzip, deflate'
+    transfer_ms = lambda size: size * 8 / (LINK_MBIT * 1_000_000) * 1000
+
+    for label, body in build_payloads():
+        raw = body.encode('utf-8')
+        print(f"{label}: {len(raw) / 1024:.0f} KiB raw, {transfer_ms(len(raw)):.0f} ms at {LINK_MBIT} Mbit/s")
+        for name, fn in codecs:
+            out, seconds = timed(fn, raw)
+            print(f"  {name:<7} {len(out) / 1024:7.0f} KiB  {len(out) / len(raw) * 100:5.1f}%  "
+                  f"compress {seconds * 1000:7.2f} ms  transfer {transfer_ms(len(out)):6.0f} ms")
+        response = {'statusCode': 200, 'headers': {'Content-Type': 'application/json'}, 'body': body, 'isBase64Encoded': False}
+        event = {'headers': {'Accept-Encoding': accept}}
+        result, seconds = timed(lambda _: history.compress_response(event, response), raw)
+        print(f"  compress_response ({result['headers']['Content-Encoding']}): {seconds * 1000:.2f} ms, "
+              f"base64 body {len(result['body']) / 1024:.0f} KiB between function and gateway")
+
+if __name__ == '__main__':
+    main()
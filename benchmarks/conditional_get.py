@@ -0,0 +1,96 @@
+'''
+Business: Measure what If-None-Match saves on the read-heavy user endpoints
+Args: DATABASE_URL pointing at a migrated development database, optional message count (default 400)
+Returns: Prints latency and body size of a full 200 response and of a 304 revalidation
+
+Usage: DATABASE_URL=postgresql://localhost/postgres python benchmarks/conditional_get.py [messages]
+Seeds bench-etag@example.com with one long chat and 100 completed orders and
+removes them afterwards. Both modes run on a warm connection pool.
+'''
+
+import os
+import statistics
+import sys
+import time
+
+import psycopg2
+
+from _handlers import load_handler
+
+EMAIL = 'bench-etag@example.com'
+CHAT_ID = 'bench-etag-chat'
+SCHEMA = 't_p55547046_creative_ai_hub'
+RUNS = 50
+
+def seed(dsn: str, messages: int) -> None:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"INSERT INTO {SCHEMA}.users (email, name, credits) VALUES (%s, 'Bench', 100) RETURNING id", (EMAIL,))
+    user_id = cur.fetchone()[0]
+    cur.execute(
+        f"""INSERT INTO {SCHEMA}.orders (user_id, service_id, service_name, plan, price, input_text, ai_result, status)
+            SELECT %s, 1, 'Биография', 'basic', 2, 'запрос ' || g, repeat('результат ', 150), 'completed'
+            FROM generate_series(1, 100) g""",
+        (user_id,)
+    )
+    cur.execute(
+        f"""INSERT INTO {SCHEMA}.chat_history (user_email, chat_id, chat_title, service_id, service_name, message_count)
+            VALUES (%s, %s, 'Длинный чат', 0, 'Чат', %s)""",
+        (EMAIL, CHAT_ID, messages)
+    )
+    cur.execute(
+        f"""INSERT INTO {SCHEMA}.chat_messages (chat_id, seq, role, content)
+            SELECT %s, g, CASE WHEN g %% 2 = 1 THEN 'user' ELSE 'assistant' END, repeat('Ответ модели. ', 100)
+            FROM generate_series(1, %s) g""",
+        (CHAT_ID, messages)
+    )
+    conn.commit()
+    conn.close()
+
+def cleanup(dsn: str) -> None:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DELETE FROM {SCHEMA}.chat_messages WHERE chat_id = %s", (CHAT_ID,))
+    cur.execute(f"DELETE FROM {SCHEMA}.chat_history WHERE user_email = %s", (EMAIL,))
+    cur.execute(f"DELETE FROM {SCHEMA}.chat_history_tombstones WHERE user_email = %s", (EMAIL,))
+    cur.execute(f"DELETE FROM {SCHEMA}.orders WHERE user_id IN (SELECT id FROM {SCHEMA}.users WHERE email = %s)", (EMAIL,))
+    cur.execute(f"DELETE FROM {SCHEMA}.users WHERE email = %s", (EMAIL,))
+    conn.commit()
+    conn.close()
+
+def measure(module, query: dict, headers: dict):
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        response = module.handler({'httpMethod': 'GET', 'queryStringParameters': query, 'headers': headers}, None)
+        timings.append(time.perf_counter() - started)
+    return response, statistics.median(timings)
+
+def main() -> None:
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        sys.exit('DATABASE_URL is required')
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+
+    endpoints = [
+        ('chat-history (chat)', load_handler('chat-history'), {'chat_id': CHAT_ID}, {'X-User-Email': EMAIL}),
+        ('profile', load_handler('profile'), {'email': EMAIL}, {}),
+        ('profile bootstrap', load_handler('profile'), {'email': EMAIL, 'sections': 'orders,history,chats'}, {}),
+        ('orders', load_handler('orders'), {'email': EMAIL}, {}),
+        ('get-user-history', load_handler('get-user-history'), {'email': EMAIL}, {}),
+    ]
+
+    seed(dsn, messages)
+    try:
+        for label, module, query, headers in endpoints:
+            full, full_time = measure(module, query, headers)
+            assert full['statusCode'] == 200, full
+            revalidated, revalidated_time = measure(module, query, {**headers, 'If-None-Match': full['headers']['ETag']})
+            assert revalidated['statusCode'] == 304, revalidated
+            print(f"{label:<20} 200: {len(full['body'].encode()) / 1024:8.1f} KiB {full_time * 1000:7.2f} ms   "
+                  f"304: {len(revalidated['body'])} B {revalidated_time * 1000:6.2f} ms")
+    finally:
+        cleanup(dsn)
+
+if __name__ == '__main__':
+    main()
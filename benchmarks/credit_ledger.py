@@ -0,0 +1,152 @@
+'''
+Business: Hammer one account from many workers and compare the billing schemes
+Args: DATABASE_URL pointing at a migrated development database, optional worker count (default 16)
+      and attempts per worker (default 50)
+Returns: Prints granted generations, final balance, overdraw and throughput per scheme,
+         and checks that the ledger still adds up to the balance
+
+Usage: DATABASE_URL=postgresql://localhost/postgres python benchmarks/credit_ledger.py [workers] [attempts]
+Seeds bench-ledger@example.com with a balance that covers a quarter of the attempts and
+removes it afterwards. Every worker has its own connection; the model call is a short sleep.
+Schemes:
+  check-then-deduct   the old ai-genius flow: read balance, generate, unconditional debit
+  lock-across-call    the old simple-chat flow: conditional debit held open until the reply
+  reserve/commit      credit_reserve, commit, generate, credit_commit (every tenth call fails and is released)
+'''
+
+import os
+import statistics
+import sys
+import threading
+import time
+
+import psycopg2
+
+EMAIL = 'bench-ledger@example.com'
+SCHEMA = 't_p55547046_creative_ai_hub'
+COST = 1
+GENERATION_SECONDS = 0.005
+HOLD_TTL_SECONDS = 600
+
+def seed(dsn: str, balance: int) -> int:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"INSERT INTO {SCHEMA}.users (email, name, credits) VALUES (%s, 'Bench', %s) RETURNING id", (EMAIL, balance))
+    user_id = cur.fetchone()[0]
+    conn.commit()
+    conn.close()
+    return user_id
+
+def cleanup(dsn: str) -> None:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"DELETE FROM {SCHEMA}.credit_ledger WHERE user_id IN (SELECT id FROM {SCHEMA}.users WHERE email = %s)", (EMAIL,))
+    cur.execute(f"DELETE FROM {SCHEMA}.users WHERE email = %s", (EMAIL,))
+    conn.commit()
+    conn.close()
+
+def check_then_deduct(cur, user_id: int, attempt: int) -> bool:
+    cur.execute(f"SELECT credits FROM {SCHEMA}.users WHERE id = %s", (user_id,))
+    credits = cur.fetchone()[0]
+    cur.connection.commit()
+    if credits < COST:
+        return False
+    time.sleep(GENERATION_SECONDS)
+    cur.execute(f"UPDATE {SCHEMA}.users SET credits = credits - %s WHERE id = %s", (COST, user_id))
+    cur.connection.commit()
+    return True
+
+def lock_across_call(cur, user_id: int, attempt: int) -> bool:
+    cur.execute(f"UPDATE {SCHEMA}.users SET credits = credits - %s WHERE id = %s AND credits >= %s", (COST, user_id, COST))
+    if cur.rowcount == 0:
+        cur.connection.rollback()
+        return False
+    time.sleep(GENERATION_SECONDS)
+    cur.connection.commit()
+    return True
+
+def reserve_commit(cur, user_id: int, attempt: int) -> bool:
+    cur.execute(f"SELECT {SCHEMA}.credit_reserve(%s, %s, 'generation', 'bench', %s)", (user_id, COST, HOLD_TTL_SECONDS))
+    hold_id = cur.fetchone()[0]
+    cur.connection.commit()
+    if hold_id is None:
+        return False
+    time.sleep(GENERATION_SECONDS)
+    failed = attempt % 10 == 9
+    cur.execute(f"SELECT {SCHEMA}.credit_{'release' if failed else 'commit'}(%s)", (hold_id,))
+    cur.connection.commit()
+    return not failed
+
+def run(dsn: str, scheme, workers: int, attempts: int, balance: int) -> None:
+    cleanup(dsn)
+    user_id = seed(dsn, balance)
+    granted = []
+    timings = []
+    lock = threading.Lock()
+    start = threading.Barrier(workers + 1)
+
+    def worker() -> None:
+        conn = psycopg2.connect(dsn)
+        cur = conn.cursor()
+        local_granted = 0
+        local_timings = []
+        start.wait()
+        for attempt in range(attempts):
+            started = time.perf_counter()
+            if scheme(cur, user_id, attempt):
+                local_granted += 1
+            local_timings.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            granted.append(local_granted)
+            timings.extend(local_timings)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(
+        f"""SELECT u.credits, u.credits_held,
+                   COALESCE(SUM(l.amount) FILTER (WHERE l.status = 'posted'), 0),
+                   COUNT(l.id) FILTER (WHERE l.status = 'held')
+            FROM {SCHEMA}.users u LEFT JOIN {SCHEMA}.credit_ledger l ON l.user_id = u.id
+            WHERE u.id = %s GROUP BY u.id""",
+        (user_id,)
+    )
+    credits, held, posted, open_holds = cur.fetchone()
+    conn.close()
+
+    total = sum(granted)
+    overdraw = max(0, total * COST - balance)
+    ledger = 'n/a (bypasses ledger)'
+    if scheme is reserve_commit:
+        ledger = 'ok' if credits + held == posted and held == 0 and open_holds == 0 else f'MISMATCH posted={posted} held={held}'
+    print(f"{scheme.__name__:<18} granted={total:>4}/{balance:<4} balance={credits:>5} overdraw={overdraw:>4} "
+          f"{workers * attempts / elapsed:>7.0f} attempts/s  p50={statistics.median(timings) * 1000:.2f}ms  "
+          f"p99={statistics.quantiles(timings, n=100)[98] * 1000:.2f}ms  ledger={ledger}")
+
+def main() -> None:
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        sys.exit('DATABASE_URL is required')
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    attempts = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    balance = workers * attempts // 4
+
+    print(f"{workers} workers x {attempts} attempts against one account with {balance} credits, "
+          f"cost {COST}, generation {GENERATION_SECONDS * 1000:.0f}ms")
+    try:
+        for scheme in (check_then_deduct, lock_across_call, reserve_commit):
+            run(dsn, scheme, workers, attempts, balance)
+    finally:
+        cleanup(dsn)
+
+if __name__ == '__main__':
+    main()
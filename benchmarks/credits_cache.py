@@ -0,0 +1,126 @@
+'''
+Business: Replay the frontend's balance traffic against the credits function with and without its cache
+Args: DATABASE_URL pointing at a migrated development database, optional event count (default 5000)
+      and user count (default 200)
+Returns: Prints GET count, cache hit rate, balance queries sent to the database, stale reads and GET latency
+
+Usage: DATABASE_URL=postgresql://localhost/postgres python benchmarks/credits_cache.py [events] [users]
+Seeds bench-credits-N@example.com users and removes them afterwards. The profile follows the call sites:
+  chat turn (60%)   GET before send, a debit from another process (simple-chat), GET after the reply
+  page load (35%)   GET from Index, Credits or UserDashboard
+  top-up (5%)       credits POST in this process, then GET
+Users are picked with a skewed distribution so a few are very active. A GET counts as stale when
+it differs from the committed balance read right after it.
+'''
+
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import psycopg2
+
+from _handlers import load_handler
+
+EMAIL_PATTERN = 'bench-credits-%s@example.com'
+SCHEMA = 't_p55547046_creative_ai_hub'
+CLIENT_GAP_SECONDS = 0.001
+
+def seed(dsn: str, users: int) -> None:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(
+        f"""INSERT INTO {SCHEMA}.users (email, name, credits)
+            SELECT replace(%s, '%%s', g::text), 'Bench', 100000 FROM generate_series(1, %s) g""",
+        (EMAIL_PATTERN, users)
+    )
+    conn.commit()
+    conn.close()
+
+def cleanup(dsn: str) -> None:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    pattern = EMAIL_PATTERN.replace('%s', '%')
+    cur.execute(f"DELETE FROM {SCHEMA}.credit_ledger WHERE user_id IN (SELECT id FROM {SCHEMA}.users WHERE email LIKE %s)", (pattern,))
+    cur.execute(f"DELETE FROM {SCHEMA}.users WHERE email LIKE %s", (pattern,))
+    conn.commit()
+    conn.close()
+
+def build_profile(events: int, users: int):
+    rng = random.Random(42)
+    weights = [1 / rank for rank in range(1, users + 1)]
+    emails = rng.choices([EMAIL_PATTERN % n for n in range(1, users + 1)], weights=weights, k=events)
+    kinds = rng.choices(['chat', 'page', 'topup'], weights=[60, 35, 5], k=events)
+    return list(zip(kinds, emails))
+
+def replay(module, dsn: str, profile) -> int:
+    other_process = psycopg2.connect(dsn)
+    other_process.autocommit = True
+    debit = other_process.cursor()
+    truth = psycopg2.connect(dsn)
+    truth.autocommit = True
+    check = truth.cursor()
+    timings = []
+    stale = 0
+
+    def get(email: str) -> None:
+        nonlocal stale
+        started = time.perf_counter()
+        response = module.handler({'httpMethod': 'GET', 'queryStringParameters': {'email': email}, 'headers': {}}, None)
+        timings.append(time.perf_counter() - started)
+        check.execute(f"SELECT credits FROM {SCHEMA}.users WHERE email = %s", (email,))
+        if json.loads(response['body'])['credits'] != check.fetchone()[0]:
+            stale += 1
+
+    for kind, email in profile:
+        if kind == 'chat':
+            get(email)
+            debit.execute(
+                f"""SELECT {SCHEMA}.credit_commit({SCHEMA}.credit_reserve(id, 1, 'chat', 'bench', 600))
+                    FROM {SCHEMA}.users WHERE email = %s""",
+                (email,)
+            )
+            time.sleep(CLIENT_GAP_SECONDS)
+            get(email)
+        elif kind == 'page':
+            get(email)
+        else:
+            module.handler({'httpMethod': 'POST', 'body': json.dumps({'email': email, 'amount': 10}), 'headers': {}}, None)
+            get(email)
+    other_process.close()
+    truth.close()
+
+    stats = module._balance_cache_stats
+    gets = len(timings)
+    queries = stats['misses'] + stats['bypassed']
+    print(f"  GETs {gets}  hits {stats['hits']} ({stats['hits'] / gets:.1%})  balance queries {queries}  "
+          f"invalidations {stats['invalidations']}  stale {stale}  "
+          f"p50 {statistics.median(timings) * 1000:.3f} ms  mean {statistics.mean(timings) * 1000:.3f} ms")
+    return queries
+
+def main() -> None:
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        sys.exit('DATABASE_URL is required')
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    profile = build_profile(events, users)
+
+    cleanup(dsn)
+    seed(dsn, users)
+    try:
+        print('no cache (BALANCE_CACHE_TTL_SECONDS=0)')
+        uncached = load_handler('credits')
+        uncached.BALANCE_CACHE_TTL_SECONDS = 0
+        baseline = replay(uncached, dsn, profile)
+
+        print('read-through cache with NOTIFY invalidation')
+        cached = replay(load_handler('credits'), dsn, profile)
+        print(f"balance queries reduced by {1 - cached / baseline:.1%}")
+    finally:
+        cleanup(dsn)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+'''
+Business: Compare a fresh psycopg2.connect per request against the per-process pool
+Args: DATABASE_URL pointing at a local Postgres, optional iteration count
+Returns: Prints per-request latency for both modes
+
+Usage: DATABASE_URL=postgresql://localhost/postgres python benchmarks/db_pool.py [iterations]
+'''
+
+import os
+import statistics
+import sys
+import time
+
+import psycopg2
+
+from _handlers import load_handler
+
+QUERY = "SELECT 1"
+
+def run_direct(dsn: str, iterations: int) -> list:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        conn = psycopg2.connect(dsn)
+        cur = conn.cursor()
+        cur.execute(QUERY)
+        cur.fetchone()
+        cur.close()
+        conn.close()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+def run_pooled(credits, iterations: int) -> list:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        conn = credits.get_db_connection()
+        cur = conn.cursor()
+        cur.execute(QUERY)
+        cur.fetchone()
+        cur.close()
+        credits.release_db_connection(conn)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+def report(label: str, timings: list) -> None:
+    ordered = sorted(timings)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(f"{label:<10} mean={statistics.mean(timings) * 1000:8.3f} ms  "
+          f"p50={statistics.median(timings) * 1000:8.3f} ms  p95={p95 * 1000:8.3f} ms")
+
+def main() -> None:
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        sys.exit('DATABASE_URL is required')
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    credits = load_handler('credits')
+    report('direct', run_direct(dsn, iterations))
+    report('pooled', run_pooled(credits, iterations))
+
+if __name__ == '__main__':
+    main()
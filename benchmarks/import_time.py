@@ -0,0 +1,76 @@
+'''
+Business: Report cold-start import time of every backend handler module
+Args: optional function names to limit the report (default: all functions in backend/)
+Returns: Prints, per handler, the median time to load index.py and its slowest top-level imports
+
+Usage: python benchmarks/import_time.py [function ...]
+Each handler is loaded in a fresh interpreter with `python -X importtime`,
+the same way a new function instance would load it, and the run is repeated
+to take the median. Compare the output before and after a change to catch
+cold-start regressions.
+'''
+
+import os
+import statistics
+import subprocess
+import sys
+
+from _handlers import BACKEND_DIR
+
+RUNS = 5
+TOP_IMPORTS = 4
+MARKER = '--- handler import ---'
+
+LOAD_SNIPPET = '''
+import importlib.util, sys, time
+sys.path.insert(0, {function_dir!r})
+spec = importlib.util.spec_from_file_location('index', {index_path!r})
+module = importlib.util.module_from_spec(spec)
+print({marker!r}, file=sys.stderr, flush=True)
+started = time.perf_counter()
+spec.loader.exec_module(module)
+print(int((time.perf_counter() - started) * 1e6))
+'''
+
+def top_level_imports(stderr: str) -> dict:
+    # Строки -X importtime: "import time: self [us] | cumulative | imported package";
+    # вложенность обозначена отступом имени модуля, верхний уровень — без отступа
+    imports = {}
+    lines = stderr.split(MARKER, 1)[-1].splitlines()
+    for line in lines:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.startswith(' ') and not name.startswith('  '):
+            imports[name.strip()] = int(cumulative)
+    return imports
+
+def measure(function_name: str):
+    function_dir = os.path.join(BACKEND_DIR, function_name)
+    snippet = LOAD_SNIPPET.format(function_dir=function_dir, index_path=os.path.join(function_dir, 'index.py'), marker=MARKER)
+    totals = []
+    imports = {}
+    for _ in range(RUNS):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', snippet], capture_output=True, text=True)
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1]
+        totals.append(int(result.stdout.strip()))
+        for name, cumulative in top_level_imports(result.stderr).items():
+            imports.setdefault(name, []).append(cumulative)
+    slowest = sorted(((statistics.median(values), name) for name, values in imports.items()), reverse=True)
+    return statistics.median(totals), slowest[:TOP_IMPORTS]
+
+def main() -> None:
+    functions = sys.argv[1:] or sorted(
+        name for name in os.listdir(BACKEND_DIR) if os.path.isfile(os.path.join(BACKEND_DIR, name, 'index.py'))
+    )
+    for function_name in functions:
+        total, slowest = measure(function_name)
+        if total is None:
+            print(f"{function_name:<20} failed: {slowest}")
+            continue
+        details = ', '.join(f"{name} {us / 1000:.1f}" for us, name in slowest)
+        print(f"{function_name:<20} {total / 1000:7.1f} ms   ({details})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+'''
+Business: Compare ai-genius internal calls to the credits function: in-process vs pooled HTTP
+Args: optional iteration count and email; without an email the credits reserve action answers 400
+      before touching the database, which isolates the cost of the call path itself. With an email
+      each iteration reserves one credit and releases it, the two calls every generation makes
+Returns: Prints per-iteration latency for both paths
+
+Usage: python benchmarks/internal_calls.py [iterations] [email]
+The HTTP path talks to a local server that wraps the same credits handler,
+so the difference is the transport (serialization, HTTP, keep-alive) only.
+'''
+
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+from _handlers import load_handler
+
+def serve_function(handler_fn) -> ThreadingHTTPServer:
+    class FunctionRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        wbufsize = 65536
+
+        def _dispatch(self):
+            parsed = urlparse(self.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            event = {
+                'httpMethod': self.command,
+                'headers': dict(self.headers),
+                'queryStringParameters': dict(parse_qsl(parsed.query)),
+                'body': self.rfile.read(length).decode() if length else ''
+            }
+            response = handler_fn(event, None)
+            body = response.get('body', '').encode()
+            self.send_response(response['statusCode'])
+            for key, value in response.get('headers', {}).items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_POST = _dispatch
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FunctionRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def measure(genius, iterations: int, email: str) -> list:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        if email:
+            _, _, hold_id = genius.reserve_credits(email, 1, 'benchmark')
+            genius.settle_credit_hold(hold_id, 'release')
+        else:
+            genius.call_function('credits', 'POST', body={'action': 'reserve'},
+                                 headers={'X-Admin-Secret': genius.CREDITS_ADMIN_SECRET})
+        timings.append(time.perf_counter() - started)
+    return timings
+
+def report(label: str, timings: list) -> None:
+    print(f"{label:<10} mean={statistics.mean(timings) * 1000:8.3f} ms  p50={statistics.median(timings) * 1000:8.3f} ms")
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    email = sys.argv[2] if len(sys.argv) > 2 else ''
+    # Both sides read the secret at import; the hold actions answer 403 without it
+    os.environ.setdefault('CREDITS_ADMIN_SECRET', 'benchmark')
+
+    genius = load_handler('ai-genius')
+    report('local', measure(genius, iterations, email))
+
+    server = serve_function(genius.load_local_handler('credits'))
+    genius._local_handlers['credits'] = None
+    genius._function_urls['credits'] = f"http://127.0.0.1:{server.server_address[1]}/"
+    report('http', measure(genius, iterations, email))
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+'''
+Business: Check and time the single-pass ru→en prompt translator of ai-genius (service 32)
+Args: optional iteration count
+Returns: Prints equivalence results against the legacy per-entry re.sub loop and the timings
+         of both; exits with status 1 if the outputs differ where they should not
+
+Usage: python benchmarks/prompt_translator.py [iterations]
+The legacy loop applied dictionary entries one after another, so a single-word
+entry could consume the first word of a multi-word phrase ("белый медведь")
+before the phrase was tried. The trie always takes the longest phrase, so
+prompts that contain a multi-word key are expected to differ, and only there.
+'''
+
+import re
+import sys
+import time
+
+from _handlers import load_handler
+
+CORPUS = [
+    'Нарисуй кота',
+    'нарисуй красивую девушку в лесу',
+    'Сгенерируй изображение: белый медведь на льдине',
+    'мальчик с собакой на пляже',
+    'Космический корабль над городом ночью',
+    'дракон в стиле аниме',
+    'огнедышащий дракон атакует замок',
+    'Киберпанк город, неон, дождь',
+    'портрет женщины, масло',
+    'старый дом у озера осенью',
+    'подводная лодка в океане',
+    'закат в горах, акварель',
+    'семья на пикнике, фото',
+    'Робот и искусственный интеллект в лаборатории',
+    'пиксельный рыцарь с мечом',
+    'ботанический сад весной',
+    'НЛО над полем',
+    'кот2 и собака_3',
+    'белый  медведь',
+    'божья коровка на листе, макро',
+    'винтажный автомобиль на улице',
+    'граф дракула в замке',
+    'a cat in a hat',
+    '',
+]
+
+def legacy_translate(dictionary: dict, text: str) -> str:
+    translated = text.lower()
+    for ru, en in dictionary.items():
+        translated = re.sub(r'\b' + re.escape(ru) + r'\b', en, translated)
+    return translated
+
+def normalize(text: str) -> str:
+    return ' '.join(text.split())
+
+def check_equivalence(genius) -> bool:
+    phrases = [phrase for phrase in genius.RU_TO_EN if ' ' in phrase]
+    ok = True
+    for prompt in CORPUS:
+        legacy = normalize(legacy_translate(genius.RU_TO_EN, prompt))
+        current = normalize(genius.translate_prompt(prompt))
+        lowered = prompt.lower()
+        contained = [phrase for phrase in phrases if re.search(r'\b' + re.escape(phrase) + r'\b', lowered)]
+        if contained:
+            # Фраза целиком должна переводиться своим значением из словаря
+            expected = all(genius.RU_TO_EN[phrase] in current for phrase in contained if genius.RU_TO_EN[phrase])
+            status = 'phrase' if expected else 'FAIL'
+        else:
+            expected = legacy == current
+            status = 'same' if expected else 'FAIL'
+        ok = ok and expected
+        print(f"{status:<7} {prompt!r:<55} -> {current!r}" + ('' if legacy == current else f"  (legacy: {legacy!r})"))
+    return ok
+
+def time_translator(translate, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for prompt in CORPUS:
+            translate(prompt)
+    return (time.perf_counter() - started) / (iterations * len(CORPUS))
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    genius = load_handler('ai-genius')
+    ok = check_equivalence(genius)
+
+    legacy_per_prompt = time_translator(lambda text: legacy_translate(genius.RU_TO_EN, text), iterations)
+    trie_per_prompt = time_translator(genius.translate_prompt, iterations * 100)
+    print(f"\ndictionary entries: {len(genius.RU_TO_EN)}")
+    print(f"legacy loop: {legacy_per_prompt * 1e6:10.1f} us/prompt")
+    print(f"trie:        {trie_per_prompt * 1e6:10.1f} us/prompt ({legacy_per_prompt / trie_per_prompt:.0f}x)")
+
+    if not ok:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
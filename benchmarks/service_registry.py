@@ -0,0 +1,57 @@
+'''
+Business: Measure per-request prompt preparation in ai-genius before and after the service registry
+Args: optional iteration count and service id
+Returns: Prints CPU time and allocated bytes per request for both variants
+
+Usage: python benchmarks/service_registry.py [iterations] [service_id]
+The "legacy" variant reproduces what handler used to do on every request:
+render every service template with the input and rebuild the cost table,
+then pick one. The "registry" variant only looks up the service and renders
+its template.
+'''
+
+import sys
+import time
+import tracemalloc
+
+from _handlers import load_handler
+
+INPUT_TEXT = 'Помоги составить план запуска онлайн-школы программирования для подростков. ' * 4
+
+def legacy_prepare(genius, service_id: int, input_text: str):
+    prompts = {0: input_text}
+    for sid, template in genius.SERVICE_PROMPTS.items():
+        prompts[sid] = template.replace('{input_text}', input_text)
+    tokens_cost = dict(genius.SERVICE_COSTS)
+    return prompts.get(service_id, input_text), tokens_cost.get(service_id, 5)
+
+def registry_prepare(genius, service_id: int, input_text: str):
+    service = genius.get_service(service_id)
+    return genius.render_service_prompt(service, input_text), service['cost']
+
+def measure(prepare, genius, service_id: int, iterations: int):
+    started = time.process_time()
+    for _ in range(iterations):
+        prepare(genius, service_id, INPUT_TEXT)
+    cpu = (time.process_time() - started) / iterations
+
+    tracemalloc.start()
+    prepare(genius, service_id, INPUT_TEXT)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu, peak
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    service_id = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    genius = load_handler('ai-genius')
+    assert legacy_prepare(genius, service_id, INPUT_TEXT) == registry_prepare(genius, service_id, INPUT_TEXT)
+
+    print(f"service {service_id}, {len(genius.SERVICE_PROMPTS)} templates, input {len(INPUT_TEXT)} chars")
+    for label, prepare in (('legacy', legacy_prepare), ('registry', registry_prepare)):
+        cpu, peak = measure(prepare, genius, service_id, iterations)
+        print(f"{label:<9} cpu={cpu * 1e6:8.2f} us/request  allocated={peak / 1024:8.1f} KiB/request")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+'''
+Business: Measure backlog recovery speed of payment-webhook: per-notification ingestion vs batch replay
+Args: DATABASE_URL pointing at a migrated development database, optional notification count (default 20000)
+      and user count (default 500)
+Returns: Prints notifications per second for each mode and checks that a second replay credits nothing
+
+Usage: DATABASE_URL=postgresql://localhost/postgres python benchmarks/webhook_replay.py [notifications] [users]
+Seeds bench-webhook-N@example.com users, writes the backlog as a JSON-lines file of stored webhook
+bodies, and removes everything afterwards. Modes:
+  legacy three-step   the old SELECT payment_transactions, UPDATE users, INSERT per notification
+                      (plus the ledger row, so every mode does the same writes)
+  single statement    one handler call per notification (WEBHOOK_INGEST_SQL)
+  batch replay        the file posted as {"action": "replay"} in chunks, WEBHOOK_REPLAY_BATCH_SIZE per statement
+'''
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import psycopg2
+
+from _handlers import load_handler
+
+EMAIL_PATTERN = 'bench-webhook-%s@example.com'
+SCHEMA = 't_p55547046_creative_ai_hub'
+PACKAGES = [99, 399, 699, 2999]
+REPLAY_CHUNK = 10000
+ADMIN_SECRET = 'bench-admin-secret'
+
+def seed(dsn: str, users: int) -> None:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(
+        f"""INSERT INTO {SCHEMA}.users (email, name, credits)
+            SELECT replace(%s, '%%s', g::text), 'Bench', 0 FROM generate_series(1, %s) g""",
+        (EMAIL_PATTERN, users)
+    )
+    conn.commit()
+    conn.close()
+
+def cleanup(dsn: str) -> None:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    pattern = EMAIL_PATTERN.replace('%s', '%')
+    cur.execute(f"DELETE FROM {SCHEMA}.payment_transactions WHERE user_email LIKE %s", (pattern,))
+    cur.execute(f"DELETE FROM {SCHEMA}.credit_ledger WHERE user_id IN (SELECT id FROM {SCHEMA}.users WHERE email LIKE %s)", (pattern,))
+    cur.execute(f"DELETE FROM {SCHEMA}.users WHERE email LIKE %s", (pattern,))
+    conn.commit()
+    conn.close()
+
+def write_backlog(path: str, prefix: str, notifications: int, users: int) -> None:
+    rng = random.Random(7)
+    with open(path, 'w', encoding='utf-8') as f:
+        for n in range(notifications):
+            f.write(json.dumps({
+                'event': 'payment.succeeded',
+                'object': {
+                    'id': f'{prefix}-{n}',
+                    'status': 'succeeded',
+                    'amount': {'value': f'{rng.choice(PACKAGES)}.00', 'currency': 'RUB'},
+                    'metadata': {'email': EMAIL_PATTERN % rng.randint(1, users)}
+                }
+            }) + '\n')
+
+def read_backlog(path: str):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+def legacy_ingest(conn, notification) -> None:
+    payment = notification['object']
+    email = payment['metadata']['email']
+    tokens = {99: 10, 399: 60, 699: 125, 2999: 650}[int(float(payment['amount']['value']))]
+    cur = conn.cursor()
+    cur.execute(f"SELECT id FROM {SCHEMA}.payment_transactions WHERE transaction_id = %s", (payment['id'],))
+    if cur.fetchone():
+        return
+    cur.execute(f"UPDATE {SCHEMA}.users SET credits = credits + %s WHERE email = %s RETURNING id", (tokens, email))
+    user_id = cur.fetchone()[0]
+    cur.execute(
+        f"INSERT INTO {SCHEMA}.credit_ledger (user_id, amount, kind, reference) VALUES (%s, %s, 'purchase', %s)",
+        (user_id, tokens, payment['id'])
+    )
+    cur.execute(
+        f"""INSERT INTO {SCHEMA}.payment_transactions (transaction_id, user_email, amount, tokens_added)
+            VALUES (%s, %s, %s, %s)""",
+        (payment['id'], email, int(float(payment['amount']['value'])), tokens)
+    )
+    conn.commit()
+
+def post(webhook, body) -> dict:
+    response = webhook.handler({'httpMethod': 'POST', 'body': json.dumps(body), 'headers': {'X-Admin-Secret': ADMIN_SECRET}}, None)
+    return json.loads(response['body'])
+
+def replay_file(webhook, path: str) -> dict:
+    notifications = read_backlog(path)
+    totals = {}
+    for start in range(0, len(notifications), REPLAY_CHUNK):
+        summary = post(webhook, {'action': 'replay', 'notifications': notifications[start:start + REPLAY_CHUNK]})
+        for key, value in summary.items():
+            if isinstance(value, int):
+                totals[key] = totals.get(key, 0) + value
+    return totals
+
+def ledger_matches(dsn: str) -> bool:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(
+        f"""SELECT COUNT(*) FROM {SCHEMA}.users u
+            LEFT JOIN (SELECT user_id, SUM(amount) AS posted FROM {SCHEMA}.credit_ledger
+                       WHERE status = 'posted' GROUP BY user_id) l ON l.user_id = u.id
+            WHERE u.email LIKE %s AND u.credits <> COALESCE(l.posted, 0)""",
+        (EMAIL_PATTERN.replace('%s', '%'),)
+    )
+    mismatched = cur.fetchone()[0]
+    conn.close()
+    return mismatched == 0
+
+def main() -> None:
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        sys.exit('DATABASE_URL is required')
+    notifications = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    webhook = load_handler('payment-webhook')
+    webhook.WEBHOOK_ADMIN_SECRET = ADMIN_SECRET
+    cleanup(dsn)
+    seed(dsn, users)
+    workdir = tempfile.mkdtemp(prefix='webhook-replay-')
+    try:
+        print(f"{notifications} stored notifications over {users} users")
+
+        path = os.path.join(workdir, 'legacy.jsonl')
+        write_backlog(path, 'bench-legacy', notifications, users)
+        conn = psycopg2.connect(dsn)
+        started = time.perf_counter()
+        for notification in read_backlog(path):
+            legacy_ingest(conn, notification)
+        elapsed = time.perf_counter() - started
+        conn.close()
+        print(f"  legacy three-step  {elapsed:7.2f} s  {notifications / elapsed:8.0f} notifications/s")
+
+        path = os.path.join(workdir, 'single.jsonl')
+        write_backlog(path, 'bench-single', notifications, users)
+        started = time.perf_counter()
+        for notification in read_backlog(path):
+            post(webhook, notification)
+        elapsed = time.perf_counter() - started
+        print(f"  single statement   {elapsed:7.2f} s  {notifications / elapsed:8.0f} notifications/s")
+
+        path = os.path.join(workdir, 'replay.jsonl')
+        write_backlog(path, 'bench-replay', notifications, users)
+        started = time.perf_counter()
+        first = replay_file(webhook, path)
+        elapsed = time.perf_counter() - started
+        print(f"  batch replay       {elapsed:7.2f} s  {notifications / elapsed:8.0f} notifications/s  "
+              f"credited {first['credited']} in {first['batches']} batches")
+
+        started = time.perf_counter()
+        second = replay_file(webhook, path)
+        elapsed = time.perf_counter() - started
+        print(f"  replay again       {elapsed:7.2f} s  credited {second['credited']}  "
+              f"already processed {second['already_processed']}  ledger matches balances: {ledger_matches(dsn)}")
+    finally:
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+        cleanup(dsn)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+'''
+Business: Reconcile payment_transactions against a local YooKassa stand-in serving a large payment list
+Args: DATABASE_URL pointing at a migrated development database, optional payment count (default 100000)
+      and user count (default 1000)
+Returns: Prints pages fetched, HTTP connections opened, diff and credit counts, time per phase,
+         and the same diff done with one lookup per payment for comparison
+
+Usage: DATABASE_URL=postgresql://localhost/postgres python benchmarks/yookassa_reconcile.py [payments] [users]
+Seeds bench-reconcile-N@example.com users and removes everything afterwards. The stand-in answers
+GET /payments with YooKassa's list format (items, next_cursor) over keep-alive HTTP/1.1. Of its payments
+97% are already in payment_transactions (a few with a different amount, as payment-verify could record),
+the rest lost their webhook; a handful belong to emails with no account.
+'''
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import psycopg2
+import requests
+
+from _handlers import load_handler
+
+EMAIL_PATTERN = 'bench-reconcile-%s@example.com'
+SCHEMA = 't_p55547046_creative_ai_hub'
+PACKAGES = {99: 10, 399: 60, 699: 125, 2999: 650}
+RECORDED_SHARE = 0.97
+MISMATCH_SHARE = 0.001
+ORPHAN_SHARE = 0.001
+ADMIN_SECRET = 'bench-admin-secret'
+
+def build_payments(count: int, users: int):
+    rng = random.Random(11)
+    payments = []
+    for n in range(count):
+        amount = rng.choice(list(PACKAGES))
+        email = EMAIL_PATTERN % rng.randint(1, users)
+        if rng.random() < ORPHAN_SHARE:
+            email = 'bench-reconcile-orphan-%s@example.com' % n
+        payments.append({
+            'id': f'bench-reconcile-{n:08d}',
+            'status': 'succeeded',
+            'paid': True,
+            'amount': {'value': f'{amount}.00', 'currency': 'RUB'},
+            'created_at': '2026-10-01T00:00:00.000Z',
+            'metadata': {'email': email, 'package_id': str(amount)}
+        })
+    return payments
+
+def start_stand_in(payments):
+    connections = [0]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out as separate writes; with Nagle on, keep-alive clients stall on delayed ACKs
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            connections[0] += 1
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path != '/payments' or 'Authorization' not in self.headers:
+                self.send_error(404)
+                return
+            start = int(query.get('cursor', ['0'])[0])
+            limit = min(int(query.get('limit', ['10'])[0]), 100)
+            page = {'type': 'list', 'items': payments[start:start + limit]}
+            if start + limit < len(payments):
+                page['next_cursor'] = str(start + limit)
+            body = json.dumps(page).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, connections
+
+def seed(dsn: str, users: int, payments) -> None:
+    rng = random.Random(12)
+    recorded = [p for p in payments if rng.random() < RECORDED_SHARE and 'orphan' not in p['metadata']['email']]
+    amounts = []
+    for p in recorded:
+        amount = int(float(p['amount']['value']))
+        amounts.append(amount + 1 if rng.random() < MISMATCH_SHARE else amount)
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(
+        f"""INSERT INTO {SCHEMA}.users (email, name, credits)
+            SELECT replace(%s, '%%s', g::text), 'Bench', 0 FROM generate_series(1, %s) g""",
+        (EMAIL_PATTERN, users)
+    )
+    cur.execute(
+        f"""INSERT INTO {SCHEMA}.payment_transactions (transaction_id, user_email, amount, tokens_added)
+            SELECT * FROM unnest(%s::text[], %s::text[], %s::int[], %s::int[])""",
+        ([p['id'] for p in recorded], [p['metadata']['email'] for p in recorded], amounts,
+         [PACKAGES[int(float(p['amount']['value']))] for p in recorded])
+    )
+    conn.commit()
+    conn.close()
+
+def cleanup(dsn: str) -> None:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    pattern = EMAIL_PATTERN.replace('%s', '%')
+    cur.execute(f"DELETE FROM {SCHEMA}.payment_transactions WHERE transaction_id LIKE 'bench-reconcile-%%'")
+    cur.execute(f"DELETE FROM {SCHEMA}.credit_ledger WHERE user_id IN (SELECT id FROM {SCHEMA}.users WHERE email LIKE %s)", (pattern,))
+    cur.execute(f"DELETE FROM {SCHEMA}.users WHERE email LIKE %s", (pattern,))
+    conn.commit()
+    conn.close()
+
+def per_row_diff(dsn: str, base_url: str) -> int:
+    missing = 0
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cursor = None
+    while True:
+        params = {'status': 'succeeded', 'limit': 100}
+        if cursor:
+            params['cursor'] = cursor
+        page = requests.get(f'{base_url}/payments', params=params, auth=('shop', 'key'), timeout=10).json()
+        for payment in page['items']:
+            cur.execute(f"SELECT 1 FROM {SCHEMA}.payment_transactions WHERE transaction_id = %s", (payment['id'],))
+            if cur.fetchone() is None:
+                missing += 1
+        cursor = page.get('next_cursor')
+        if not cursor:
+            break
+    conn.close()
+    return missing
+
+def ledger_matches(dsn: str) -> bool:
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(
+        f"""SELECT COUNT(*) FROM {SCHEMA}.users u
+            LEFT JOIN (SELECT user_id, SUM(amount) AS posted FROM {SCHEMA}.credit_ledger
+                       WHERE status = 'posted' GROUP BY user_id) l ON l.user_id = u.id
+            WHERE u.email LIKE %s AND u.credits <> COALESCE(l.posted, 0)""",
+        (EMAIL_PATTERN.replace('%s', '%'),)
+    )
+    mismatched = cur.fetchone()[0]
+    conn.close()
+    return mismatched == 0
+
+def reconcile(webhook) -> dict:
+    response = webhook.handler({
+        'httpMethod': 'POST',
+        'body': json.dumps({'action': 'reconcile', 'since': '2026-10-01T00:00:00.000Z'}),
+        'headers': {'X-Admin-Secret': ADMIN_SECRET}
+    }, None)
+    return json.loads(response['body'])
+
+def main() -> None:
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        sys.exit('DATABASE_URL is required')
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    payments = build_payments(count, users)
+    server, connections = start_stand_in(payments)
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    os.environ.update({'YUKASSA_API_URL': base_url, 'YUKASSA_SHOP_ID': 'shop', 'YUKASSA_SECRET_KEY': 'key'})
+    webhook = load_handler('payment-webhook')
+    webhook.WEBHOOK_ADMIN_SECRET = ADMIN_SECRET
+    webhook.RECONCILE_MAX_PAGES = count // webhook.RECONCILE_PAGE_SIZE + 1
+
+    cleanup(dsn)
+    seed(dsn, users, payments)
+    try:
+        print(f"{count} succeeded payments at the stand-in, {users} users")
+
+        connections[0] = 0
+        started = time.perf_counter()
+        missing = per_row_diff(dsn, base_url)
+        elapsed = time.perf_counter() - started
+        print(f"  per-row diff, new connection per page  {elapsed:6.2f} s  missing {missing}  "
+              f"HTTP connections {connections[0]}")
+
+        connections[0] = 0
+        started = time.perf_counter()
+        first = reconcile(webhook)
+        elapsed = time.perf_counter() - started
+        print(f"  reconcile                              {elapsed:6.2f} s  pages {first['pages']}  "
+              f"HTTP connections {connections[0]}")
+        print(f"    matched {first['matched']}  amount mismatch {first['amount_mismatch']}  missing {first['missing']}  "
+              f"credited {first['credited']}  user not found {first['user_not_found']}")
+
+        started = time.perf_counter()
+        second = reconcile(webhook)
+        elapsed = time.perf_counter() - started
+        print(f"  reconcile again                        {elapsed:6.2f} s  missing {second['missing']}  "
+              f"credited {second['credited']}  ledger matches balances: {ledger_matches(dsn)}")
+    finally:
+        server.shutdown()
+        cleanup(dsn)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+-- Сообщения чатов хранятся построчно: ход чата дописывает строки, а не переписывает весь JSONB
+CREATE TABLE IF NOT EXISTS t_p55547046_creative_ai_hub.chat_messages (
+    chat_id VARCHAR(100) NOT NULL REFERENCES t_p55547046_creative_ai_hub.chat_history(chat_id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    role VARCHAR(20) NOT NULL,
+    content TEXT NOT NULL,
+    thinking TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (chat_id, seq)
+);
+
+-- Счётчик сообщений в чате: следующий seq берётся из него, без сканирования chat_messages
+ALTER TABLE t_p55547046_creative_ai_hub.chat_history ADD COLUMN IF NOT EXISTS message_count INTEGER NOT NULL DEFAULT 0;
+
+-- Переносим существующие истории из chat_history.messages
+INSERT INTO t_p55547046_creative_ai_hub.chat_messages (chat_id, seq, role, content, thinking, created_at)
+SELECT ch.chat_id, m.ord, COALESCE(m.msg->>'role', 'user'), COALESCE(m.msg->>'content', ''), m.msg->>'thinking', ch.updated_at
+FROM t_p55547046_creative_ai_hub.chat_history ch,
+     jsonb_array_elements(
+         CASE WHEN jsonb_typeof(ch.messages) = 'array' THEN ch.messages ELSE '[]'::jsonb END
+     ) WITH ORDINALITY AS m(msg, ord)
+ON CONFLICT (chat_id, seq) DO NOTHING;
+
+UPDATE t_p55547046_creative_ai_hub.chat_history
+SET message_count = jsonb_array_length(messages)
+WHERE message_count = 0 AND jsonb_typeof(messages) = 'array';
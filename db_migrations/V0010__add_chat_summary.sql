@@ -0,0 +1,3 @@
+-- Скользящая сводка диалога: сообщения с seq <= summary_upto уже свёрнуты в summary
+ALTER TABLE t_p55547046_creative_ai_hub.chat_history ADD COLUMN IF NOT EXISTS summary TEXT;
+ALTER TABLE t_p55547046_creative_ai_hub.chat_history ADD COLUMN IF NOT EXISTS summary_upto INTEGER NOT NULL DEFAULT 0;
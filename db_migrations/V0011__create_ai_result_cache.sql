@@ -0,0 +1,12 @@
+-- Общий кеш результатов шаблонных AI-сервисов: одинаковый запрос не ходит в YandexGPT повторно
+CREATE TABLE IF NOT EXISTS t_p55547046_creative_ai_hub.ai_result_cache (
+    cache_key CHAR(64) PRIMARY KEY,
+    service_id INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    thinking TEXT,
+    hit_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_ai_result_cache_expires_at ON t_p55547046_creative_ai_hub.ai_result_cache(expires_at);
@@ -0,0 +1,6 @@
+-- Кеш текста, извлечённого из документов Word/Excel/PDF; ключ — вид извлекателя, его версия и SHA-256 файла
+CREATE TABLE IF NOT EXISTS t_p55547046_creative_ai_hub.document_text_cache (
+    cache_key VARCHAR(100) PRIMARY KEY,
+    text TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
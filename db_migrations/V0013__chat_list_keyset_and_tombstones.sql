@@ -0,0 +1,17 @@
+-- Список чатов листается ключом (updated_at, id): индекс отдаёт страницу без сортировки и OFFSET
+CREATE INDEX IF NOT EXISTS idx_chat_history_user_updated_id
+    ON t_p55547046_creative_ai_hub.chat_history(user_email, updated_at DESC, id DESC);
+
+-- Старые индексы покрываются составным
+DROP INDEX IF EXISTS t_p55547046_creative_ai_hub.idx_chat_history_user_email;
+DROP INDEX IF EXISTS t_p55547046_creative_ai_hub.idx_chat_history_updated_at;
+
+-- Надгробия удалённых чатов: по ним клиент с updated_since узнаёт, что убрать из списка
+CREATE TABLE IF NOT EXISTS t_p55547046_creative_ai_hub.chat_history_tombstones (
+    chat_id VARCHAR(100) PRIMARY KEY,
+    user_email VARCHAR(255) NOT NULL,
+    deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_history_tombstones_user_deleted
+    ON t_p55547046_creative_ai_hub.chat_history_tombstones(user_email, deleted_at);
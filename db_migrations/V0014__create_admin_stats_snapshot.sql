@@ -0,0 +1,168 @@
+-- Снимок статистики для админки: счётчики поддерживаются триггерами, дашборд читает одну строку
+CREATE TABLE IF NOT EXISTS t_p55547046_creative_ai_hub.admin_stats (
+    id SMALLINT PRIMARY KEY CHECK (id = 1),
+    total_orders BIGINT NOT NULL DEFAULT 0,
+    active_users BIGINT NOT NULL DEFAULT 0,
+    total_chats BIGINT NOT NULL DEFAULT 0,
+    chat_users BIGINT NOT NULL DEFAULT 0,
+    rebuilt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Счётчики по ключам: из них берутся distinct-пользователи (строка появляется и исчезает с первым и последним объектом)
+CREATE TABLE IF NOT EXISTS t_p55547046_creative_ai_hub.admin_stats_order_users (
+    user_id INTEGER PRIMARY KEY,
+    order_count BIGINT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS t_p55547046_creative_ai_hub.admin_stats_chat_users (
+    user_email VARCHAR(255) PRIMARY KEY,
+    chat_count BIGINT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS t_p55547046_creative_ai_hub.admin_stats_services (
+    service_name VARCHAR(200) PRIMARY KEY,
+    chat_count BIGINT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_admin_stats_services_count
+    ON t_p55547046_creative_ai_hub.admin_stats_services(chat_count DESC, service_name);
+
+CREATE TABLE IF NOT EXISTS t_p55547046_creative_ai_hub.admin_stats_daily (
+    day DATE PRIMARY KEY,
+    orders BIGINT NOT NULL DEFAULT 0
+);
+
+-- Учитываем заказ: delta = +1 при появлении, -1 при исчезновении; тестовые заказы не считаются
+CREATE OR REPLACE FUNCTION t_p55547046_creative_ai_hub.admin_stats_apply_order(p_user_id INTEGER, p_created_at TIMESTAMP, p_delta INTEGER)
+RETURNS VOID AS $$
+DECLARE
+    user_orders BIGINT;
+BEGIN
+    UPDATE t_p55547046_creative_ai_hub.admin_stats SET total_orders = total_orders + p_delta WHERE id = 1;
+
+    INSERT INTO t_p55547046_creative_ai_hub.admin_stats_daily (day, orders)
+    VALUES (DATE(p_created_at), p_delta)
+    ON CONFLICT (day) DO UPDATE SET orders = admin_stats_daily.orders + EXCLUDED.orders;
+
+    IF p_user_id IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO t_p55547046_creative_ai_hub.admin_stats_order_users (user_id, order_count)
+    VALUES (p_user_id, p_delta)
+    ON CONFLICT (user_id) DO UPDATE SET order_count = admin_stats_order_users.order_count + EXCLUDED.order_count
+    RETURNING order_count INTO user_orders;
+
+    IF p_delta > 0 AND user_orders = p_delta THEN
+        UPDATE t_p55547046_creative_ai_hub.admin_stats SET active_users = active_users + 1 WHERE id = 1;
+    ELSIF user_orders <= 0 THEN
+        DELETE FROM t_p55547046_creative_ai_hub.admin_stats_order_users WHERE user_id = p_user_id;
+        UPDATE t_p55547046_creative_ai_hub.admin_stats SET active_users = active_users - 1 WHERE id = 1;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p55547046_creative_ai_hub.admin_stats_apply_chat(p_user_email VARCHAR, p_service_name VARCHAR, p_delta INTEGER)
+RETURNS VOID AS $$
+DECLARE
+    user_chats BIGINT;
+BEGIN
+    UPDATE t_p55547046_creative_ai_hub.admin_stats SET total_chats = total_chats + p_delta WHERE id = 1;
+
+    INSERT INTO t_p55547046_creative_ai_hub.admin_stats_services (service_name, chat_count)
+    VALUES (p_service_name, p_delta)
+    ON CONFLICT (service_name) DO UPDATE SET chat_count = admin_stats_services.chat_count + EXCLUDED.chat_count;
+
+    INSERT INTO t_p55547046_creative_ai_hub.admin_stats_chat_users (user_email, chat_count)
+    VALUES (p_user_email, p_delta)
+    ON CONFLICT (user_email) DO UPDATE SET chat_count = admin_stats_chat_users.chat_count + EXCLUDED.chat_count
+    RETURNING chat_count INTO user_chats;
+
+    IF p_delta > 0 AND user_chats = p_delta THEN
+        UPDATE t_p55547046_creative_ai_hub.admin_stats SET chat_users = chat_users + 1 WHERE id = 1;
+    ELSIF user_chats <= 0 THEN
+        DELETE FROM t_p55547046_creative_ai_hub.admin_stats_chat_users WHERE user_email = p_user_email;
+        UPDATE t_p55547046_creative_ai_hub.admin_stats SET chat_users = chat_users - 1 WHERE id = 1;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p55547046_creative_ai_hub.admin_stats_orders_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status != 'test' THEN
+        PERFORM t_p55547046_creative_ai_hub.admin_stats_apply_order(OLD.user_id, OLD.created_at, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status != 'test' THEN
+        PERFORM t_p55547046_creative_ai_hub.admin_stats_apply_order(NEW.user_id, NEW.created_at, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p55547046_creative_ai_hub.admin_stats_chats_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM t_p55547046_creative_ai_hub.admin_stats_apply_chat(OLD.user_email, OLD.service_name, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM t_p55547046_creative_ai_hub.admin_stats_apply_chat(NEW.user_email, NEW.service_name, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Пересчёт с нуля: начальное заполнение и исправление расхождений, найденных проверкой
+CREATE OR REPLACE FUNCTION t_p55547046_creative_ai_hub.admin_stats_rebuild()
+RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE t_p55547046_creative_ai_hub.orders, t_p55547046_creative_ai_hub.chat_history IN SHARE MODE;
+
+    DELETE FROM t_p55547046_creative_ai_hub.admin_stats_order_users;
+    INSERT INTO t_p55547046_creative_ai_hub.admin_stats_order_users (user_id, order_count)
+    SELECT user_id, COUNT(*) FROM t_p55547046_creative_ai_hub.orders
+    WHERE status != 'test' AND user_id IS NOT NULL
+    GROUP BY user_id;
+
+    DELETE FROM t_p55547046_creative_ai_hub.admin_stats_chat_users;
+    INSERT INTO t_p55547046_creative_ai_hub.admin_stats_chat_users (user_email, chat_count)
+    SELECT user_email, COUNT(*) FROM t_p55547046_creative_ai_hub.chat_history GROUP BY user_email;
+
+    DELETE FROM t_p55547046_creative_ai_hub.admin_stats_services;
+    INSERT INTO t_p55547046_creative_ai_hub.admin_stats_services (service_name, chat_count)
+    SELECT service_name, COUNT(*) FROM t_p55547046_creative_ai_hub.chat_history GROUP BY service_name;
+
+    DELETE FROM t_p55547046_creative_ai_hub.admin_stats_daily;
+    INSERT INTO t_p55547046_creative_ai_hub.admin_stats_daily (day, orders)
+    SELECT DATE(created_at), COUNT(*) FROM t_p55547046_creative_ai_hub.orders
+    WHERE status != 'test' AND created_at IS NOT NULL
+    GROUP BY DATE(created_at);
+
+    INSERT INTO t_p55547046_creative_ai_hub.admin_stats (id, total_orders, active_users, total_chats, chat_users, rebuilt_at)
+    SELECT 1,
+           (SELECT COUNT(*) FROM t_p55547046_creative_ai_hub.orders WHERE status != 'test'),
+           (SELECT COUNT(*) FROM t_p55547046_creative_ai_hub.admin_stats_order_users),
+           (SELECT COUNT(*) FROM t_p55547046_creative_ai_hub.chat_history),
+           (SELECT COUNT(*) FROM t_p55547046_creative_ai_hub.admin_stats_chat_users),
+           CURRENT_TIMESTAMP
+    ON CONFLICT (id) DO UPDATE SET
+        total_orders = EXCLUDED.total_orders,
+        active_users = EXCLUDED.active_users,
+        total_chats = EXCLUDED.total_chats,
+        chat_users = EXCLUDED.chat_users,
+        rebuilt_at = EXCLUDED.rebuilt_at;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS admin_stats_orders ON t_p55547046_creative_ai_hub.orders;
+CREATE TRIGGER admin_stats_orders
+    AFTER INSERT OR DELETE OR UPDATE OF status, user_id, created_at ON t_p55547046_creative_ai_hub.orders
+    FOR EACH ROW EXECUTE FUNCTION t_p55547046_creative_ai_hub.admin_stats_orders_trigger();
+
+DROP TRIGGER IF EXISTS admin_stats_chats ON t_p55547046_creative_ai_hub.chat_history;
+CREATE TRIGGER admin_stats_chats
+    AFTER INSERT OR DELETE OR UPDATE OF user_email, service_name ON t_p55547046_creative_ai_hub.chat_history
+    FOR EACH ROW EXECUTE FUNCTION t_p55547046_creative_ai_hub.admin_stats_chats_trigger();
+
+SELECT t_p55547046_creative_ai_hub.admin_stats_rebuild();
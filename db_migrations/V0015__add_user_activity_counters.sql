@@ -0,0 +1,94 @@
+-- Денормализованные счётчики пользователя для админского списка: без JOIN с orders и chat_history
+ALTER TABLE t_p55547046_creative_ai_hub.users ADD COLUMN IF NOT EXISTS order_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE t_p55547046_creative_ai_hub.users ADD COLUMN IF NOT EXISTS chat_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE t_p55547046_creative_ai_hub.users
+    ADD COLUMN IF NOT EXISTS activity INTEGER GENERATED ALWAYS AS (order_count + chat_count) STORED;
+
+-- Ключи сортировки не должны быть NULL, иначе сравнение строк в keyset-пагинации теряет записи
+UPDATE t_p55547046_creative_ai_hub.users SET credits = 0 WHERE credits IS NULL;
+UPDATE t_p55547046_creative_ai_hub.users SET created_at = TIMESTAMP '1970-01-01' WHERE created_at IS NULL;
+ALTER TABLE t_p55547046_creative_ai_hub.users ALTER COLUMN credits SET NOT NULL;
+ALTER TABLE t_p55547046_creative_ai_hub.users ALTER COLUMN created_at SET NOT NULL;
+
+-- Индексы под сортировки списка: страница читается прямо из индекса, в обе стороны
+CREATE INDEX IF NOT EXISTS idx_users_created_id ON t_p55547046_creative_ai_hub.users(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_users_credits_id ON t_p55547046_creative_ai_hub.users(credits DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_users_activity_id ON t_p55547046_creative_ai_hub.users(activity DESC, id DESC);
+
+-- Фильтр по префиксу email (LIKE 'abc%') не использует обычный индекс при не-C локали
+CREATE INDEX IF NOT EXISTS idx_users_email_prefix ON t_p55547046_creative_ai_hub.users(email varchar_pattern_ops);
+
+-- Триггеры снимка статистики теперь обновляют и счётчики пользователя
+CREATE OR REPLACE FUNCTION t_p55547046_creative_ai_hub.admin_stats_apply_order(p_user_id INTEGER, p_created_at TIMESTAMP, p_delta INTEGER)
+RETURNS VOID AS $$
+DECLARE
+    user_orders BIGINT;
+BEGIN
+    UPDATE t_p55547046_creative_ai_hub.admin_stats SET total_orders = total_orders + p_delta WHERE id = 1;
+
+    INSERT INTO t_p55547046_creative_ai_hub.admin_stats_daily (day, orders)
+    VALUES (DATE(p_created_at), p_delta)
+    ON CONFLICT (day) DO UPDATE SET orders = admin_stats_daily.orders + EXCLUDED.orders;
+
+    IF p_user_id IS NULL THEN
+        RETURN;
+    END IF;
+
+    UPDATE t_p55547046_creative_ai_hub.users SET order_count = order_count + p_delta WHERE id = p_user_id;
+
+    INSERT INTO t_p55547046_creative_ai_hub.admin_stats_order_users (user_id, order_count)
+    VALUES (p_user_id, p_delta)
+    ON CONFLICT (user_id) DO UPDATE SET order_count = admin_stats_order_users.order_count + EXCLUDED.order_count
+    RETURNING order_count INTO user_orders;
+
+    IF p_delta > 0 AND user_orders = p_delta THEN
+        UPDATE t_p55547046_creative_ai_hub.admin_stats SET active_users = active_users + 1 WHERE id = 1;
+    ELSIF user_orders <= 0 THEN
+        DELETE FROM t_p55547046_creative_ai_hub.admin_stats_order_users WHERE user_id = p_user_id;
+        UPDATE t_p55547046_creative_ai_hub.admin_stats SET active_users = active_users - 1 WHERE id = 1;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p55547046_creative_ai_hub.admin_stats_apply_chat(p_user_email VARCHAR, p_service_name VARCHAR, p_delta INTEGER)
+RETURNS VOID AS $$
+DECLARE
+    user_chats BIGINT;
+BEGIN
+    UPDATE t_p55547046_creative_ai_hub.admin_stats SET total_chats = total_chats + p_delta WHERE id = 1;
+
+    INSERT INTO t_p55547046_creative_ai_hub.admin_stats_services (service_name, chat_count)
+    VALUES (p_service_name, p_delta)
+    ON CONFLICT (service_name) DO UPDATE SET chat_count = admin_stats_services.chat_count + EXCLUDED.chat_count;
+
+    UPDATE t_p55547046_creative_ai_hub.users SET chat_count = chat_count + p_delta WHERE email = p_user_email;
+
+    INSERT INTO t_p55547046_creative_ai_hub.admin_stats_chat_users (user_email, chat_count)
+    VALUES (p_user_email, p_delta)
+    ON CONFLICT (user_email) DO UPDATE SET chat_count = admin_stats_chat_users.chat_count + EXCLUDED.chat_count
+    RETURNING chat_count INTO user_chats;
+
+    IF p_delta > 0 AND user_chats = p_delta THEN
+        UPDATE t_p55547046_creative_ai_hub.admin_stats SET chat_users = chat_users + 1 WHERE id = 1;
+    ELSIF user_chats <= 0 THEN
+        DELETE FROM t_p55547046_creative_ai_hub.admin_stats_chat_users WHERE user_email = p_user_email;
+        UPDATE t_p55547046_creative_ai_hub.admin_stats SET chat_users = chat_users - 1 WHERE id = 1;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Пересчёт счётчиков пользователей из таблиц снимка; вызывается после admin_stats_rebuild()
+CREATE OR REPLACE FUNCTION t_p55547046_creative_ai_hub.admin_stats_rebuild_users()
+RETURNS VOID AS $$
+BEGIN
+    UPDATE t_p55547046_creative_ai_hub.users u
+    SET order_count = COALESCE(o.order_count, 0), chat_count = COALESCE(c.chat_count, 0)
+    FROM t_p55547046_creative_ai_hub.users x
+    LEFT JOIN t_p55547046_creative_ai_hub.admin_stats_order_users o ON o.user_id = x.id
+    LEFT JOIN t_p55547046_creative_ai_hub.admin_stats_chat_users c ON c.user_email = x.email
+    WHERE u.id = x.id
+      AND (u.order_count, u.chat_count) IS DISTINCT FROM (COALESCE(o.order_count, 0), COALESCE(c.chat_count, 0));
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT t_p55547046_creative_ai_hub.admin_stats_rebuild_users();
@@ -0,0 +1,3 @@
+-- Фильтр выгрузки по диапазону дат
+CREATE INDEX IF NOT EXISTS idx_orders_created_at ON t_p55547046_creative_ai_hub.orders(created_at);
+CREATE INDEX IF NOT EXISTS idx_payment_transactions_created_at ON t_p55547046_creative_ai_hub.payment_transactions(created_at);
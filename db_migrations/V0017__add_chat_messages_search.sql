@@ -0,0 +1,7 @@
+-- Полнотекстовый поиск по сообщениям: вектор вычисляется при вставке, поэтому индекс обновляется построчно.
+-- Конфигурация russian стеммит кириллицу русским стеммером, а латиницу — английским (english_stem).
+ALTER TABLE t_p55547046_creative_ai_hub.chat_messages
+    ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (to_tsvector('russian', content)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_chat_messages_search
+    ON t_p55547046_creative_ai_hub.chat_messages USING GIN (search_vector);
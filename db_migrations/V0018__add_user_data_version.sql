@@ -0,0 +1,36 @@
+-- Версия данных пользователя для ETag: профиль, заказы и история отдают 304, пока она не изменилась
+ALTER TABLE t_p55547046_creative_ai_hub.users ADD COLUMN IF NOT EXISTS data_version BIGINT NOT NULL DEFAULT 0;
+
+-- Любое изменение строки пользователя (баланс, роль, счётчики заказов и чатов) поднимает версию
+CREATE OR REPLACE FUNCTION t_p55547046_creative_ai_hub.users_bump_data_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.data_version := OLD.data_version + 1;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Заказ меняет ответы профиля и истории, даже если счётчик заказов остался прежним (статус, результат)
+CREATE OR REPLACE FUNCTION t_p55547046_creative_ai_hub.orders_bump_user_data_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.user_id IS NOT NULL THEN
+        UPDATE t_p55547046_creative_ai_hub.users SET data_version = data_version + 1 WHERE id = OLD.user_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.user_id IS NOT NULL
+       AND (TG_OP = 'INSERT' OR NEW.user_id IS DISTINCT FROM OLD.user_id) THEN
+        UPDATE t_p55547046_creative_ai_hub.users SET data_version = data_version + 1 WHERE id = NEW.user_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_data_version ON t_p55547046_creative_ai_hub.users;
+CREATE TRIGGER users_data_version
+    BEFORE UPDATE ON t_p55547046_creative_ai_hub.users
+    FOR EACH ROW EXECUTE FUNCTION t_p55547046_creative_ai_hub.users_bump_data_version();
+
+DROP TRIGGER IF EXISTS orders_user_data_version ON t_p55547046_creative_ai_hub.orders;
+CREATE TRIGGER orders_user_data_version
+    AFTER INSERT OR UPDATE OR DELETE ON t_p55547046_creative_ai_hub.orders
+    FOR EACH ROW EXECUTE FUNCTION t_p55547046_creative_ai_hub.orders_bump_user_data_version();
@@ -0,0 +1,146 @@
+-- Журнал движения токенов: каждое начисление, списание и резерв — отдельная строка.
+-- users.credits остаётся проекцией доступного баланса (журнал минус активные резервы),
+-- поэтому все чтения баланса работают как раньше; users.credits_held — сумма активных резервов
+CREATE TABLE IF NOT EXISTS t_p55547046_creative_ai_hub.credit_ledger (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES t_p55547046_creative_ai_hub.users(id),
+    amount INTEGER NOT NULL,
+    -- Причина: opening, purchase, admin, manual, chat, generation
+    kind VARCHAR(20) NOT NULL,
+    -- held — резерв под генерацию, posted — проведено, released — резерв снят без списания
+    status VARCHAR(10) NOT NULL DEFAULT 'posted',
+    reference VARCHAR(255),
+    expires_at TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    settled_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_credit_ledger_user_created
+    ON t_p55547046_creative_ai_hub.credit_ledger(user_id, created_at DESC);
+
+-- Подметание просроченных резервов читает только активные строки
+CREATE INDEX IF NOT EXISTS idx_credit_ledger_held_expires
+    ON t_p55547046_creative_ai_hub.credit_ledger(expires_at) WHERE status = 'held';
+
+-- Один платёж YooKassa начисляет токены ровно один раз, даже если webhook и проверка придут одновременно
+CREATE UNIQUE INDEX IF NOT EXISTS idx_credit_ledger_purchase_reference
+    ON t_p55547046_creative_ai_hub.credit_ledger(reference) WHERE kind = 'purchase';
+
+ALTER TABLE t_p55547046_creative_ai_hub.users ADD COLUMN IF NOT EXISTS credits_held INTEGER NOT NULL DEFAULT 0;
+
+-- Текущие балансы переносим в журнал входящими остатками
+INSERT INTO t_p55547046_creative_ai_hub.credit_ledger (user_id, amount, kind, reference)
+SELECT id, credits, 'opening', 'V0019'
+FROM t_p55547046_creative_ai_hub.users
+WHERE credits <> 0
+  AND NOT EXISTS (SELECT 1 FROM t_p55547046_creative_ai_hub.credit_ledger WHERE kind = 'opening');
+
+-- Пользователь, созданный сразу с ненулевым балансом, тоже получает входящий остаток в журнале
+CREATE OR REPLACE FUNCTION t_p55547046_creative_ai_hub.users_open_credit_ledger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.credits <> 0 THEN
+        INSERT INTO t_p55547046_creative_ai_hub.credit_ledger (user_id, amount, kind)
+        VALUES (NEW.id, NEW.credits, 'opening');
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_credit_ledger_opening ON t_p55547046_creative_ai_hub.users;
+CREATE TRIGGER users_credit_ledger_opening
+    AFTER INSERT ON t_p55547046_creative_ai_hub.users
+    FOR EACH ROW EXECUTE FUNCTION t_p55547046_creative_ai_hub.users_open_credit_ledger();
+
+-- Проведение: начисление или безусловное списание, баланс не уходит в минус. NULL — пользователя нет или не хватает токенов
+CREATE OR REPLACE FUNCTION t_p55547046_creative_ai_hub.credit_post(
+    p_user_id INTEGER, p_amount INTEGER, p_kind VARCHAR, p_reference VARCHAR DEFAULT NULL)
+RETURNS INTEGER AS $$
+    WITH credited AS (
+        UPDATE t_p55547046_creative_ai_hub.users SET credits = credits + p_amount
+        WHERE id = p_user_id AND credits + p_amount >= 0
+        RETURNING id, credits
+    ), entry AS (
+        INSERT INTO t_p55547046_creative_ai_hub.credit_ledger (user_id, amount, kind, reference)
+        SELECT id, p_amount, p_kind, p_reference FROM credited
+    )
+    SELECT credits FROM credited;
+$$ LANGUAGE sql;
+
+-- Резерв: условное атомарное удержание под генерацию. Возвращает id резерва или NULL, если токенов не хватает
+CREATE OR REPLACE FUNCTION t_p55547046_creative_ai_hub.credit_reserve(
+    p_user_id INTEGER, p_amount INTEGER, p_kind VARCHAR, p_reference VARCHAR, p_ttl_seconds INTEGER)
+RETURNS BIGINT AS $$
+    WITH held AS (
+        UPDATE t_p55547046_creative_ai_hub.users
+        SET credits = credits - p_amount, credits_held = credits_held + p_amount
+        WHERE id = p_user_id AND credits >= p_amount
+        RETURNING id
+    ), entry AS (
+        INSERT INTO t_p55547046_creative_ai_hub.credit_ledger (user_id, amount, kind, status, reference, expires_at)
+        SELECT id, -p_amount, p_kind, 'held', p_reference, LOCALTIMESTAMP + p_ttl_seconds * INTERVAL '1 second'
+        FROM held
+        RETURNING id
+    )
+    SELECT id FROM entry;
+$$ LANGUAGE sql;
+
+-- Подтверждение резерва после успешной генерации; возвращает доступный баланс или NULL, если резерв уже снят
+CREATE OR REPLACE FUNCTION t_p55547046_creative_ai_hub.credit_commit(p_hold_id BIGINT)
+RETURNS INTEGER AS $$
+    WITH settled AS (
+        UPDATE t_p55547046_creative_ai_hub.credit_ledger
+        SET status = 'posted', settled_at = LOCALTIMESTAMP
+        WHERE id = p_hold_id AND status = 'held'
+        RETURNING user_id, amount
+    )
+    UPDATE t_p55547046_creative_ai_hub.users u
+    SET credits_held = u.credits_held + s.amount
+    FROM settled s
+    WHERE u.id = s.user_id
+    RETURNING u.credits;
+$$ LANGUAGE sql;
+
+-- Снятие резерва, если генерация не удалась: токены возвращаются в доступный баланс
+CREATE OR REPLACE FUNCTION t_p55547046_creative_ai_hub.credit_release(p_hold_id BIGINT)
+RETURNS INTEGER AS $$
+    WITH released AS (
+        UPDATE t_p55547046_creative_ai_hub.credit_ledger
+        SET status = 'released', settled_at = LOCALTIMESTAMP
+        WHERE id = p_hold_id AND status = 'held'
+        RETURNING user_id, amount
+    )
+    UPDATE t_p55547046_creative_ai_hub.users u
+    SET credits = u.credits - r.amount, credits_held = u.credits_held + r.amount
+    FROM released r
+    WHERE u.id = r.user_id
+    RETURNING u.credits;
+$$ LANGUAGE sql;
+
+-- Пачка просроченных резервов (функция упала между резервом и подтверждением) снимается за один запрос.
+-- SKIP LOCKED: параллельные подметальщики и подтверждения не ждут друг друга
+CREATE OR REPLACE FUNCTION t_p55547046_creative_ai_hub.credit_sweep_holds(p_batch_size INTEGER)
+RETURNS INTEGER AS $$
+    WITH expired AS (
+        SELECT id FROM t_p55547046_creative_ai_hub.credit_ledger
+        WHERE status = 'held' AND expires_at < LOCALTIMESTAMP
+        ORDER BY expires_at
+        LIMIT p_batch_size
+        FOR UPDATE SKIP LOCKED
+    ), released AS (
+        UPDATE t_p55547046_creative_ai_hub.credit_ledger l
+        SET status = 'released', settled_at = LOCALTIMESTAMP
+        FROM expired e
+        WHERE l.id = e.id
+        RETURNING l.user_id, l.amount
+    ), per_user AS (
+        SELECT user_id, SUM(amount)::int AS amount, COUNT(*) AS holds FROM released GROUP BY user_id
+    ), restored AS (
+        UPDATE t_p55547046_creative_ai_hub.users u
+        SET credits = u.credits - p.amount, credits_held = u.credits_held + p.amount
+        FROM per_user p
+        WHERE u.id = p.user_id
+        RETURNING p.holds
+    )
+    SELECT COALESCE(SUM(holds), 0)::int FROM restored;
+$$ LANGUAGE sql;
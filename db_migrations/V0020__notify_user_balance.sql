@@ -0,0 +1,22 @@
+-- Сигнал об изменении баланса или роли: процессы функции credits сбрасывают свой кеш по email из payload.
+-- Одинаковые уведомления в одной транзакции Postgres схлопывает, поэтому резерв и подтверждение не плодят лишних сигналов
+CREATE OR REPLACE FUNCTION t_p55547046_creative_ai_hub.users_notify_balance()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND (NEW.email, NEW.credits, NEW.role) IS NOT DISTINCT FROM (OLD.email, OLD.credits, OLD.role) THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_notify('user_balance', OLD.email);
+    END IF;
+    IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.email IS DISTINCT FROM OLD.email) THEN
+        PERFORM pg_notify('user_balance', NEW.email);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_balance_notify ON t_p55547046_creative_ai_hub.users;
+CREATE TRIGGER users_balance_notify
+    AFTER INSERT OR UPDATE OR DELETE ON t_p55547046_creative_ai_hub.users
+    FOR EACH ROW EXECUTE FUNCTION t_p55547046_creative_ai_hub.users_notify_balance();
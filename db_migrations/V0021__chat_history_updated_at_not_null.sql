@@ -0,0 +1,9 @@
+-- Ключ списка чатов (updated_at, id) не работает с NULL: такие чаты выпадают из сравнения
+-- в keyset-пагинации, а курсор по ним не строится. Старые строки получают дату создания,
+-- а если нет и её, текущее время (при сортировке DESC NULL и так шли первыми)
+UPDATE t_p55547046_creative_ai_hub.chat_history
+SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP)
+WHERE updated_at IS NULL;
+
+ALTER TABLE t_p55547046_creative_ai_hub.chat_history ALTER COLUMN updated_at SET DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE t_p55547046_creative_ai_hub.chat_history ALTER COLUMN updated_at SET NOT NULL;
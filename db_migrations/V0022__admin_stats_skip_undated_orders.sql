@@ -0,0 +1,34 @@
+-- Заказ без created_at ронял триггер: NULL попадал в первичный ключ admin_stats_daily, и вставка
+-- заказа откатывалась. Такой заказ идёт в общие счётчики, но не в разбивку по дням, как и в admin_stats_rebuild
+CREATE OR REPLACE FUNCTION t_p55547046_creative_ai_hub.admin_stats_apply_order(p_user_id INTEGER, p_created_at TIMESTAMP, p_delta INTEGER)
+RETURNS VOID AS $$
+DECLARE
+    user_orders BIGINT;
+BEGIN
+    UPDATE t_p55547046_creative_ai_hub.admin_stats SET total_orders = total_orders + p_delta WHERE id = 1;
+
+    IF p_created_at IS NOT NULL THEN
+        INSERT INTO t_p55547046_creative_ai_hub.admin_stats_daily (day, orders)
+        VALUES (DATE(p_created_at), p_delta)
+        ON CONFLICT (day) DO UPDATE SET orders = admin_stats_daily.orders + EXCLUDED.orders;
+    END IF;
+
+    IF p_user_id IS NULL THEN
+        RETURN;
+    END IF;
+
+    UPDATE t_p55547046_creative_ai_hub.users SET order_count = order_count + p_delta WHERE id = p_user_id;
+
+    INSERT INTO t_p55547046_creative_ai_hub.admin_stats_order_users (user_id, order_count)
+    VALUES (p_user_id, p_delta)
+    ON CONFLICT (user_id) DO UPDATE SET order_count = admin_stats_order_users.order_count + EXCLUDED.order_count
+    RETURNING order_count INTO user_orders;
+
+    IF p_delta > 0 AND user_orders = p_delta THEN
+        UPDATE t_p55547046_creative_ai_hub.admin_stats SET active_users = active_users + 1 WHERE id = 1;
+    ELSIF user_orders <= 0 THEN
+        DELETE FROM t_p55547046_creative_ai_hub.admin_stats_order_users WHERE user_id = p_user_id;
+        UPDATE t_p55547046_creative_ai_hub.admin_stats SET active_users = active_users - 1 WHERE id = 1;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
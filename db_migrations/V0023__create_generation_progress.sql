@@ -0,0 +1,12 @@
+-- Частичный ответ модели, пока идёт генерация: функция дописывает его по мере прихода текста,
+-- клиент забирает опросом GET ?stream_id=... (шлюз функций не отдаёт тело ответа по частям)
+CREATE TABLE IF NOT EXISTS t_p55547046_creative_ai_hub.generation_progress (
+    stream_id VARCHAR(100) PRIMARY KEY,
+    user_email VARCHAR(255) NOT NULL,
+    text TEXT NOT NULL DEFAULT '',
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Строки оборванных генераций удаляются по возрасту при завершении следующей
+CREATE INDEX IF NOT EXISTS idx_generation_progress_updated_at
+    ON t_p55547046_creative_ai_hub.generation_progress(updated_at);
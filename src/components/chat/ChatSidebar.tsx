@@ -1,4 +1,4 @@
-import { useState } from 'react';
+import { useEffect, useState } from 'react';
 import { Button } from '@/components/ui/button';
 import Icon from '@/components/ui/icon';
 import { Input } from '@/components/ui/input';
@@ -11,6 +11,10 @@ interface ChatHistoryItem {
   updated_at: string;
 }
 
+interface ChatSearchResult extends ChatHistoryItem {
+  snippet: string;
+}
+
 interface ChatSidebarProps {
   isSidebarOpen: boolean;
   setIsSidebarOpen: (open: boolean) => void;
@@ -19,8 +23,22 @@ interface ChatSidebarProps {
   startNewChat: () => void;
   loadChat: (chatId: string) => void;
   deleteChat: (chatId: string) => void;
+  hasMoreChats?: boolean;
+  loadMoreChats?: () => void;
+  searchChats?: (query: string) => Promise<ChatSearchResult[]>;
 }
 
+const renderSnippet = (snippet: string) =>
+  snippet.split(/(<mark>.*?<\/mark>)/g).map((part, index) =>
+    part.startsWith('<mark>') ? (
+      <mark key={index} className="bg-primary/20 text-foreground rounded-sm">
+        {part.slice(6, -7)}
+      </mark>
+    ) : (
+      part
+    )
+  );
+
 export default function ChatSidebar({
   isSidebarOpen,
   setIsSidebarOpen,
@@ -28,14 +46,37 @@ export default function ChatSidebar({
   currentChatId,
   startNewChat,
   loadChat,
-  deleteChat
+  deleteChat,
+  hasMoreChats,
+  loadMoreChats,
+  searchChats
 }: ChatSidebarProps) {
   const [searchQuery, setSearchQuery] = useState('');
+  const [searchResults, setSearchResults] = useState<ChatSearchResult[]>([]);
   
   const filteredHistory = chatHistory.filter(chat => 
     chat.chat_title.toLowerCase().includes(searchQuery.toLowerCase()) ||
     chat.service_name.toLowerCase().includes(searchQuery.toLowerCase())
   );
+  const titleMatches = new Set(filteredHistory.map(chat => chat.chat_id));
+  const messageMatches = searchResults.filter(result => !titleMatches.has(result.chat_id));
+
+  useEffect(() => {
+    const query = searchQuery.trim();
+    if (!searchChats || query.length < 2) {
+      setSearchResults([]);
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      const results = await searchChats(query);
+      if (!cancelled) setSearchResults(results);
+    }, 300);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchQuery]);
   
   return (
     <>
@@ -68,7 +109,7 @@ export default function ChatSidebar({
           <Icon name="Plus" size={16} className="mr-2" />
           Новый чат
         </Button>
-        {filteredHistory.length === 0 && searchQuery && (
+        {filteredHistory.length === 0 && messageMatches.length === 0 && searchQuery && (
           <div className="text-center text-sm text-muted-foreground py-4">
             Ничего не найдено
           </div>
@@ -96,6 +137,30 @@ export default function ChatSidebar({
             </Button>
           </div>
         ))}
+        {messageMatches.length > 0 && (
+          <div className="text-xs text-muted-foreground px-2 pt-2 pb-1">В сообщениях</div>
+        )}
+        {messageMatches.map((result) => (
+          <Button
+            key={result.chat_id}
+            variant={currentChatId === result.chat_id ? 'secondary' : 'ghost'}
+            className="w-full justify-start text-left h-auto py-2 mb-2"
+            size="sm"
+            onClick={() => loadChat(result.chat_id)}
+          >
+            <div className="flex-1 min-w-0">
+              <div className="truncate">{result.chat_title}</div>
+              <div className="text-xs text-muted-foreground whitespace-normal line-clamp-2">
+                {renderSnippet(result.snippet)}
+              </div>
+            </div>
+          </Button>
+        ))}
+        {hasMoreChats && loadMoreChats && !searchQuery && (
+          <Button onClick={loadMoreChats} variant="ghost" className="w-full text-muted-foreground" size="sm">
+            Показать ещё
+          </Button>
+        )}
       </div>
     </div>
     </>
@@ -0,0 +1,43 @@
+import { useEffect, useRef } from 'react';
+
+const CREDITS_URL = 'https://functions.poehali.dev/62237982-f08c-4d74-99d7-28201bfc5f93';
+const BALANCE_WAIT_SECONDS = 25;
+const RETRY_DELAY_MS = 5000;
+
+// Long-poll баланса вместо опросов: функция credits держит запрос, пока баланс не станет отличаться от since
+// (её будит NOTIFY из БД при оплате, списании или правке админом), или до таймаута — тогда запрос повторяется
+export const useBalanceWatch = (email: string | null | undefined, onBalance: (credits: number) => void) => {
+  const onBalanceRef = useRef(onBalance);
+  onBalanceRef.current = onBalance;
+
+  useEffect(() => {
+    if (!email) return;
+    const controller = new AbortController();
+
+    const watch = async () => {
+      let since: number | null = null;
+      while (!controller.signal.aborted) {
+        try {
+          const params = new URLSearchParams({ email });
+          if (since !== null) {
+            params.set('since', String(since));
+            params.set('wait', String(BALANCE_WAIT_SECONDS));
+          }
+          const response = await fetch(`${CREDITS_URL}?${params}`, { signal: controller.signal });
+          if (!response.ok) throw new Error(`credits failed: ${response.status}`);
+          const data = await response.json();
+          const credits = data.credits || 0;
+          if (credits !== since) onBalanceRef.current(credits);
+          since = credits;
+        } catch (error) {
+          if (controller.signal.aborted) return;
+          console.error('Error watching balance:', error);
+          await new Promise(resolve => setTimeout(resolve, RETRY_DELAY_MS));
+        }
+      }
+    };
+
+    watch();
+    return () => controller.abort();
+  }, [email]);
+};
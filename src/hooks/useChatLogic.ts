@@ -1,6 +1,7 @@
 import { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { toast } from '@/hooks/use-toast';
+import { useBalanceWatch } from '@/hooks/useBalanceWatch';
 
 interface ChatHistoryItem {
   id: number;
@@ -10,12 +11,21 @@ interface ChatHistoryItem {
   updated_at: string;
 }
 
+interface ChatSearchResult extends ChatHistoryItem {
+  rank: number;
+  matches: number;
+  snippet: string;
+}
+
 interface Service {
   id: number;
   name: string;
   tokens: number;
 }
 
+// Как часто спрашивать у simple-chat готовую часть ответа, пока идёт генерация
+const STREAM_POLL_INTERVAL_MS = 500;
+
 export const useChatLogic = (services: Service[]) => {
   const navigate = useNavigate();
   const [message, setMessage] = useState('');
@@ -25,6 +35,7 @@ export const useChatLogic = (services: Service[]) => {
   const [userTokens, setUserTokens] = useState(0);
   const [user, setUser] = useState<any>(null);
   const [chatHistory, setChatHistory] = useState<ChatHistoryItem[]>([]);
+  const [hasMoreChats, setHasMoreChats] = useState(false);
   const [currentChatId, setCurrentChatId] = useState<string>('');
   const [isSidebarOpen, setIsSidebarOpen] = useState(false);
   const [deepThinkMode, setDeepThinkMode] = useState(false);
@@ -37,14 +48,18 @@ export const useChatLogic = (services: Service[]) => {
   const [chatTitle, setChatTitle] = useState('Новый чат');
   const fileInputRef = useRef<HTMLInputElement>(null);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  const chatSyncRef = useRef<{ email: string | null; token: string | null; nextCursor: string | null }>({
+    email: null,
+    token: null,
+    nextCursor: null
+  });
 
   useEffect(() => {
     const userData = localStorage.getItem('user');
     if (userData) {
       const parsed = JSON.parse(userData);
       setUser(parsed);
-      loadUserTokens(parsed.email);
-      loadChatHistory(parsed.email);
+      loadBootstrap(parsed.email);
       
       // Загружаем последний чат из localStorage или создаем новый
       const savedChatId = localStorage.getItem('currentChatId');
@@ -57,22 +72,38 @@ export const useChatLogic = (services: Service[]) => {
     }
   }, []);
 
+  // Баланс приходит сам: оплата, списание за ответ или правка админом видны сразу, без повторных запросов
+  useBalanceWatch(user?.email, setUserTokens);
+
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   }, [messages, streamingThinking, streamingAnswer, isLoading, isThinking, isStreaming]);
 
-  // Автосохранение чата при изменении сообщений
+  // Автосохранение чата в localStorage при изменении сообщений. На сервер ход пишет один писатель:
+  // simple-chat сохраняет свои ходы сам, ходы ai-genius дописывает appendChatTurn
   useEffect(() => {
     if (messages.length > 0 && user) {
-      const saveAndUpdate = async () => {
-        await saveCurrentChat();
-        // Обновляем историю чатов сразу после сохранения
-        await loadChatHistory(user.email);
-      };
-      saveAndUpdate();
+      saveCurrentChat();
     }
   }, [messages]);
 
+  // Баланс и первая страница чатов одним запросом вместо двух отдельных функций
+  const loadBootstrap = async (email: string) => {
+    try {
+      const response = await fetch(`https://functions.poehali.dev/bd2ef983-d2f1-479f-af1a-8b0e969e7194?email=${encodeURIComponent(email)}&sections=chats`);
+      if (!response.ok) throw new Error(`bootstrap failed: ${response.status}`);
+      const data = await response.json();
+      setUserTokens(data.user?.credits || 0);
+      setChatHistory(data.chats?.chats || []);
+      chatSyncRef.current = { email, token: data.chats?.sync_token || null, nextCursor: data.chats?.next_cursor || null };
+      setHasMoreChats(Boolean(data.chats?.next_cursor));
+    } catch (error) {
+      console.error('Error loading bootstrap:', error);
+      loadUserTokens(email);
+      loadChatHistory(email);
+    }
+  };
+
   const loadUserTokens = async (email: string) => {
     try {
       const response = await fetch(`https://functions.poehali.dev/62237982-f08c-4d74-99d7-28201bfc5f93?email=${email}`);
@@ -85,22 +116,78 @@ export const useChatLogic = (services: Service[]) => {
 
   const loadChatHistory = async (email: string) => {
     try {
+      // После первой загрузки запрашиваем только изменения с прошлой синхронизации
+      const sync = chatSyncRef.current;
+      if (sync.email === email && sync.token) {
+        const response = await fetch(`https://functions.poehali.dev/fe56fd27-64b0-450b-85d7-9bdd0da6b5ea?updated_since=${encodeURIComponent(sync.token)}`, {
+          headers: { 'X-User-Email': email }
+        });
+        const data = await response.json();
+        if (data.success && !data.full_resync) {
+          const changed: ChatHistoryItem[] = data.chats || [];
+          const removed = new Set<string>([...(data.deleted || []), ...changed.map(c => c.chat_id)]);
+          setChatHistory(prev => [...changed, ...prev.filter(c => !removed.has(c.chat_id))]
+            .sort((a, b) => (a.updated_at < b.updated_at ? 1 : a.updated_at > b.updated_at ? -1 : b.id - a.id)));
+          chatSyncRef.current = { ...sync, token: data.sync_token };
+          return;
+        }
+      }
+
       const response = await fetch('https://functions.poehali.dev/fe56fd27-64b0-450b-85d7-9bdd0da6b5ea', {
         headers: { 'X-User-Email': email }
       });
       const data = await response.json();
       if (data.success) {
         setChatHistory(data.chats || []);
+        chatSyncRef.current = { email, token: data.sync_token || null, nextCursor: data.next_cursor || null };
+        setHasMoreChats(Boolean(data.next_cursor));
       }
     } catch (error) {
       console.error('Error loading chat history:', error);
     }
   };
 
-  const saveCurrentChat = async () => {
+  const loadMoreChats = async () => {
+    const sync = chatSyncRef.current;
+    if (!user || !sync.nextCursor) return;
+    
+    try {
+      const response = await fetch(`https://functions.poehali.dev/fe56fd27-64b0-450b-85d7-9bdd0da6b5ea?cursor=${encodeURIComponent(sync.nextCursor)}`, {
+        headers: { 'X-User-Email': user.email }
+      });
+      const data = await response.json();
+      if (data.success) {
+        const older: ChatHistoryItem[] = data.chats || [];
+        setChatHistory(prev => {
+          const known = new Set(prev.map(c => c.chat_id));
+          return [...prev, ...older.filter(c => !known.has(c.chat_id))];
+        });
+        chatSyncRef.current = { ...chatSyncRef.current, nextCursor: data.next_cursor || null };
+        setHasMoreChats(Boolean(data.next_cursor));
+      }
+    } catch (error) {
+      console.error('Error loading more chats:', error);
+    }
+  };
+
+  const searchChats = async (query: string): Promise<ChatSearchResult[]> => {
+    if (!user || !query.trim()) return [];
+    
+    try {
+      const response = await fetch(`https://functions.poehali.dev/fe56fd27-64b0-450b-85d7-9bdd0da6b5ea?q=${encodeURIComponent(query.trim())}`, {
+        headers: { 'X-User-Email': user.email }
+      });
+      const data = await response.json();
+      return data.success ? data.results || [] : [];
+    } catch (error) {
+      console.error('Error searching chats:', error);
+      return [];
+    }
+  };
+
+  const saveCurrentChat = () => {
     if (!user || messages.length === 0) return;
     
-    const service = services.find(s => s.id === selectedService);
     const userMsg = messages.find(m => m.role === 'user');
     const title = userMsg ? userMsg.content.slice(0, 50) : 'Новый чат';
     
@@ -110,9 +197,14 @@ export const useChatLogic = (services: Service[]) => {
       service_id: selectedService,
       chat_title: title
     }));
+  };
+
+  // Дописывает на сервер ход, который не сохранила функция-ответчик (ai-genius историю чата не ведёт)
+  const appendChatTurn = async (turn: Array<{ role: 'user' | 'assistant'; content: string; thinking?: string }>, title: string, serviceId: number, serviceName: string) => {
+    if (!user) return;
     
     try {
-      const response = await fetch('https://functions.poehali.dev/fe56fd27-64b0-450b-85d7-9bdd0da6b5ea', {
+      await fetch('https://functions.poehali.dev/fe56fd27-64b0-450b-85d7-9bdd0da6b5ea', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -121,15 +213,11 @@ export const useChatLogic = (services: Service[]) => {
         body: JSON.stringify({
           chat_id: currentChatId,
           chat_title: title,
-          service_id: selectedService,
-          service_name: service?.name || 'Чат',
-          messages: messages
+          service_id: serviceId,
+          service_name: serviceName,
+          append: turn
         })
       });
-      
-      if (response.ok) {
-        await loadChatHistory(user.email);
-      }
     } catch (error) {
       console.error('Error saving chat:', error);
     }
@@ -278,11 +366,7 @@ export const useChatLogic = (services: Service[]) => {
     if (deepThinkMode) tokensNeeded += 2;
     if (attachedFiles.length > 0) tokensNeeded += attachedFiles.length * 1;
 
-    const creditsCheck = await fetch(`https://functions.poehali.dev/62237982-f08c-4d74-99d7-28201bfc5f93?email=${user.email}`);
-    const creditsData = await creditsCheck.json();
-    const currentBalance = creditsData.credits || 0;
-    
-    setUserTokens(currentBalance);
+    const currentBalance = userTokens;
 
     if (currentBalance < tokensNeeded) {
       toast({
@@ -361,6 +445,8 @@ export const useChatLogic = (services: Service[]) => {
 
       // Для специальных сервисов (генерация изображений, ИИ без границ) используем ai-genius
       const useAiGenius = [31, 32].includes(effectiveService);
+      const streamId = useAiGenius ? null : crypto.randomUUID();
+      const aiGeniusServiceName = effectiveService === 32 ? '🎨 Генерация изображений' : (service?.name || '');
       const apiUrl = useAiGenius 
         ? 'https://functions.poehali.dev/280ede35-32cc-4715-a89c-f76364702010'
         : 'https://functions.poehali.dev/db181a2b-b53b-404e-8551-881ec3ab1664';
@@ -368,7 +454,7 @@ export const useChatLogic = (services: Service[]) => {
       const requestBody = useAiGenius 
         ? {
             service_id: effectiveService,
-            service_name: effectiveService === 32 ? '🎨 Генерация изображений' : (service?.name || ''),
+            service_name: aiGeniusServiceName,
             input_text: userMessage,
             user_email: user?.email || '',
             deep_think: deepThinkMode,
@@ -382,17 +468,43 @@ export const useChatLogic = (services: Service[]) => {
             message: userMessage,
             chat_id: currentChatId,
             documents: documentsPayload,
-            deep_think: deepThinkMode
+            deep_think: deepThinkMode,
+            stream_id: streamId
           };
 
-      const response = await fetch(apiUrl, {
-        method: 'POST',
-        headers: { 
-          'Content-Type': 'application/json',
-          ...(user ? { 'X-User-Email': user.email } : {})
-        },
-        body: JSON.stringify(requestBody)
-      });
+      // Пока simple-chat генерирует, забираем уже готовую часть ответа опросом: шлюз отдаёт тело POST только целиком
+      let replyReceived = false;
+      let streamedAnswer = '';
+      const progressPoll = streamId ? setInterval(async () => {
+        try {
+          const progressResponse = await fetch(`${apiUrl}?stream_id=${encodeURIComponent(streamId)}`, {
+            headers: user ? { 'X-User-Email': user.email } : {}
+          });
+          const progress = await progressResponse.json();
+          if (!replyReceived && progress.text) {
+            streamedAnswer = progress.text;
+            setIsStreaming(true);
+            setStreamingAnswer(progress.text);
+          }
+        } catch (error) {
+          // Пропущенный опрос не страшен: полный ответ придёт в ответе на POST
+        }
+      }, STREAM_POLL_INTERVAL_MS) : null;
+
+      let response: Response;
+      try {
+        response = await fetch(apiUrl, {
+          method: 'POST',
+          headers: { 
+            'Content-Type': 'application/json',
+            ...(user ? { 'X-User-Email': user.email } : {})
+          },
+          body: JSON.stringify(requestBody)
+        });
+      } finally {
+        replyReceived = true;
+        if (progressPoll) clearInterval(progressPoll);
+      }
 
       const data = await response.json();
       
@@ -404,8 +516,8 @@ export const useChatLogic = (services: Service[]) => {
       console.log('📝 ТЕКСТ ОТВЕТА:', replyText);
 
       if (data.success && replyText) {
-        // Если есть thinking, показываем процесс размышления
-        if (data.thinking && deepThinkMode) {
+        // Если есть thinking, показываем процесс размышления (если ответ уже пошёл на экран — сразу с ним)
+        if (data.thinking && deepThinkMode && !streamedAnswer) {
           setIsThinking(true);
           setStreamingThinking('');
           
@@ -442,13 +554,16 @@ export const useChatLogic = (services: Service[]) => {
             .replace(/_(\d)/g, '$1');
         }
         
-        setIsStreaming(true);
-        setStreamingAnswer('');
-        
-        const answerWords = cleanedReply.split(' ');
-        for (let i = 0; i < answerWords.length; i++) {
-          await new Promise(resolve => setTimeout(resolve, 40));
-          setStreamingAnswer(answerWords.slice(0, i + 1).join(' '));
+        // Ответ, уже показанный по частям, не печатаем заново
+        if (!streamedAnswer) {
+          setIsStreaming(true);
+          setStreamingAnswer('');
+          
+          const answerWords = cleanedReply.split(' ');
+          for (let i = 0; i < answerWords.length; i++) {
+            await new Promise(resolve => setTimeout(resolve, 40));
+            setStreamingAnswer(answerWords.slice(0, i + 1).join(' '));
+          }
         }
         
         setIsStreaming(false);
@@ -462,17 +577,22 @@ export const useChatLogic = (services: Service[]) => {
         setMessages(prev => [...prev, finalMessage]);
         setStreamingAnswer('');
         
+        // simple-chat уже сохранил ход у себя; ход ai-genius дописываем явно, один раз
+        if (useAiGenius) {
+          const firstUserMessage = updatedMessages.find(m => m.role === 'user');
+          const title = firstUserMessage ? firstUserMessage.content.slice(0, 50) : 'Новый чат';
+          await appendChatTurn([newUserMessage, finalMessage], title, effectiveService, aiGeniusServiceName || 'Чат');
+        }
+        
         if (user) {
-          const balanceCheck = await fetch(`https://functions.poehali.dev/62237982-f08c-4d74-99d7-28201bfc5f93?email=${user.email}`);
-          const balanceData = await balanceCheck.json();
-          const newBalance = balanceData.credits || 0;
-          
-          setUserTokens(newBalance);
+          // Счётчик в шапке обновит useBalanceWatch по сигналу о списании; в уведомлении — ожидаемый остаток
+          const newBalance = data.credits_remaining ?? Math.max(0, currentBalance - tokensNeeded);
           
           toast({ 
             title: '✅ Готово!', 
             description: `Использовано ${tokensNeeded} AI-токенов. Осталось: ${newBalance}` 
           });
+          await loadChatHistory(user.email);
         }
       } else {
         if (data.error && data.error.includes('Недостаточно токенов')) {
@@ -486,6 +606,9 @@ export const useChatLogic = (services: Service[]) => {
       toast({ title: 'Ошибка', description: 'Проблема с подключением', variant: 'destructive' });
     }
 
+    // Частичный ответ, показанный до ошибки, не должен остаться на экране
+    setIsStreaming(false);
+    setStreamingAnswer('');
     setIsLoading(false);
   };
 
@@ -499,6 +622,7 @@ export const useChatLogic = (services: Service[]) => {
     userTokens,
     user,
     chatHistory,
+    hasMoreChats,
     currentChatId,
     isSidebarOpen,
     setIsSidebarOpen,
@@ -516,6 +640,8 @@ export const useChatLogic = (services: Service[]) => {
     loadChat,
     startNewChat,
     deleteChat,
+    loadMoreChats,
+    searchChats,
     handleFileUpload,
     removeFile,
     handleSend
@@ -3,6 +3,7 @@ import { useNavigate } from 'react-router-dom';
 import Icon from '@/components/ui/icon';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
+import { Input } from '@/components/ui/input';
 import AnalyticsModal from '@/components/admin/AnalyticsModal';
 import UserDetailsModal from '@/components/admin/UserDetailsModal';
 
@@ -50,6 +51,12 @@ export default function AdminDashboard() {
   const navigate = useNavigate();
   const [orders, setOrders] = useState<Order[]>([]);
   const [users, setUsers] = useState<User[]>([]);
+  const [usersCursor, setUsersCursor] = useState<string | null>(null);
+  const [usersSort, setUsersSort] = useState<'created_at' | 'credits' | 'activity'>('created_at');
+  const [usersRole, setUsersRole] = useState('');
+  const [usersEmailPrefix, setUsersEmailPrefix] = useState('');
+  const [usersLoading, setUsersLoading] = useState(false);
+  const [exporting, setExporting] = useState<string | null>(null);
   const [payments, setPayments] = useState<Payment[]>([]);
   const [stats, setStats] = useState<Stats>({ totalOrders: 0, totalRevenue: 0, activeUsers: 0, todayOrders: 0 });
   const [loading, setLoading] = useState(true);
@@ -92,7 +99,6 @@ export default function AdminDashboard() {
       
       setStats(data.stats || { totalOrders: 0, totalRevenue: 0, activeUsers: 0, todayOrders: 0 });
       setOrders(data.orders || []);
-      setUsers(data.users || []);
       setPayments(data.payments || []);
     } catch (error) {
       console.error('Error loading admin data:', error);
@@ -100,6 +106,69 @@ export default function AdminDashboard() {
     setLoading(false);
   };
 
+  const fetchUsers = async (params: Record<string, string>) => {
+    const query = new URLSearchParams({ view: 'users', ...params });
+    const response = await fetch(`https://functions.poehali.dev/ca9c3300-579b-497d-b39f-c67c3ac67a03?${query.toString()}`);
+    return response.json();
+  };
+
+  const loadUsers = async (cursor: string | null = null) => {
+    setUsersLoading(true);
+    try {
+      const params: Record<string, string> = { sort: usersSort, order: 'desc' };
+      if (usersRole) params.role = usersRole;
+      if (usersEmailPrefix.trim()) params.email_prefix = usersEmailPrefix.trim();
+      if (cursor) params.cursor = cursor;
+      const data = await fetchUsers(params);
+      const page: User[] = data.users || [];
+      setUsers(prev => (cursor ? [...prev, ...page] : page));
+      setUsersCursor(data.next_cursor || null);
+    } catch (error) {
+      console.error('Error loading users:', error);
+    }
+    setUsersLoading(false);
+  };
+
+  useEffect(() => {
+    if (activeTab !== 'users') return;
+    const timer = setTimeout(() => loadUsers(), 300);
+    return () => clearTimeout(timer);
+  }, [activeTab, usersSort, usersRole, usersEmailPrefix]);
+
+  const refreshData = async () => {
+    await loadData();
+    if (activeTab === 'users') {
+      await loadUsers();
+    }
+  };
+
+  const exportTable = async (table: 'orders' | 'payments' | 'users') => {
+    setExporting(table);
+    try {
+      // Сервер отдаёт выгрузку частями: следующую часть запрашиваем по X-Export-Cursor
+      const chunks: string[] = [];
+      let cursor: string | null = null;
+      do {
+        const query = new URLSearchParams({ view: 'export', table, format: 'csv' });
+        if (cursor) query.set('cursor', cursor);
+        const response = await fetch(`https://functions.poehali.dev/ca9c3300-579b-497d-b39f-c67c3ac67a03?${query.toString()}`);
+        if (!response.ok) throw new Error(`Export failed: ${response.status}`);
+        chunks.push(await response.text());
+        cursor = response.headers.get('X-Export-Cursor');
+      } while (cursor);
+
+      const url = URL.createObjectURL(new Blob(chunks, { type: 'text/csv;charset=utf-8' }));
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = `${table}-${new Date().toISOString().slice(0, 10)}.csv`;
+      link.click();
+      URL.revokeObjectURL(url);
+    } catch (error) {
+      console.error('Error exporting data:', error);
+    }
+    setExporting(null);
+  };
+
   const handleLogout = () => {
     localStorage.removeItem('user');
     navigate('/login');
@@ -127,7 +196,9 @@ export default function AdminDashboard() {
             <Button 
               onClick={async () => {
                 const user = JSON.parse(localStorage.getItem('user') || '{}');
-                const adminUser = users.find(u => u.email === user.email);
+                if (!user.email) return;
+                const data = await fetchUsers({ email_prefix: user.email, limit: '5' });
+                const adminUser = (data.users || []).find((u: User) => u.email === user.email);
                 if (adminUser) {
                   openUserDetails(adminUser);
                 }
@@ -213,7 +284,7 @@ export default function AdminDashboard() {
             }`}
           >
             <Icon name="Users" size={20} className="inline mr-2" />
-            Пользователи ({users.length})
+            Пользователи
           </button>
           <button
             onClick={() => setActiveTab('payments')}
@@ -242,19 +313,56 @@ export default function AdminDashboard() {
           user={selectedUser}
           orders={orders}
           payments={payments}
-          onCreditsUpdate={loadData}
+          onCreditsUpdate={refreshData}
         />
 
         {/* Таб: Пользователи */}
         {activeTab === 'users' && (
           <Card className="bg-white/10 backdrop-blur-lg border-white/20">
-            <CardHeader>
+            <CardHeader className="flex flex-row items-center justify-between">
               <CardTitle className="text-2xl text-white flex items-center gap-2">
                 <Icon name="Users" size={24} />
                 Все пользователи
               </CardTitle>
+              <Button
+                size="sm"
+                variant="outline"
+                disabled={exporting !== null}
+                onClick={() => exportTable('users')}
+                className="bg-white/10 text-white hover:bg-white/20"
+              >
+                <Icon name="Download" size={16} className="mr-2" />
+                {exporting === 'users' ? 'Выгрузка...' : 'Экспорт CSV'}
+              </Button>
             </CardHeader>
             <CardContent>
+              <div className="flex flex-col sm:flex-row gap-3 mb-4">
+                <Input
+                  placeholder="Email начинается с..."
+                  value={usersEmailPrefix}
+                  onChange={(e) => setUsersEmailPrefix(e.target.value)}
+                  className="bg-white/10 border-white/20 text-white placeholder:text-white/50 sm:max-w-xs"
+                />
+                <select
+                  value={usersRole}
+                  onChange={(e) => setUsersRole(e.target.value)}
+                  className="bg-white/10 border border-white/20 text-white rounded-md px-3 py-2 text-sm"
+                >
+                  <option value="" className="text-black">Все роли</option>
+                  <option value="customer" className="text-black">Клиенты</option>
+                  <option value="director" className="text-black">Директора</option>
+                  <option value="admin" className="text-black">Админы</option>
+                </select>
+                <select
+                  value={usersSort}
+                  onChange={(e) => setUsersSort(e.target.value as typeof usersSort)}
+                  className="bg-white/10 border border-white/20 text-white rounded-md px-3 py-2 text-sm"
+                >
+                  <option value="created_at" className="text-black">Сначала новые</option>
+                  <option value="credits" className="text-black">По токенам</option>
+                  <option value="activity" className="text-black">По активности</option>
+                </select>
+              </div>
               <div className="overflow-x-auto">
                 <table className="w-full">
                   <thead>
@@ -305,6 +413,18 @@ export default function AdminDashboard() {
                   </tbody>
                 </table>
               </div>
+              {usersCursor && (
+                <div className="flex justify-center mt-4">
+                  <Button
+                    variant="outline"
+                    disabled={usersLoading}
+                    onClick={() => loadUsers(usersCursor)}
+                    className="bg-white/10 text-white hover:bg-white/20"
+                  >
+                    {usersLoading ? 'Загрузка...' : 'Загрузить ещё'}
+                  </Button>
+                </div>
+              )}
             </CardContent>
           </Card>
         )}
@@ -312,11 +432,21 @@ export default function AdminDashboard() {
         {/* Таб: Платежи */}
         {activeTab === 'payments' && (
           <Card className="bg-white/10 backdrop-blur-lg border-white/20">
-            <CardHeader>
+            <CardHeader className="flex flex-row items-center justify-between">
               <CardTitle className="text-2xl text-white flex items-center gap-2">
                 <Icon name="CreditCard" size={24} />
                 История платежей
               </CardTitle>
+              <Button
+                size="sm"
+                variant="outline"
+                disabled={exporting !== null}
+                onClick={() => exportTable('payments')}
+                className="bg-white/10 text-white hover:bg-white/20"
+              >
+                <Icon name="Download" size={16} className="mr-2" />
+                {exporting === 'payments' ? 'Выгрузка...' : 'Экспорт CSV'}
+              </Button>
             </CardHeader>
             <CardContent>
               <div className="overflow-x-auto">
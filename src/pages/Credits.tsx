@@ -1,9 +1,10 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import Icon from '@/components/ui/icon';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { toast } from '@/hooks/use-toast';
+import { useBalanceWatch } from '@/hooks/useBalanceWatch';
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from '@/components/ui/dialog';
 
 const creditPackages = [
@@ -21,6 +22,8 @@ export default function Credits() {
   const [loading, setLoading] = useState(true);
   const [purchasing, setPurchasing] = useState<number | null>(null);
   const [isDirector, setIsDirector] = useState(false);
+  const [userEmail, setUserEmail] = useState<string | null>(null);
+  const knownCreditsRef = useRef<number | null>(null);
 
   useEffect(() => {
     const user = localStorage.getItem('user');
@@ -31,28 +34,23 @@ export default function Credits() {
 
     const userData = JSON.parse(user);
     setIsDirector(userData.role === 'director');
-
-    loadCredits();
+    setUserEmail(userData.email);
   }, [navigate]);
 
-  const loadCredits = async () => {
-    const user = localStorage.getItem('user');
-    if (!user) return;
-
-    const userData = JSON.parse(user);
-
-    try {
-      const response = await fetch(
-        `https://functions.poehali.dev/62237982-f08c-4d74-99d7-28201bfc5f93?email=${userData.email}`
-      );
-      const data = await response.json();
-      setUserCredits(data.credits || 0);
-    } catch (error) {
-      console.error('Error loading credits:', error);
-    }
-
+  // Первый ответ — текущий баланс, дальше функция credits отвечает, как только баланс изменился:
+  // зачисление по webhook после оплаты видно сразу после возврата на страницу
+  useBalanceWatch(userEmail, (credits) => {
+    const previous = knownCreditsRef.current;
+    knownCreditsRef.current = credits;
+    setUserCredits(credits);
     setLoading(false);
-  };
+    if (previous !== null && credits > previous) {
+      toast({
+        title: '✅ Токены зачислены',
+        description: `Новый баланс: ${credits} AI-токенов`
+      });
+    }
+  });
 
   const handlePurchase = async (pkg: typeof creditPackages[0]) => {
     const user = localStorage.getItem('user');
@@ -196,6 +194,7 @@ export default function Credits() {
                     });
                     const data = await response.json();
                     if (data.success) {
+                      knownCreditsRef.current = data.credits;
                       setUserCredits(data.credits);
                       toast({
                         title: '✅ Баланс пополнен!',
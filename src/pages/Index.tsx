@@ -50,6 +50,7 @@ export default function Index() {
     userTokens,
     user,
     chatHistory,
+    hasMoreChats,
     currentChatId,
     isSidebarOpen,
     setIsSidebarOpen,
@@ -67,6 +68,8 @@ export default function Index() {
     loadChat,
     startNewChat,
     deleteChat,
+    loadMoreChats,
+    searchChats,
     handleFileUpload,
     removeFile,
     handleSend
@@ -83,6 +86,9 @@ export default function Index() {
           startNewChat={startNewChat}
           loadChat={loadChat}
           deleteChat={deleteChat}
+          hasMoreChats={hasMoreChats}
+          loadMoreChats={loadMoreChats}
+          searchChats={searchChats}
         />
       )}
 
@@ -41,18 +41,13 @@ export default function UserDashboard() {
     const userData = JSON.parse(user);
 
     try {
-      const aiTokensResponse = await fetch(
-        `https://functions.poehali.dev/62237982-f08c-4d74-99d7-28201bfc5f93?email=${userData.email}`
+      const response = await fetch(
+        `https://functions.poehali.dev/bd2ef983-d2f1-479f-af1a-8b0e969e7194?email=${encodeURIComponent(userData.email)}&sections=orders`
       );
-      const aiTokensData = await aiTokensResponse.json();
-      setUserAITokens(aiTokensData.credits || 0);
-
-      const ordersResponse = await fetch(
-        `https://functions.poehali.dev/fe27a5e8-ec1c-4cb4-beb7-b6ccb2075c5f?email=${userData.email}`
-      );
-      const ordersData = await ordersResponse.json();
+      const data = await response.json();
+      setUserAITokens(data.user?.credits || 0);
       
-      const formattedPurchases = ordersData.orders?.map((order: any) => ({
+      const formattedPurchases = data.orders?.map((order: any) => ({
         id: order.id,
         product_name: order.service_name,
         price: order.plan === 'basic' ? '1 AI-токен' : order.plan === 'pro' ? '3 AI-токена' : '5 AI-токенов',